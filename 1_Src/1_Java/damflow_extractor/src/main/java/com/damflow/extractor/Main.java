@@ -1,8 +1,10 @@
 package com.damflow.extractor;
 
+import java.io.BufferedReader;
 import java.io.BufferedWriter;
 import java.io.FileWriter;
 import java.io.IOException;
+import java.io.InputStreamReader;
 import java.net.URISyntaxException;
 import java.util.Set;
 
@@ -27,6 +29,15 @@ import soot.jimple.infoflow.taintWrappers.ITaintPropagationWrapper;
 
 
 public class Main {
+
+    // Server mode protocol: READY and DONE markers start their own line on stdout
+    public static final String READY_MARKER   = "@@DAMFLOW_READY";
+    public static final String DONE_MARKER    = "@@DAMFLOW_DONE";
+    public static final String RECYCLE_MARKER = "RECYCLE";
+
+    // Summaries of the Taint Wrapper, loaded lazily and reused by every analysis of the JVM
+    private static LazySummaryProvider summaryProvider = null;
+
     public static void main(String[] args) {
 
         // 1. Parse Command Line Options
@@ -35,8 +46,86 @@ public class Main {
             System.exit(1); 
         }
 
+        // Long-lived JVM analyzing one APK per request
+        if (cmdLineOptions.SERVER_MODE) {
+            runServer(cmdLineOptions);
+            System.exit(0);
+        }
+
+        if (!analyze(cmdLineOptions)) {
+            System.exit(1);
+        }
+    }
+
+    /**
+     * Runs the server mode: reads one request per line on stdin, using the same options of the
+     * command line (-a <APK_PATH> -p <ANDROID_PATH> -d <forward|backward> -s <nosources|docflow>),
+     * one argument per tab-separated field (so that paths may contain spaces), and answers with
+     * a DONE_MARKER line followed by OK or ERROR once the results file is written.
+     * The JVM exits after MAX_APKS requests or when the used heap exceeds HEAP_THRESHOLD,
+     * appending RECYCLE_MARKER to the last DONE_MARKER line so that the client starts a fresh one.
+     * 
+     * @param serverOptions The options of the server mode.
+     */
+    public static void runServer(CommandLineParser serverOptions) {
+        System.out.println(READY_MARKER);
+        System.out.flush();
+
+        BufferedReader reader = new BufferedReader(new InputStreamReader(System.in));
+        int numAnalyzed = 0;
+        boolean recycle = false;
+        while (!recycle) {
+            String line;
+            try {
+                line = reader.readLine();
+            } catch (IOException e) {
+                break;
+            }
+            if (line == null || "quit".equals(line.trim())) {
+                break;
+            }
+            if (line.trim().isEmpty()) {
+                continue;
+            }
+
+            // Analyze the APK
+            boolean success = false;
+            CommandLineParser requestOptions = new CommandLineParser();
+            if (requestOptions.parseArguments(line.split("\t")) && !requestOptions.SERVER_MODE) {
+                try {
+                    success = analyze(requestOptions);
+                } catch (OutOfMemoryError e) {
+                    System.out.println("--- ⚠️ Error: " + e);
+                    recycle = true;
+                } catch (Throwable t) {
+                    System.out.println("--- ⚠️ Error: " + t);
+                }
+            }
+            numAnalyzed++;
+
+            // Recycle after too many APKs or when the heap is too full
+            Runtime runtime = Runtime.getRuntime();
+            double heapUsage = (double) (runtime.totalMemory() - runtime.freeMemory()) / runtime.maxMemory();
+            if (numAnalyzed >= serverOptions.MAX_APKS || heapUsage >= serverOptions.HEAP_THRESHOLD) {
+                recycle = true;
+            }
+
+            System.out.println(DONE_MARKER + " " + (success ? "OK" : "ERROR") + (recycle ? " " + RECYCLE_MARKER : ""));
+            System.out.flush();
+        }
+    }
+
+    /**
+     * Extracts the data flows of one APK and saves them to a JSON file next to the APK.
+     * 
+     * @param cmdLineOptions The options of the analysis.
+     * @return true if the analysis completed, false if the options are invalid.
+     */
+    public static boolean analyze(CommandLineParser cmdLineOptions) {
+
         // 2. Setup Soot 
         System.out.println("⚡ --- Using SooT --- ⚡");
+        SourcesSinksManager.reset();
         SootUtils su = new SootUtils();
         su.setupSoot(cmdLineOptions.ANDROID_PATH, cmdLineOptions.APK_PATH, true);
 
@@ -65,7 +154,7 @@ public class Main {
         // Error
         else {
             System.out.println("--- ⚠️  Warning: Use -docflow- or -nosources- approach.");
-            System.exit(1);
+            return false;
         }
         System.out.println("--- 🔻 Number of Sources: " + SourcesSinksManager.sources.size());
         System.out.println("--- 🔺 Number of Sinks  : " + SourcesSinksManager.sinks.size());
@@ -89,7 +178,7 @@ public class Main {
         } 
         else {
             System.out.println("--- ⚠️  Warning: Use -forward- or -backward- direction.");
-            System.exit(1);
+            return false;
         }
         System.out.println("\n--- 🌊 Direction -->  " + cmdLineOptions.DIRECTION);
 
@@ -117,15 +206,16 @@ public class Main {
 			final ITaintPropagationWrapper taintWrapper;
             SummaryTaintWrapper summaryTaintWrapper = null;
 
-            LazySummaryProvider summaryProvider = null;
-            try {
-                summaryProvider = new LazySummaryProvider("summariesManual");
-            } catch (URISyntaxException e) {
-                // TODO Auto-generated catch block
-                e.printStackTrace();
-            } catch (IOException e) {
-                // TODO Auto-generated catch block
-                e.printStackTrace();
+            if (summaryProvider == null) {
+                try {
+                    summaryProvider = new LazySummaryProvider("summariesManual");
+                } catch (URISyntaxException e) {
+                    // TODO Auto-generated catch block
+                    e.printStackTrace();
+                } catch (IOException e) {
+                    // TODO Auto-generated catch block
+                    e.printStackTrace();
+                }
             }
 
             summaryTaintWrapper = new SummaryTaintWrapper(summaryProvider);
@@ -162,5 +252,6 @@ public class Main {
         // Save the results
         ResultsManager.saveJsonObjectToFile(jsonResults, cmdLineOptions.APK_PATH);
 
+        return true;
     }
 }
@@ -10,6 +10,13 @@ public class CommandLineParser {
     public String  APK_PATH;
     public String  DIRECTION;
     public String  SOURCES_APPROACH;
+
+    // Server mode: analyze many APKs in the same JVM, one request per line on stdin
+    public boolean SERVER_MODE    = false;
+    // Exit (to be restarted by the client) after this number of APKs...
+    public int     MAX_APKS       = 50;
+    // ... or when the used heap exceeds this fraction of the max heap
+    public double  HEAP_THRESHOLD = 0.75;
    
     /**
      * Parses command line arguments and sets class variables accordingly.
@@ -21,6 +28,11 @@ public class CommandLineParser {
      * @return true if the arguments are parsed successfully, false otherwise.
      */
     public boolean parseArguments(String[] args) {
+        // Server Mode
+        if (args.length >= 1 && args[0].equals("--server")) {
+            return parseServerArguments(args);
+        }
+
         // Print Error Message
         if (args.length < 8 || !args[0].equals("-a") || !args[2].equals("-p") || !args[4].equals("-d") || !args[6].equals("-s")) {
             System.out.println("--- ⚠️ Invalid command line arguments.");
@@ -40,4 +52,33 @@ public class CommandLineParser {
 
         return true;
     }
-}
\ No newline at end of file
+
+    /**
+     * Parses the command line arguments of the server mode.
+     * 
+     * Usage: --server [-r <MAX_APKS>] [-m <HEAP_THRESHOLD>]
+     * 
+     * @param args The command line arguments to be parsed.
+     * @return true if the arguments are parsed successfully, false otherwise.
+     */
+    private boolean parseServerArguments(String[] args) {
+        try {
+            for (int i = 1; i < args.length; i += 2) {
+                if (args[i].equals("-r")) {
+                    this.MAX_APKS = Integer.parseInt(args[i + 1]);
+                } else if (args[i].equals("-m")) {
+                    this.HEAP_THRESHOLD = Double.parseDouble(args[i + 1]);
+                } else {
+                    throw new IllegalArgumentException(args[i]);
+                }
+            }
+        } catch (Exception e) {
+            System.out.println("--- ⚠️ Invalid command line arguments.");
+            System.out.println("Usage: --server [-r <MAX_APKS>] [-m <HEAP_THRESHOLD>]");
+            return false;
+        }
+
+        this.SERVER_MODE = true;
+        return true;
+    }
+}
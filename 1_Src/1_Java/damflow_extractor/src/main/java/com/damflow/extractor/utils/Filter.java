@@ -17,9 +17,15 @@ public class Filter {
 
     // Name of Sources/Sinks files
     public static final String ANDROID_API_FILE = "AndroidAPIs.txt";
+
+    // Method names, loaded once and reused by every analysis of the JVM (server mode)
+    private static Set<String> cachedMethodNames = null;
     
     // Load the list of methods from the text file in the resources folder
-    private static Set<String> loadMethodNames() {
+    private static synchronized Set<String> loadMethodNames() {
+        if (cachedMethodNames != null) {
+            return cachedMethodNames;
+        }
         Set<String> methodNames = new HashSet<>();
         try (InputStream inputStream = Filter.class.getClassLoader().getResourceAsStream(ANDROID_API_FILE);
              BufferedReader reader = new BufferedReader(new InputStreamReader(inputStream))) {
@@ -31,6 +37,7 @@ public class Filter {
         catch (Exception e) {
             e.printStackTrace();
         }
+        cachedMethodNames = methodNames;
         return methodNames;
     }
 
@@ -5,8 +5,10 @@ import java.io.IOException;
 import java.io.InputStream;
 import java.io.InputStreamReader;
 import java.util.ArrayList;
+import java.util.HashMap;
 import java.util.HashSet;
 import java.util.List;
+import java.util.Map;
 import java.util.Set;
 
 import com.google.gson.JsonElement;
@@ -26,41 +28,65 @@ public class SourcesSinksManager {
     public static Set<AndroidMethod> sources = new HashSet<>();
     public static Set<AndroidMethod> sinks   = new HashSet<>();
 
+    // Lines of the resource files, read once and reused by every analysis of the JVM (server mode)
+    private static final Map<String, List<String>> cachedFiles = new HashMap<>();
 
-    public static void loadSourcesAndSinks(String approach) {
 
-        // Default Option
-        String LIST_TO_BE_USED = DOCFLOW__FILE; 
+    /**
+     * Empties the sources and sinks sets before a new analysis.
+     */
+    public static void reset() {
+        sources = new HashSet<>();
+        sinks   = new HashSet<>();
+    }
 
-        if ("docflow".equals(approach)) {
-            LIST_TO_BE_USED = DOCFLOW__FILE;
+    /**
+     * Reads the lines of a resource file, only the first time it is requested.
+     * 
+     * @param fileName The name of the resource file.
+     * @return The lines of the file.
+     */
+    private static synchronized List<String> readResourceLines(String fileName) {
+        List<String> lines = cachedFiles.get(fileName);
+        if (lines != null) {
+            return lines;
         }
-
-        //Read all the lines of the file
-        try (InputStream input = SourcesSinksManager.class.getClassLoader().getResourceAsStream(LIST_TO_BE_USED);
+        lines = new ArrayList<>();
+        try (InputStream input = SourcesSinksManager.class.getClassLoader().getResourceAsStream(fileName);
             BufferedReader reader = new BufferedReader(new InputStreamReader(input))) {
 
             String line;
             while ((line = reader.readLine()) != null) {
-                addSourceSinkFromMethodSignature(line);
+                lines.add(line);
             }
         } catch (IOException e) {
             e.printStackTrace();
         }
+        cachedFiles.put(fileName, lines);
+        return lines;
+    }
+
+
+    public static void loadSourcesAndSinks(String approach) {
+
+        // Default Option
+        String LIST_TO_BE_USED = DOCFLOW__FILE; 
+
+        if ("docflow".equals(approach)) {
+            LIST_TO_BE_USED = DOCFLOW__FILE;
+        }
+
+        //Read all the lines of the file
+        for (String line : readResourceLines(LIST_TO_BE_USED)) {
+            addSourceSinkFromMethodSignature(line);
+        }
     }
 
 
     public static void loadSourcesAndSinksBackwardAnalysis(Set<SootMethod> possibleSources) {
         // Read Sinks from File
-        try (InputStream input = SourcesSinksManager.class.getClassLoader().getResourceAsStream(ONLY_SINKS_FILE);
-            BufferedReader reader = new BufferedReader(new InputStreamReader(input))) {
-
-            String line;
-            while ((line = reader.readLine()) != null) {
-                addSourceSinkFromMethodSignature(line);
-            }
-        } catch (IOException e) {
-            e.printStackTrace();
+        for (String line : readResourceLines(ONLY_SINKS_FILE)) {
+            addSourceSinkFromMethodSignature(line);
         }
 
         // Add possible sources
@@ -1,14 +1,22 @@
 # Imports
-from dotenv      import load_dotenv
 import numpy     as np
 import subprocess
-import requests
+import threading
 import psutil
-import random
+import array
+import queue
 import json
 import time
+import sys
+import io
 import os
+# Optional: incremental JSON parsing
+try:
+	import ijson
+except ImportError:
+	ijson = None
 # Own Imports
+import Downloader
 import Utils
 
 # Class representing an App under analysis,
@@ -51,47 +59,18 @@ class App:
 	# path: where the APK file will be stored.
 	def downloadAPK(self, path):
 
-		# Max number of Retries for AndroZoo
-		MAX_RETRIES = 10
-
-		# Load AndroZoo API KEY
-		load_dotenv()
-
-		# Check if the Apk File already exist
-		if os.path.exists(path + '{}.apk'.format(self.sha256)):
+		# Check if the Apk File already exist (e.g. downloaded by a prefetcher)
+		if os.path.exists(Downloader.getApkPath(path, self.sha256)):
 			print("--- 📤 APK file with SHA256 already exists.")
-			self.apkPath = path + '{}.apk'.format(self.sha256)
+			self.apkPath = Downloader.getApkPath(path, self.sha256)
 			return
 
-		# Construct the URL for downloading the APK
-		apkUrl = "https://androzoo.uni.lu/api/download?apikey={}&sha256={}".format(os.getenv("ANDROZOO_API_KEY"), self.sha256)
-
-		retries = 0
-		while retries < MAX_RETRIES:
-			print("--- 🔄 Tentive N: {}".format(retries))
-			# Make a GET request to download the APK file
-			req = requests.get(apkUrl, allow_redirects=True)
-			
-			# Check for HTTP errors like 502 or 503
-			if req.status_code in [502, 503]:
-				print(f"--- ❌ Error: Received status code {req.status_code}. Retrying in 30 seconds...")
-				retries += 1
-				time.sleep(30)
-				continue
-			elif req.status_code != 200:
-				print(f"--- ❌ Error: Received unexpected status code {req.status_code}.")
-				return
-			else:
-				# Save the downloaded content to the specified file path
-				with open(path + '{}.apk'.format(self.sha256), "wb") as apkFile:
-					apkFile.write(req.content)
-
-				# Store the apkPath
-				self.apkPath = path + '{}.apk'.format(self.sha256)
-				print("--- 📤 APK file downloaded and saved to {}".format(self.apkPath))
-				return
-		
-		print(f"--- ❌ Error: Failed to download APK after {MAX_RETRIES} attempts.")
+		# Stream the APK to disk with a pooled session
+		apkPath = Downloader.downloadApk(self.sha256, path)
+		if apkPath is not None:
+			# Store the apkPath
+			self.apkPath = apkPath
+			print("--- 📤 APK file downloaded and saved to {}".format(self.apkPath))
 
 	# Delete the APK file
 	def deleteAPK(self):
@@ -106,13 +85,18 @@ class App:
 	# direction         : direction of the taint analysis (forward or backward)
 	# sourcesApproach   : sources to be used (docflow or nosources)
 	# timeout           : timeout to be used for the analysis
-	def extractDataFlows(self, tmpPath, javaExtractorPath, androidPath, direction, sourcesApproach, timeout):
+	# maxHeap           : max heap size of the JVM (-Xmx)
+	# extractorDaemon   : optional warm ExtractorDaemon to use instead of a fresh JVM
+	def extractDataFlows(self, tmpPath, javaExtractorPath, androidPath, direction, sourcesApproach, timeout, maxHeap = "24g", extractorDaemon = None):
 		#1. Download the app
 		print("--- 📥 Downloading APK")
 		self.downloadAPK(tmpPath)
 
 		# 2. Java Extractor
-		self.launchJavaExtractor(javaExtractorPath, androidPath, direction, sourcesApproach, timeout)
+		if extractorDaemon is not None:
+			self.launchJavaExtractorDaemon(extractorDaemon, androidPath, direction, sourcesApproach, timeout)
+		else:
+			self.launchJavaExtractor(javaExtractorPath, androidPath, direction, sourcesApproach, timeout, maxHeap)
 
 		# 3. Read Output files containing Results
 		self.loadJsonExtractionResults()
@@ -126,30 +110,26 @@ class App:
 			Utils.deleteFile(self.apkPath.replace(".apk",".json"))
 
 	# Launch Java Extractor
-	def launchJavaExtractor(self, javaExtractorPath, androidPath, direction, sourcesApproach, timeout = 1):
+	def launchJavaExtractor(self, javaExtractorPath, androidPath, direction, sourcesApproach, timeout = 1, maxHeap = "24g"):
 		# Java Extractor
-		command = 'java -Xmx24g -Xss1g -jar {} -a {} -p {} -d {} -s {} '.format(javaExtractorPath, self.apkPath, androidPath, direction, sourcesApproach)
+		command = 'java -Xmx{} -Xss1g -jar {} -a {} -p {} -d {} -s {} '.format(maxHeap, javaExtractorPath, self.apkPath, androidPath, direction, sourcesApproach)
 		print("--- 💻 Executing: {}".format(command))
 	
-		process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+		# Stream the output instead of buffering it
+		process = subprocess.Popen(command.split(), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True)
+		printer = threading.Thread(target=lambda: [print(line, end='') for line in iter(process.stdout.readline, '')], daemon=True)
 
 		print("--- ⏲️ Timeout: {} s\n".format(timeout))
+		print("\n+++ START of Output +++")
+		printer.start()
 		try:
-			output, error = process.communicate(timeout=timeout)
+			returnCode = process.wait(timeout=timeout)
+			printer.join()
+			print("+++ END of Output +++\n")
 			
 			# Check return code
-			returnCode = process.returncode
-			if returnCode == 0:
-				print("\n+++ START of Output +++")
-				print(output.decode("utf-8"))
-				print("+++ END of Output +++\n")
-			else:
-				if error is not None:
-					print("\n+++ START of Logging/Error +++")
-					print(error.decode("utf-8"))
-					print("+++ END of Logging/Error +++\n")
-				else:
-					print("No error output captured.")
+			if returnCode != 0:
+				print("--- ⚠️ Java Extractor exited with code {}".format(returnCode))
 		except subprocess.TimeoutExpired:
 			print("--- ⚠️ Timeout Reached.")
 			if os.path.exists(self.apkPath):
@@ -157,6 +137,19 @@ class App:
 			process.kill()
 			raise TimeoutError("Timeout reached while executing the command.")
 
+	# Launch the analysis on a warm Java Extractor (see ExtractorDaemon)
+	def launchJavaExtractorDaemon(self, extractorDaemon, androidPath, direction, sourcesApproach, timeout = 1):
+		print("--- 💻 Requesting: {} (warm JVM)".format(self.apkPath))
+		print("--- ⏲️ Timeout: {} s\n".format(timeout))
+		try:
+			if not extractorDaemon.extract(self.apkPath, androidPath, direction, sourcesApproach, timeout):
+				print("--- ⚠️ Extraction Failed.")
+		except TimeoutError:
+			print("--- ⚠️ Timeout Reached.")
+			if os.path.exists(self.apkPath):
+				self.deleteAPK()
+			raise
+
 	# Read Results
 	def loadJsonExtractionResults(self):
 		resultsPath = self.apkPath.replace(".apk", ".json")
@@ -165,13 +158,8 @@ class App:
 			print("--- ⚠️ Results file not available.\n")
 			raise FileNotFoundError("Results file '{}' not found.".format(resultsPath))
 
-		with open(resultsPath, 'r') as file:
-			data = json.load(file)  # Read the whole JSON file
-			sources = data.get('sources', [])
-			sinks = data.get('sinks', [])
-			pairs = data.get('pairs', [])
-
-			self.dataFlows = DataFlows(sources, sinks, pairs)
+		# Parse the results incrementally
+		self.dataFlows = DataFlows.fromJson(resultsPath)
 
 
 	### REDIS ### 
@@ -198,26 +186,31 @@ class App:
 			percent_usage = (mem_info.rss / total_mem) * 100
 			print(f"--- 💾 Memory Usage: {mem_info.rss / 1024 ** 2:.2f} MB [{percent_usage:.2f}% of total]", flush=True)
 
-		# Download Extraction Results
-		resultJsonData = redisClient.downloadJsonData(redisClient.resultsKey, self.sha256)
+		# Download Extraction Results (a Redis error or a malformed result: reported as not available)
+		try:
+			resultJsonData = redisClient.downloadBytesMany(redisClient.resultsKey, [self.sha256])[0]
+			dataFlows = DataFlows.fromJson(resultJsonData) if resultJsonData is not None else None
+		except Exception as e:
+			print("--- ⚠️ An error occurred:", e)
+			resultJsonData = dataFlows = None
 
-		if resultJsonData is not None:
+		if dataFlows is not None:
 			print("--- ✅ Data Flows Availaible on Redis", flush=True)
 
+			self.dataFlows = dataFlows
+			del resultJsonData
+
 			# Print memory usage
 			printMemoryUsage()
-
-			self.dataFlows = DataFlows(resultJsonData.get("sources", []),
-										resultJsonData.get("sinks", []),
-										resultJsonData.get("pairs", []), 
-										)
 				
-			print("--- ⚙️ Data Flows Pairs : {}".format(len(resultJsonData.get("pairs", []))))
+			print("--- ⚙️ Data Flows Pairs : {}".format(len(self.dataFlows.sourceIdx)))
 
 		else:
 			print("--- ❌ Data Flows Unavailaible on Redis", flush=True)
 
 	# Download Embeddings from Redis for each pair of the Data Flows Object.
+	# Every distinct method is fetched once in bulk, then the pair matrix is built with a single gather.
+	# Returns the list of methods whose embedding is missing on Redis (empty on success).
 	def downloadPairsEmbeddingsFromRedis(self, redisClient, embeddingModel):
 
 		# Check if the Embedding Model is one of the supported types
@@ -231,56 +224,267 @@ class App:
 		if self.dataFlows is None:
 			print("--- ⚠️ Data Flows not present.\n")
 			return
-		else:
-			# To store all the embeddings
-			pairEmbeddings = []
-
-			# For each Data Flow Pair
-			for pair in self.dataFlows.pairs:
-				# Get Source and Sink Embeddings
-				source = pair['source']
-				srcEmbString = redisClient.downloadString(embeddingModelRedisKey, source)
-				if srcEmbString is None:
-					print("--- ⚠️ Embedding not present on Redis Server.")
-					return
-				srcEmb = np.array([float(x) for x in srcEmbString.split(',')])
-			
-				sink = pair['sink']
-				sinkEmbString = redisClient.downloadString(embeddingModelRedisKey, sink)
-				if sinkEmbString is None:
-					print("--- ⚠️ Embedding not present on Redis Server.")
-					return
-				sinkEmb = np.array([float(x) for x in sinkEmbString.split(',')])
-			
-				# Concatenate Source and Sink
-				pairEmb = np.concatenate((srcEmb, sinkEmb))
-				
-				# Add to Embedding list
-				pairEmbeddings.append(pairEmb)
 
-			self.embeddings[embeddingModel] = np.array(pairEmbeddings)
+		# Distinct methods and the index of source/sink of each pair
+		methods, sourceIdx, sinkIdx = self.dataFlows.getPairsIndex()
 
-		print("--- ✅ PAIRS Embeddings Loaded From Redis --> {}".format(embeddingModel), flush=True)
+		# Download each distinct method once
+		methodEmbeddings = redisClient.downloadEmbeddingsMany(embeddingModelRedisKey, methods)
+		missing = [method for method, emb in zip(methods, methodEmbeddings) if emb is None]
+		if len(missing) > 0:
+			print("--- ⚠️ Embeddings not present on Redis Server: {} of {} methods.".format(len(missing), len(methods)))
+			for method in missing:
+				print("--- ⚠️ Missing: {}".format(method))
+			return missing
 
+		self.embeddings[embeddingModel] = gatherPairsEmbeddings(methodEmbeddings, sourceIdx, sinkIdx)
 
-# Class to manage DataFlows extracted from an App
+		print("--- ✅ PAIRS Embeddings Loaded From Redis --> {}".format(embeddingModel), flush=True)
+		return missing
+
+
+# Long-lived Java Extractor (server mode of the jar) analyzing one APK per request.
+# The JVM, its JIT and the loaded resources are reused across APKs; the JVM recycles itself
+# after maxApks APKs or when its heap usage exceeds heapThreshold, and is restarted on the next request.
+class ExtractorDaemon:
+
+	# Protocol markers (see Main.java)
+	READY_MARKER   = "@@DAMFLOW_READY"
+	DONE_MARKER    = "@@DAMFLOW_DONE"
+	RECYCLE_MARKER = "RECYCLE"
+
+	# Command
+	javaExtractorPath = None
+	maxHeap           = None
+	maxApks           = None
+	heapThreshold     = None
+
+	# Running JVM and its stdout lines
+	process = None
+	lines   = None
+
+	# Statistics
+	numStarts   = None
+	numRequests = None
+
+	def __init__(self, javaExtractorPath, maxHeap = "24g", maxApks = 50, heapThreshold = 0.75):
+		self.javaExtractorPath = javaExtractorPath
+		self.maxHeap           = maxHeap
+		self.maxApks           = maxApks
+		self.heapThreshold     = heapThreshold
+		self.numStarts         = 0
+		self.numRequests       = 0
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.stop()
+
+	# Forward the stdout of the JVM to a queue, None marks its end
+	@staticmethod
+	def readLines(stream, lines):
+		for line in iter(stream.readline, ''):
+			lines.put(line.rstrip("\n"))
+		lines.put(None)
+
+	# Start the JVM if it is not running
+	def start(self, timeout = 300):
+		if self.process is not None and self.process.poll() is None:
+			return
+		command = ['java', '-Xmx{}'.format(self.maxHeap), '-Xss1g', '-jar', self.javaExtractorPath,
+				   '--server', '-r', str(self.maxApks), '-m', str(self.heapThreshold)]
+		print("--- 💻 Starting: {}".format(' '.join(command)))
+		self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+										universal_newlines=True, bufsize=1)
+		self.lines = queue.Queue()
+		threading.Thread(target=ExtractorDaemon.readLines, args=(self.process.stdout, self.lines), daemon=True).start()
+		self.numStarts += 1
+		self.waitFor(self.READY_MARKER, timeout)
+
+	# Stop the JVM
+	def stop(self):
+		if self.process is not None and self.process.poll() is None:
+			try:
+				self.process.stdin.write("quit\n")
+				self.process.stdin.flush()
+				self.process.wait(timeout=30)
+			except Exception:
+				self.process.kill()
+		self.process = None
+
+	# Print the output of the JVM until a line starting with marker, which is returned
+	def waitFor(self, marker, timeout):
+		deadline = time.monotonic() + timeout
+		while True:
+			try:
+				line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+			except queue.Empty:
+				self.process.kill()
+				self.process = None
+				raise TimeoutError("Timeout reached while waiting for the Java Extractor.")
+			if line is None:
+				self.process = None
+				raise RuntimeError("The Java Extractor exited unexpectedly.")
+			if line.startswith(marker):
+				return line
+			print(line)
+
+	# Analyze one APK, the results are written next to it as for launchJavaExtractor.
+	# The request is one line with one argument per tab-separated field (paths may contain spaces).
+	# Returns True if the extractor reported a success.
+	def extract(self, apkPath, androidPath, direction, sourcesApproach, timeout):
+		arguments = ['-a', apkPath, '-p', androidPath, '-d', direction, '-s', sourcesApproach]
+		if any(("\t" in str(argument) or "\n" in str(argument)) for argument in arguments):
+			raise ValueError("--- ⚠️ Error: tabs and new lines are not supported in the arguments of the Java Extractor daemon")
+		self.start()
+		self.numRequests += 1
+		self.process.stdin.write("\t".join(str(argument) for argument in arguments) + "\n")
+		self.process.stdin.flush()
+
+		tokens = self.waitFor(self.DONE_MARKER, timeout).split()
+		if self.RECYCLE_MARKER in tokens:
+			print("--- ♻️ Java Extractor recycled after {} requests".format(self.numRequests))
+			self.process.wait()
+			self.process = None
+		return len(tokens) > 1 and tokens[1] == "OK"
+
+
+# Build the (numPairs, 2 * dim) pair matrix from the embeddings of the distinct methods
+# and the index arrays of the source and sink of each pair.
+# methodEmbeddings: list of vectors, or a (numMethods, dim) matrix (e.g. a read-only memmap, not copied)
+def gatherPairsEmbeddings(methodEmbeddings, sourceIdx, sinkIdx):
+	numPairs = len(sourceIdx)
+	if numPairs == 0:
+		return np.array([], dtype=np.float32)
+
+	# Method matrix (numMethods, dim)
+	if isinstance(methodEmbeddings, np.ndarray) and methodEmbeddings.ndim == 2:
+		methodMatrix = np.asarray(methodEmbeddings, dtype=np.float32)
+	else:
+		methodMatrix = np.asarray(np.stack(methodEmbeddings), dtype=np.float32)
+	dim = methodMatrix.shape[1]
+
+	# Single fancy-index gather into the preallocated pair matrix, viewed as (numPairs, 2, dim)
+	pairEmbeddings = np.empty((numPairs, 2 * dim), dtype=np.float32)
+	pairIdx = np.stack((np.asarray(sourceIdx, dtype=np.intp), np.asarray(sinkIdx, dtype=np.intp)), axis=1)
+	np.take(methodMatrix, pairIdx, axis=0, out=pairEmbeddings.reshape(numPairs, 2, dim))
+	return pairEmbeddings
+
+
+# Read-only sequence of the pairs of a DataFlows object, each pair is built as a dict on access
+class DataFlowsPairs:
+
+	__slots__ = ('dataFlows',)
+
+	def __init__(self, dataFlows):
+		self.dataFlows = dataFlows
+
+	def __len__(self):
+		return len(self.dataFlows.sourceIdx)
+
+	def __getitem__(self, i):
+		if isinstance(i, slice):
+			return [self[j] for j in range(*i.indices(len(self)))]
+		methods = self.dataFlows.methods
+		return {'source': methods[self.dataFlows.sourceIdx[i]], 'sink': methods[self.dataFlows.sinkIdx[i]]}
+
+	def __iter__(self):
+		methods = self.dataFlows.methods
+		for source, sink in zip(self.dataFlows.sourceIdx.tolist(), self.dataFlows.sinkIdx.tolist()):
+			yield {'source': methods[source], 'sink': methods[sink]}
+
+
+# Class to manage DataFlows extracted from an App.
+# Every Smali signature is stored once in an interned method table; sources, sinks and pairs
+# are int32 arrays of indices into it. sources, sinks and pairs keep the original list views.
 class DataFlows:
 
-	# Fields after Data Flows Extraction
-	sources = []
-	sinks   = []
-	pairs   = []
+	__slots__ = ('methods', 'methodsIndex', 'sourcesIdx', 'sinksIdx', 'sourceIdx', 'sinkIdx')
 
 	def __init__(self, sources=[], sinks=[], pairs=[]):
-		self.sources = sources
-		self.sinks = sinks
-		self.pairs = pairs
+		# Method table
+		self.methods      = []
+		self.methodsIndex = {}
+
+		# Indices of the sources and of the sinks
+		self.sourcesIdx = np.array([self.intern(method) for method in sources], dtype=np.int32)
+		self.sinksIdx   = np.array([self.intern(method) for method in sinks], dtype=np.int32)
+
+		# Indices of the source and of the sink of each pair
+		pairsIdx = [(self.intern(pair['source']), self.intern(pair['sink'])) for pair in pairs]
+		pairsIdx = np.array(pairsIdx, dtype=np.int32).reshape(-1, 2)
+		self.sourceIdx = np.ascontiguousarray(pairsIdx[:, 0])
+		self.sinkIdx   = np.ascontiguousarray(pairsIdx[:, 1])
+
+	# Index of a method in the method table (added if new)
+	def intern(self, method):
+		index = self.methodsIndex.get(method)
+		if index is None:
+			index = len(self.methods)
+			method = sys.intern(method)
+			self.methodsIndex[method] = index
+			self.methods.append(method)
+		return index
+
+	# Build a DataFlows object from the extractor JSON (a path, a binary file or bytes/str),
+	# parsing it incrementally (with ijson, when installed) without building the intermediate dicts.
+	@classmethod
+	def fromJson(cls, data):
+		if isinstance(data, str) and not data.lstrip().startswith('{'):
+			with open(data, 'rb') as file:
+				return cls.fromJson(file)
+		if isinstance(data, str):
+			data = data.encode('utf-8')
+		if isinstance(data, (bytes, bytearray)):
+			data = io.BytesIO(data)
+
+		if ijson is None:
+			parsed = json.load(data)
+			return cls(parsed.get('sources', []), parsed.get('sinks', []), parsed.get('pairs', []))
+
+		dataFlows = cls()
+		sourcesIdx = array.array('i')
+		sinksIdx   = array.array('i')
+		pairsIdx   = array.array('i')
+		pair = {}
+		for prefix, event, value in ijson.parse(data):
+			if prefix == 'sources.item' and event == 'string':
+				sourcesIdx.append(dataFlows.intern(value))
+			elif prefix == 'sinks.item' and event == 'string':
+				sinksIdx.append(dataFlows.intern(value))
+			elif prefix == 'pairs.item.source' or prefix == 'pairs.item.sink':
+				pair[prefix[11:]] = value
+			elif prefix == 'pairs.item' and event == 'end_map':
+				pairsIdx.append(dataFlows.intern(pair['source']))
+				pairsIdx.append(dataFlows.intern(pair['sink']))
+				pair = {}
+
+		dataFlows.sourcesIdx = np.frombuffer(sourcesIdx, dtype=np.int32).copy()
+		dataFlows.sinksIdx   = np.frombuffer(sinksIdx, dtype=np.int32).copy()
+		pairsIdx = np.frombuffer(pairsIdx, dtype=np.int32).reshape(-1, 2)
+		dataFlows.sourceIdx = np.ascontiguousarray(pairsIdx[:, 0])
+		dataFlows.sinkIdx   = np.ascontiguousarray(pairsIdx[:, 1])
+		return dataFlows
+
+	@property
+	def sources(self):
+		return [self.methods[i] for i in self.sourcesIdx.tolist()]
+
+	@property
+	def sinks(self):
+		return [self.methods[i] for i in self.sinksIdx.tolist()]
+
+	@property
+	def pairs(self):
+		return DataFlowsPairs(self)
 
 	def __str__(self) -> str:
 		print("\n--- ⭐ Summary ⭐ ---")
-		print(f"--- #️⃣ Number of sources          : {len(self.sources)}")
-		print(f"--- #️⃣ Number of sinks            : {len(self.sinks)}")
-		print(f"--- #️⃣ Number of data flows pairs : {len(self.pairs)}")
+		print(f"--- #️⃣ Number of sources          : {len(self.sourcesIdx)}")
+		print(f"--- #️⃣ Number of sinks            : {len(self.sinksIdx)}")
+		print(f"--- #️⃣ Number of data flows pairs : {len(self.sourceIdx)}")
+		print(f"--- #️⃣ Number of distinct methods : {len(self.methods)}")
 		return ""
 
 	# Get Dictionary
@@ -288,17 +492,43 @@ class DataFlows:
 		return {
 			'sources': self.sources,
 			'sinks': self.sinks,
-			'pairs': self.pairs,
+			'pairs': list(self.pairs),
 		}
 	
 	# Convert to JSON String
 	def toJsonString(self):
 		return json.dumps(self.getAll())
+
+	# Get the distinct methods of the pairs and, for each pair, the index of its source and sink
+	# rows: only the pairs at these positions (default: all the pairs)
+	def getPairsIndex(self, rows = None):
+		sourceIdx = self.sourceIdx if rows is None else self.sourceIdx[rows]
+		sinkIdx   = self.sinkIdx if rows is None else self.sinkIdx[rows]
+		numPairs = len(sourceIdx)
+		used, inverse = np.unique(np.concatenate((sourceIdx, sinkIdx)), return_inverse=True)
+		inverse = inverse.astype(np.int32).ravel()
+		return [self.methods[i] for i in used.tolist()], inverse[:numPairs], inverse[numPairs:]
 	
+	# DataFlows of the pairs at rows, with the source and the sink of each of them as sources and sinks.
+	# It shares the method table (no signature is copied).
+	def subset(self, rows):
+		dataFlows = DataFlows()
+		dataFlows.methods      = self.methods
+		dataFlows.methodsIndex = self.methodsIndex
+		dataFlows.sourceIdx    = self.sourceIdx[rows]
+		dataFlows.sinkIdx      = self.sinkIdx[rows]
+		dataFlows.sourcesIdx   = dataFlows.sourceIdx
+		dataFlows.sinksIdx     = dataFlows.sinkIdx
+		return dataFlows
+
+	# (source, sink) signature of each pair, aligned with the rows of the pair embeddings
+	def getPairsKeys(self):
+		return list(zip([self.methods[i] for i in self.sourceIdx.tolist()], [self.methods[i] for i in self.sinkIdx.tolist()]))
+
 	# Check if all lists are empty
 	def isEmpty(self):
 		if (len(self.sources) == 0 and (self.sinks) == 0 and len(self.pairs) == 0):
 			print("--- ⚠️ Empty Data Flows")
 			return True
 		else:
-			return False
\ No newline at end of file
+			return False
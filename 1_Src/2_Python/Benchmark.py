@@ -0,0 +1,642 @@
+# Imports
+from   concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from   contextlib import redirect_stdout
+from   dotenv   import load_dotenv
+import pandas   as pd
+import numpy    as np
+import argparse
+import io
+import multiprocessing
+import subprocess
+import requests
+import tempfile
+import joblib
+import shutil
+import json
+import time
+import sys
+import os
+# Optional: peak memory of the benchmark processes (POSIX only)
+try:
+	import resource
+except ImportError:
+	resource = None
+# Own Imports
+from   App            import App, ExtractorDaemon, DataFlows, gatherPairsEmbeddings
+from   Embedding      import EmbeddingsManager, GptManager
+from   RedisClient    import RedisClient
+from   ScoringService import ScoringService
+from   Training       import TrainingManager
+from   Testing        import TestingManager
+import Downloader
+import Detectors
+import StandIns
+
+# Benchmarks of the DamFlow pipeline.
+# Each benchmark returns a dictionary of measures and can be launched from the command line.
+
+
+### EXTRACTION ###
+# Compare a fresh JVM per APK against a warm ExtractorDaemon on the same APKs.
+# The per-APK overhead saving is the difference of the mean wall time per APK.
+def benchmarkExtractor(apkPaths, javaExtractorPath, androidPath, direction, sourcesApproach, timeout = 7200, maxHeap = "24g"):
+
+	def analyzeAll(extractorDaemon):
+		times = []
+		for apkPath in apkPaths:
+			app = App(os.path.basename(apkPath).replace(".apk", ""))
+			app.apkPath = apkPath
+			startTime = time.time()
+			if extractorDaemon is None:
+				app.launchJavaExtractor(javaExtractorPath, androidPath, direction, sourcesApproach, timeout, maxHeap)
+			else:
+				app.launchJavaExtractorDaemon(extractorDaemon, androidPath, direction, sourcesApproach, timeout)
+			times.append(time.time() - startTime)
+		return times
+
+	coldTimes = analyzeAll(None)
+
+	# Include the start of the warm JVM in its total
+	startTime = time.time()
+	with ExtractorDaemon(javaExtractorPath, maxHeap) as extractorDaemon:
+		warmTimes = analyzeAll(extractorDaemon)
+	warmTotal = time.time() - startTime
+
+	results = {
+		"numApks"          : len(apkPaths),
+		"coldTotal"        : sum(coldTimes),
+		"warmTotal"        : warmTotal,
+		"coldPerApk"       : sum(coldTimes) / max(1, len(apkPaths)),
+		"warmPerApk"       : warmTotal / max(1, len(apkPaths)),
+	}
+	results["savingPerApk"] = results["coldPerApk"] - results["warmPerApk"]
+
+	print("\n--- ⭐ Extractor Benchmark ⭐---")
+	print("--- #️⃣ APKs                  : {}".format(results["numApks"]))
+	print("--- 🥶 Fresh JVM per APK     : {:.2f} s/APK".format(results["coldPerApk"]))
+	print("--- 🔥 Warm JVM              : {:.2f} s/APK".format(results["warmPerApk"]))
+	print("--- ⏱️ Saving per APK        : {:.2f} s".format(results["savingPerApk"]))
+	return results
+
+
+### TRAINING ###
+# Fit and predict a model on X. Returns (fitTime, predictTime, labels)
+def measureModel(model, X):
+	startTime = time.time()
+	model.fit(X)
+	fitTime = time.time() - startTime
+
+	startTime = time.time()
+	labels = model.predict(X)
+	return fitTime, time.time() - startTime, labels
+
+# Compare labels with the labels of a reference model.
+# agreement: fraction of pairs with the same label as the reference
+# jaccard  : overlap of the outliers sets (outliers in both / outliers in any)
+def compareLabels(labels, referenceLabels):
+	outliers          = labels == -1
+	referenceOutliers = referenceLabels == -1
+	numAny = np.count_nonzero(outliers | referenceOutliers)
+	return {
+		"numOutliers" : int(np.count_nonzero(outliers)),
+		"agreement"   : float(np.mean(labels == referenceLabels)),
+		"jaccard"     : float(np.count_nonzero(outliers & referenceOutliers) / numAny) if numAny else 1.0,
+	}
+
+# Compare the detectors of Detectors.DETECTORS with the exact One-Class SVM on the same embeddings.
+def benchmarkDetectors(X, names = None, reference = "ocsvm"):
+	names = list(Detectors.DETECTORS) if names is None else names
+	if reference not in names:
+		names = [reference] + names
+
+	results = {"inputShape": list(X.shape), "reference": reference, "detectors": {}}
+	labels = {}
+	for name in names:
+		fitTime, predictTime, labels[name] = measureModel(Detectors.createDetector(name), X)
+		results["detectors"][name] = {"fitTime": fitTime, "predictTime": predictTime}
+	for name in names:
+		results["detectors"][name].update(compareLabels(labels[name], labels[reference]))
+
+	print("\n--- ⭐ Detectors Benchmark ⭐---")
+	print("--- 📐 Input Shape : {}".format(X.shape))
+	for name, measures in results["detectors"].items():
+		print("--- 📦 {:<13} fit {:8.2f} s | predict {:7.2f} s | outliers {:6d} | agreement {:.4f} | jaccard {:.4f}".format(
+			name, measures["fitTime"], measures["predictTime"], measures["numOutliers"], measures["agreement"], measures["jaccard"]))
+	return results
+
+# Compare a detector with and without a reduction stage in front of it.
+# reducers: list of (reducer name, reducer params), e.g. [("pca", {"n_components": 0.95}), ("srp", {"n_components": 256})]
+# speedup : (fit + predict time without reduction) / (fit + predict time with reduction)
+def benchmarkReducers(X, reducers, detector = "ocsvm"):
+	fitTime, predictTime, referenceLabels = measureModel(Detectors.createModel(detector), X)
+	referenceTime = fitTime + predictTime
+	results = {"inputShape": list(X.shape), "detector": detector,
+			   "reference": {"fitTime": fitTime, "predictTime": predictTime, "numOutliers": int(np.count_nonzero(referenceLabels == -1))},
+			   "reducers": []}
+
+	for reducer, reducerParams in reducers:
+		model = Detectors.createModel(detector, None, reducer, reducerParams)
+		fitTime, predictTime, labels = measureModel(model, X)
+		measures = {"reducer": reducer, "reducerParams": reducerParams, "fitTime": fitTime, "predictTime": predictTime,
+					"dim": int(model.named_steps["reducer"].transform(X[:1]).shape[1]),
+					"speedup": referenceTime / max(fitTime + predictTime, 1e-9)}
+		measures.update(compareLabels(labels, referenceLabels))
+		results["reducers"].append(measures)
+
+	print("\n--- ⭐ Reducers Benchmark ⭐---")
+	print("--- 📐 Input Shape : {}".format(X.shape))
+	print("--- 📦 {:<30} fit {:8.2f} s | predict {:7.2f} s | outliers {:6d}".format(
+		"none", results["reference"]["fitTime"], results["reference"]["predictTime"], results["reference"]["numOutliers"]))
+	for measures in results["reducers"]:
+		print("--- 📉 {:<30} fit {:8.2f} s | predict {:7.2f} s | outliers {:6d} | dim {:5d} | speedup {:6.2f}x | jaccard {:.4f}".format(
+			"{} {}".format(measures["reducer"], json.dumps(measures["reducerParams"])), measures["fitTime"], measures["predictTime"],
+			measures["numOutliers"], measures["dim"], measures["speedup"], measures["jaccard"]))
+	return results
+
+
+### SCORING ###
+# Train one model per category of a synthetic dataset stored on a Redis stand-in, saved as <modelsPath>/<category>/<model>.joblib
+def trainFakeModels(redisClientExtraction, redisClientEmbedding, apps, modelsPath, embeddingModel = "gpt", detector = "ocsvm"):
+	redisKey = redisClientEmbedding.projectKey + "." + embeddingModel
+	for categoryID in sorted({categoryID for _, categoryID in apps}):
+		sha256s = [sha256 for sha256, appCategoryID in apps if appCategoryID == categoryID]
+		matrices = []
+		for result in redisClientExtraction.downloadBytesMany(redisClientExtraction.resultsKey, sha256s):
+			methods, sourceIdx, sinkIdx = DataFlows.fromJson(result).getPairsIndex()
+			matrices.append(gatherPairsEmbeddings(redisClientEmbedding.downloadEmbeddingsMany(redisKey, methods), sourceIdx, sinkIdx))
+		os.makedirs(os.path.join(modelsPath, str(categoryID)), exist_ok=True)
+		joblib.dump(Detectors.createModel(detector).fit(np.concatenate(matrices)),
+					os.path.join(modelsPath, str(categoryID), "{}.joblib".format(embeddingModel)))
+
+# Latency and throughput of the ScoringService under concurrent load, for each micro-batching window in maxWaits.
+# Everything runs locally: synthetic apps and embeddings on an in-memory Redis stand-in, models trained on them.
+def benchmarkScoringService(numRequests = 2000, concurrency = 16, maxWaits = (0, 0.005), numApps = 200, numCategories = 4,
+							dim = 256, detector = "ocsvm", seed = 42):
+	redisStandIn = StandIns.InMemoryRedis()
+	redisClientExtraction = RedisClient(None, None, None, None, "benchmark.scoring", client = redisStandIn)
+	redisClientEmbedding  = RedisClient(None, None, None, None, "benchmark.embeddings", client = redisStandIn)
+	apps, methods = StandIns.fakeDataset(redisClientExtraction, numApps, numCategories, seed = seed)
+	StandIns.fakeEmbeddings(redisClientEmbedding, "gpt", methods, dim)
+
+	modelsPath = tempfile.mkdtemp(prefix="damflow_models_")
+	trainFakeModels(redisClientExtraction, redisClientEmbedding, apps, modelsPath, "gpt", detector)
+
+	rng = np.random.default_rng(seed)
+	requestApps = [apps[i] for i in rng.integers(0, len(apps), numRequests)]
+	results = {"numRequests": numRequests, "concurrency": concurrency, "numApps": numApps, "dim": dim, "runs": []}
+
+	for maxWait in maxWaits:
+		with ScoringService(redisClientExtraction, redisClientEmbedding, modelsPath, "gpt", port = 0, maxWait = maxWait) as service:
+			url = service.baseUrl + "/score"
+
+			def sendAll(worker):
+				session   = requests.Session()
+				latencies = []
+				for sha256, categoryID in requestApps[worker::concurrency]:
+					startTime = time.perf_counter()
+					response  = session.post(url, json={"sha256": sha256, "categoryID": categoryID})
+					response.raise_for_status()
+					latencies.append(time.perf_counter() - startTime)
+				return latencies
+
+			# Warm up: load the models and the embeddings of every app once
+			for sha256, categoryID in apps:
+				requests.post(url, json={"sha256": sha256, "categoryID": categoryID}).raise_for_status()
+			numBatches, numBatched = service.batcher.numBatches, service.batcher.numRequests
+
+			startTime = time.perf_counter()
+			with ThreadPoolExecutor(max_workers=concurrency) as executor:
+				latencies = [latency for workerLatencies in executor.map(sendAll, range(concurrency)) for latency in workerLatencies]
+			wallTime = time.perf_counter() - startTime
+
+			numBatches = service.batcher.numBatches - numBatches
+			results["runs"].append({
+				"maxWait"          : maxWait,
+				"p50"              : float(np.percentile(latencies, 50)),
+				"p99"              : float(np.percentile(latencies, 99)),
+				"mean"             : float(np.mean(latencies)),
+				"requestsPerSecond": numRequests / wallTime,
+				"requestsPerBatch" : (service.batcher.numRequests - numBatched) / max(1, numBatches),
+			})
+	shutil.rmtree(modelsPath)
+
+	print("\n--- ⭐ Scoring Service Benchmark ⭐---")
+	print("--- #️⃣ Requests: {} --- 🧵 Concurrency: {}".format(numRequests, concurrency))
+	for run in results["runs"]:
+		print("--- ⏱️ maxWait {:6.1f} ms | p50 {:7.2f} ms | p99 {:7.2f} ms | {:8.1f} req/s | {:5.2f} req/batch".format(
+			run["maxWait"] * 1000, run["p50"] * 1000, run["p99"] * 1000, run["requestsPerSecond"], run["requestsPerBatch"]))
+	return results
+
+
+### ASYNC GPT ENGINE ###
+# Throughput and error handling of the asyncio engine of "gpt" (AsyncGptEngine) against StandIns.FakeEmbeddingsServer:
+# the first rateLimitFirst requests get a 429 with a Retry-After of retryAfter seconds, and numOverLong methods
+# are longer than the server accepts (400). Every other method must be stored on the Redis stand-in,
+# and exactly the over-long methods must be reported as failed and kept in the failed set.
+def benchmarkGptEngine(numMethods = 2000, numOverLong = 3, rateLimitFirst = 5, retryAfter = 0.2, dim = 256,
+					   maxBatchInputs = 100, maxInFlight = 8):
+	# The stand-in does not check the key
+	os.environ.setdefault("OPENAI_API_KEY", "stand-in")
+	redisClientEmbedding = RedisClient(None, None, None, None, "benchmark.engine", client = StandIns.InMemoryRedis())
+	maxInputChars = 1000
+	overLong = ["<com.app.Generated: void method{}({})>".format(i, "int," * maxInputChars) for i in range(numOverLong)]
+	methods  = StandIns.fakeMethods(numMethods) + overLong
+
+	with StandIns.FakeEmbeddingsServer(dim, rateLimitFirst = rateLimitFirst, retryAfter = retryAfter, maxInputChars = maxInputChars) as server:
+		embeddingsManager = EmbeddingsManager(redisClientEmbedding, "gpt", manager = GptManager(maxBatchInputs = maxBatchInputs))
+		embeddingsManager.loadDataFlowsFromApp(DataFlows(methods, [], []))
+		startTime = time.perf_counter()
+		with redirect_stdout(io.StringIO()):
+			failed = embeddingsManager.generateMethodsEmbeddingsAsync(redisClientEmbedding, "gpt", baseUrl = server.baseUrl,
+																	  maxInFlight = maxInFlight, baseBackoff = 0.05)
+		wallTime = time.perf_counter() - startTime
+
+		modelRedisKey = redisClientEmbedding.projectKey + ".gpt"
+		stored = redisClientEmbedding.existsMany(modelRedisKey, methods)
+		results = {
+			"numMethods"       : len(methods),
+			"numStored"        : sum(1 for exists in stored if exists),
+			"numFailed"        : len(failed),
+			"numRequests"      : server.numRequests,
+			"numRateLimited"   : server.numRateLimited,
+			"numRejected"      : server.numRejected,
+			"wallTime"         : wallTime,
+			"methodsPerSecond" : len(methods) / wallTime,
+			# Checks
+			"failedAreOverLong": sorted(failed) == sorted(overLong),
+			"failedSetStored"  : embeddingsManager.getFailedMethods(redisClientEmbedding) == sorted(overLong),
+			"othersStored"     : all(exists for method, exists in zip(methods, stored) if method not in overLong),
+			"waitedRetryAfter" : rateLimitFirst == 0 or wallTime >= retryAfter,
+		}
+	results["passed"] = all(results[check] for check in ["failedAreOverLong", "failedSetStored", "othersStored", "waitedRetryAfter"])
+
+	print("\n--- ⭐ Async GPT Engine Benchmark ⭐---")
+	print("--- #️⃣ Methods: {} --- 💾 Stored: {} --- ❌ Failed: {} (over-long: {})".format(
+		results["numMethods"], results["numStored"], results["numFailed"], numOverLong))
+	print("--- 📨 Requests: {} --- ⏸️ Rate limited: {} --- 🚫 Rejected: {}".format(
+		results["numRequests"], results["numRateLimited"], results["numRejected"]))
+	print("--- ⏱️ {:.3f} s --- {:.1f} methods/s".format(wallTime, results["methodsPerSecond"]))
+	print("--- {} Checks {}".format("✅" if results["passed"] else "❌", "passed" if results["passed"] else "FAILED"))
+	return results
+
+
+### LOCAL INFERENCE ###
+# Embeddings of methods with a local model (CodeBERT or SFR) and its options, in the calling process.
+# Returns the embeddings, the load and inference times, and the peak RSS of the process.
+def measureInference(embeddingModel, options, methods):
+	# Heavy dependencies (torch, transformers) only in the benchmark processes
+	import Embedding
+	manager = {"codebert": Embedding.CodeBertManager, "sfr": Embedding.SfrManager}[embeddingModel](**options)
+
+	startTime = time.perf_counter()
+	manager.loadModel()
+	loadTime  = time.perf_counter() - startTime
+
+	startTime  = time.perf_counter()
+	embeddings = np.asarray(manager.generateEmbeddings(methods), dtype=np.float32)
+	inferenceTime = time.perf_counter() - startTime
+	peakRss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource is not None else None
+	return embeddings, loadTime, inferenceTime, peakRss
+
+# Cosine similarity of each row of A with the same row of B
+def rowCosine(A, B):
+	return np.sum(A * B, axis=1) / (np.linalg.norm(A, axis=1) * np.linalg.norm(B, axis=1))
+
+# Methods per second, peak RSS and cosine drift against the fp32 baseline ({} options) of local inference configurations.
+# Each configuration runs in a fresh process, so its peak RSS is not mixed with the others.
+def benchmarkInference(embeddingModel = "codebert", configs = None, numMethods = 256):
+	configs = configs or [{}, {"numThreads": os.cpu_count()}, {"quantize": "int8"}, {"backend": "onnx"}]
+	methods = StandIns.fakeMethods(numMethods, numMethods // 4)
+	results = {"embeddingModel": embeddingModel, "numMethods": numMethods, "runs": []}
+
+	baseline = None
+	for options in [{}] + [options for options in configs if options != {}]:
+		try:
+			with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+				embeddings, loadTime, inferenceTime, peakRss = executor.submit(measureInference, embeddingModel, options, methods).result()
+		except Exception as e:
+			print("--- ⚠️ Configuration {} failed: {}".format(options, e))
+			results["runs"].append({"options": options, "error": str(e)})
+			continue
+		if options == {}:
+			baseline = embeddings
+		cosine = rowCosine(embeddings, baseline) if baseline is not None else np.full(len(embeddings), np.nan)
+		results["runs"].append({
+			"options"         : options,
+			"loadTime"        : loadTime,
+			"methodsPerSecond": numMethods / inferenceTime,
+			"peakRss"         : peakRss,
+			"meanCosine"      : float(np.mean(cosine)),
+			"minCosine"       : float(np.min(cosine)),
+		})
+
+	print("\n--- ⭐ Local Inference Benchmark ⭐---")
+	print("--- 🤖 Model: {} --- #️⃣ Methods: {}".format(embeddingModel, numMethods))
+	for run in results["runs"]:
+		if "error" in run:
+			continue
+		print("--- ⏱️ {:40s} | {:8.1f} methods/s | peak RSS {:8.1f} MB | cosine mean {:.5f} min {:.5f}".format(
+			json.dumps(run["options"]), run["methodsPerSecond"], (run["peakRss"] or 0) / 1024 ** 2, run["meanCosine"], run["minCosine"]))
+	return results
+
+
+### STARTUP ###
+# Modules imported by the workers, services and drivers
+ENTRY_POINTS = ["Workers", "App", "Embedding", "Training", "TrainingDriver", "Testing", "ScoringService", "Results"]
+
+# Cumulative import time (microseconds) of each module in the output of python -X importtime
+def parseImportTime(output):
+	cumulative = {}
+	for line in output.splitlines():
+		if not line.startswith("import time:"):
+			continue
+		_, total, name = line[len("import time:"):].split("|")
+		# Skip the header line
+		if total.strip().isdigit():
+			cumulative[name.strip()] = int(total)
+	return cumulative
+
+# Import time, peak RSS and heaviest packages of each entry point, imported in a fresh interpreter (best of numRuns).
+# baseline: results of a previous run (e.g. saved with --output) to report the change of each entry point.
+def benchmarkStartup(entryPoints = None, numRuns = 3, top = 5, baseline = None):
+	entryPoints = entryPoints or ENTRY_POINTS
+	srcPath     = os.path.dirname(os.path.abspath(__file__))
+	baseline    = {run["entryPoint"]: run for run in baseline["runs"]} if baseline is not None else {}
+	results     = {"python": sys.version.split()[0], "numRuns": numRuns, "runs": []}
+
+	for entryPoint in entryPoints:
+		# Peak RSS in KB: VmHWM of the interpreter (ru_maxrss keeps the peak of the parent across exec on Linux)
+		code = "\n".join(["import {}".format(entryPoint),
+						  "try:",
+						  "\tprint(open('/proc/self/status').read().split('VmHWM:')[1].split()[0])",
+						  "except (OSError, IndexError):",
+						  "\timport resource",
+						  "\tprint(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"])
+		best = None
+		for _ in range(numRuns):
+			startTime = time.perf_counter()
+			process   = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=srcPath, capture_output=True, text=True)
+			wallTime  = time.perf_counter() - startTime
+			if process.returncode != 0:
+				best = {"entryPoint": entryPoint, "error": process.stderr.strip().splitlines()[-1]}
+				break
+			cumulative = parseImportTime(process.stderr)
+			run = {
+				"entryPoint": entryPoint,
+				"importTime": cumulative.get(entryPoint, 0) / 1e6,
+				"wallTime"  : wallTime,
+				"peakRss"   : int(process.stdout.split()[-1]) * 1024,
+				"heaviest"  : [{"package": name, "importTime": total / 1e6} for name, total in
+							   sorted(((name, total) for name, total in cumulative.items() if "." not in name and name != entryPoint),
+									  key=lambda item: -item[1])[:top]],
+			}
+			if best is None or run["importTime"] < best["importTime"]:
+				best = run
+		if "error" not in best and entryPoint in baseline and "importTime" in baseline[entryPoint]:
+			best["importTimeChange"] = best["importTime"] - baseline[entryPoint]["importTime"]
+			best["peakRssChange"]    = best["peakRss"] - baseline[entryPoint]["peakRss"]
+		results["runs"].append(best)
+
+	print("\n--- ⭐ Startup Benchmark ⭐---")
+	for run in results["runs"]:
+		if "error" in run:
+			print("--- ⚠️ {:15s} | {}".format(run["entryPoint"], run["error"]))
+			continue
+		change = " ({:+.3f} s)".format(run["importTimeChange"]) if "importTimeChange" in run else ""
+		print("--- ⏱️ {:15s} | import {:6.3f} s{} | wall {:6.3f} s | peak RSS {:7.1f} MB | heaviest: {}".format(
+			run["entryPoint"], run["importTime"], change, run["wallTime"], run["peakRss"] / 1024 ** 2,
+			", ".join("{} {:.3f} s".format(item["package"], item["importTime"]) for item in run["heaviest"][:3])))
+	return results
+
+
+### HOT PATHS ###
+# Stages of the pipeline timed by benchmarkHotPaths, in running order
+HOT_PATHS = ["loadPopList", "downloadDataFlowsFromRedis", "generateMethodsEmbeddings", "downloadPairsEmbeddingsFromRedis",
+			 "loadEmbeddingsFromApp", "trainAnomalyDetectionModel", "testingAnomalyDetectionModel", "saveResults"]
+
+# Run function(*args) as a call of a stage, adding its wall time to stages[name] (the prints of the pipeline are silenced)
+def timeStage(stages, name, function, *args, **kwargs):
+	stage = stages.setdefault(name, {"time": 0.0, "calls": 0})
+	with redirect_stdout(io.StringIO()):
+		startTime = time.perf_counter()
+		result    = function(*args, **kwargs)
+		stage["time"] += time.perf_counter() - startTime
+	stage["calls"] += 1
+	return result
+
+# Wall time of each hot path of the pipeline for every (number of apps, embedding dimension), fully offline:
+# synthetic Data Flows (library methods reused with a Zipf-like popularity) on an in-memory Redis stand-in (or a
+# local Redis at redisUrl), pseudo-embeddings of StandIns.FakeEmbeddingManager. In each category the even apps
+# train the model and the odd apps are tested and saved (JSON Lines).
+# baseline : results of a previous run (e.g. saved with --output); stages slower than (1 + tolerance) times
+#            their baseline time are reported as regressions.
+def benchmarkHotPaths(numApps = (100, 400), dims = (256, 1536), numCategories = 4, detector = "ocsvm", zipfExponent = 1.1,
+					  redisUrl = None, seed = 42, baseline = None, tolerance = 0.2):
+	baseline = {(run["numApps"], run["dim"]): run for run in baseline["runs"]} if baseline is not None else {}
+	results  = {"numCategories": numCategories, "detector": detector, "zipfExponent": zipfExponent, "seed": seed,
+				"redis": "local" if redisUrl is not None else "in-memory", "runs": []}
+	# Import the detector before timing (its first import would be charged to the first training)
+	Detectors.createModel(detector)
+
+	for appsCount in numApps:
+		for dim in dims:
+			if redisUrl is not None:
+				import redis
+				redisServer = redis.Redis.from_url(redisUrl)
+			else:
+				redisServer = StandIns.InMemoryRedis()
+			projectKey = "benchmark.hotpaths.{}.{}".format(appsCount, dim)
+			redisClientExtraction = RedisClient(None, None, None, None, projectKey, client = redisServer)
+			redisClientEmbedding  = RedisClient(None, None, None, None, projectKey + ".embeddings", client = redisServer)
+			embeddingsKey = redisClientEmbedding.projectKey + ".gpt"
+			tmpPath = tempfile.mkdtemp(prefix="damflow_hotpaths_")
+			stages  = {}
+
+			apps, _ = StandIns.fakeDataset(redisClientExtraction, appsCount, numCategories, zipfExponent = zipfExponent, seed = seed)
+			timeStage(stages, "loadPopList", redisClientExtraction.loadPopList, [sha256 for sha256, _ in apps])
+
+			# Extraction results --> distinct methods --> fake embeddings on Redis
+			apps = [App(sha256, categoryID = categoryID) for sha256, categoryID in apps]
+			embeddingsManager = EmbeddingsManager(redisClientEmbedding, "gpt", manager = StandIns.FakeEmbeddingManager(dim))
+			for app in apps:
+				timeStage(stages, "downloadDataFlowsFromRedis", app.downloadDataFlowsFromRedis, redisClientExtraction)
+				embeddingsManager.loadDataFlowsFromApp(app.dataFlows)
+			timeStage(stages, "generateMethodsEmbeddings", embeddingsManager.generateMethodsEmbeddings, redisClientEmbedding, "gpt", resume = False)
+
+			for app in apps:
+				timeStage(stages, "downloadPairsEmbeddingsFromRedis", app.downloadPairsEmbeddingsFromRedis, redisClientEmbedding, "gpt")
+
+			# Train and test one model per category
+			for categoryID in range(numCategories):
+				categoryApps = [app for app in apps if app.categoryID == categoryID]
+				modelPath = os.path.join(tmpPath, str(categoryID), "gpt.joblib")
+				trainingManager = TrainingManager("gpt")
+				for app in categoryApps[0::2]:
+					timeStage(stages, "loadEmbeddingsFromApp", trainingManager.loadEmbeddingsFromApp,
+							  app.embeddings["gpt"], app.dataFlows.getPairsKeys())
+				timeStage(stages, "trainAnomalyDetectionModel", trainingManager.trainAnomalyDetectionModel, modelPath, detector)
+
+				with redirect_stdout(io.StringIO()):
+					testingManager = TestingManager(modelPath, os.path.join(tmpPath, "results.jsonl"), "gpt")
+				for app in categoryApps[1::2]:
+					timeStage(stages, "testingAnomalyDetectionModel", testingManager.testingAnomalyDetectionModel, app, redisClientEmbedding)
+					timeStage(stages, "saveResults", testingManager.saveResults, app)
+				# The buffered results are written on close
+				timeStage(stages, "saveResults", testingManager.close)
+				stages["saveResults"]["calls"] -= 1
+
+			redisServer.delete(redisClientExtraction.popKey, redisClientExtraction.resultsKey, redisClientExtraction.errorKey, embeddingsKey,
+							   embeddingsManager.getMethodsCheckpointKey(embeddingsKey),
+							   EmbeddingsManager.getFailedKey(embeddingsKey))
+			redisServer.close()
+			shutil.rmtree(tmpPath)
+
+			run = {
+				"numApps"   : appsCount,
+				"dim"       : dim,
+				"numPairs"  : sum(len(app.dataFlows.sourceIdx) for app in apps),
+				"numMethods": len(embeddingsManager.distinctMethods),
+				"totalTime" : sum(stage["time"] for stage in stages.values()),
+				"stages"    : {name: dict(stages[name], perCall=stages[name]["time"] / max(1, stages[name]["calls"]))
+							   for name in HOT_PATHS if name in stages},
+			}
+			reference = baseline.get((appsCount, dim))
+			if reference is not None:
+				for name, stage in run["stages"].items():
+					if name in reference["stages"] and reference["stages"][name]["time"] > 0:
+						stage["ratio"]      = stage["time"] / reference["stages"][name]["time"]
+						stage["regression"] = stage["ratio"] > 1 + tolerance
+			results["runs"].append(run)
+
+	print("\n--- ⭐ Hot Paths Benchmark ⭐---")
+	print("--- ☁️ Redis: {} --- 📦 Detector: {} --- 🗂️ Categories: {}".format(results["redis"], detector, numCategories))
+	for run in results["runs"]:
+		print("\n--- #️⃣ Apps {} | 📐 dim {} | {} pairs | {} methods | total {:.3f} s".format(
+			run["numApps"], run["dim"], run["numPairs"], run["numMethods"], run["totalTime"]))
+		for name, stage in run["stages"].items():
+			change = ""
+			if "ratio" in stage:
+				change = " | {:5.2f}x baseline{}".format(stage["ratio"], " ⚠️ REGRESSION" if stage["regression"] else "")
+			print("--- ⏱️ {:34s} | {:8.3f} s | {:5d} calls | {:8.3f} ms/call{}".format(
+				name, stage["time"], stage["calls"], stage["perCall"] * 1000, change))
+	results["regressions"] = [{"numApps": run["numApps"], "dim": run["dim"], "stage": name}
+							  for run in results["runs"] for name, stage in run["stages"].items() if stage.get("regression")]
+	return results
+
+
+# Command line entry point
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="DamFlow benchmarks")
+	subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+	extractor = subparsers.add_parser("extractor", help="Fresh JVM per APK vs warm extractor daemon")
+	extractor.add_argument("--csv", default="../../0_Data/1_AndroCatSet_Mini.csv")
+	extractor.add_argument("--num-apps", type=int, default=5)
+	extractor.add_argument("--tmp-path", default="../../0_Data/TMP/BENCHMARK/")
+	extractor.add_argument("--extractor", default="../1_Java/damflow_extractor/target/damflow_extractor-1.0-jar-with-dependencies.jar")
+	extractor.add_argument("--direction", default="backward")
+	extractor.add_argument("--sources", default="nosources")
+	extractor.add_argument("--max-heap", default="24g")
+
+	detectors = subparsers.add_parser("detectors", help="Fit/predict time and outliers agreement of the anomaly detectors")
+	detectors.add_argument("--embeddings", default=None, help="Training embeddings (.npy), synthetic if missing")
+	detectors.add_argument("--num-pairs", type=int, default=20000, help="Synthetic embeddings: number of pairs")
+	detectors.add_argument("--dim", type=int, default=3072, help="Synthetic embeddings: length of the feature vectors")
+	detectors.add_argument("--detectors", nargs="+", default=None, choices=list(Detectors.DETECTORS))
+
+	reducers = subparsers.add_parser("reducers", help="Speedup vs change of the outliers set of the reduction stages")
+	reducers.add_argument("--embeddings", default=None, help="Training embeddings (.npy), synthetic if missing")
+	reducers.add_argument("--num-pairs", type=int, default=20000, help="Synthetic embeddings: number of pairs")
+	reducers.add_argument("--dim", type=int, default=3072, help="Synthetic embeddings: length of the feature vectors")
+	reducers.add_argument("--detector", default="ocsvm", choices=list(Detectors.DETECTORS))
+	reducers.add_argument("--reducers", nargs="+", type=json.loads,
+						  default=[["pca", {"n_components": 0.95}], ["pca", {"n_components": 256}], ["svd", {"n_components": 256}], ["srp", {"n_components": 256}]],
+						  help="JSON [name, params] items, e.g. '[\"pca\", {\"n_components\": 128}]'")
+
+	scoring = subparsers.add_parser("scoring", help="p50/p99 latency and requests per second of the scoring service")
+	scoring.add_argument("--requests", type=int, default=2000)
+	scoring.add_argument("--concurrency", type=int, default=16)
+	scoring.add_argument("--max-wait-ms", type=float, nargs="+", default=[0, 5])
+	scoring.add_argument("--num-apps", type=int, default=200)
+	scoring.add_argument("--dim", type=int, default=256, help="Length of the fake method embeddings")
+	scoring.add_argument("--detector", default="ocsvm", choices=list(Detectors.DETECTORS))
+
+	engine = subparsers.add_parser("engine", help="Retries, rate limits and failure isolation of the async GPT engine on a local stand-in")
+	engine.add_argument("--num-methods", type=int, default=2000)
+	engine.add_argument("--num-over-long", type=int, default=3, help="Methods rejected by the stand-in (400)")
+	engine.add_argument("--rate-limit-first", type=int, default=5, help="Initial requests answered with a 429")
+	engine.add_argument("--retry-after", type=float, default=0.2, help="Retry-After of the 429 responses (seconds)")
+	engine.add_argument("--max-batch-inputs", type=int, default=100)
+	engine.add_argument("--max-in-flight", type=int, default=8)
+
+	inference = subparsers.add_parser("inference", help="Methods per second, peak RSS and cosine drift of the local inference options")
+	inference.add_argument("--embedding-model", default="codebert", choices=["codebert", "sfr"])
+	inference.add_argument("--num-methods", type=int, default=256)
+	inference.add_argument("--configs", nargs="+", type=json.loads, default=None,
+						   help="Manager options of each run, e.g. '{\"numThreads\": 4}' '{\"quantize\": \"int8\"}' '{\"backend\": \"onnx\"}'")
+
+	startup = subparsers.add_parser("startup", help="Import time (python -X importtime) and peak RSS of the entry points")
+	startup.add_argument("--entry-points", nargs="+", default=None, help="Modules to import (default: {})".format(", ".join(ENTRY_POINTS)))
+	startup.add_argument("--runs", type=int, default=3)
+	startup.add_argument("--baseline", default=None, help="Results of a previous run (JSON) to compare with")
+
+	hotpaths = subparsers.add_parser("hotpaths", help="Time of each hot path of the pipeline on synthetic data, offline")
+	hotpaths.add_argument("--num-apps", type=int, nargs="+", default=[100, 400])
+	hotpaths.add_argument("--dims", type=int, nargs="+", default=[256, 1536], help="Lengths of the fake method embeddings")
+	hotpaths.add_argument("--num-categories", type=int, default=4)
+	hotpaths.add_argument("--detector", default="ocsvm", choices=list(Detectors.DETECTORS))
+	hotpaths.add_argument("--zipf-exponent", type=float, default=1.1, help="Popularity skew of the library methods")
+	hotpaths.add_argument("--redis-url", default=None, help="Local Redis (e.g. redis://localhost:6379/15) instead of the in-memory stand-in")
+	hotpaths.add_argument("--baseline", default=None, help="Results of a previous run (JSON) to compare with")
+	hotpaths.add_argument("--tolerance", type=float, default=0.2, help="Slowdown over the baseline reported as a regression")
+
+	parser.add_argument("--output", default=None, help="Where to save the results (JSON)")
+	args = parser.parse_args()
+
+	load_dotenv()
+	if args.benchmark == "extractor":
+		os.makedirs(args.tmp_path, exist_ok=True)
+		sha256s = pd.read_csv(args.csv)["sha256"].head(args.num_apps)
+		apkPaths = [path for path in (Downloader.downloadApk(sha256, args.tmp_path) for sha256 in sha256s) if path is not None]
+		results = benchmarkExtractor(apkPaths, args.extractor, os.getenv("ANDROID_PATH"), args.direction, args.sources, maxHeap = args.max_heap)
+		shutil.rmtree(args.tmp_path)
+
+	if args.benchmark in ["detectors", "reducers"]:
+		if args.embeddings is not None:
+			X = np.load(args.embeddings, mmap_mode="r")
+		else:
+			X = np.random.default_rng(42).standard_normal((args.num_pairs, args.dim)).astype(np.float32)
+		if args.benchmark == "detectors":
+			results = benchmarkDetectors(X, args.detectors)
+		else:
+			results = benchmarkReducers(X, args.reducers, args.detector)
+
+	if args.benchmark == "scoring":
+		results = benchmarkScoringService(args.requests, args.concurrency, [maxWait / 1000 for maxWait in args.max_wait_ms],
+										  args.num_apps, dim = args.dim, detector = args.detector)
+
+	if args.benchmark == "engine":
+		results = benchmarkGptEngine(args.num_methods, args.num_over_long, args.rate_limit_first, args.retry_after,
+									 maxBatchInputs = args.max_batch_inputs, maxInFlight = args.max_in_flight)
+
+	if args.benchmark == "inference":
+		results = benchmarkInference(args.embedding_model, args.configs, args.num_methods)
+
+	if args.benchmark == "startup":
+		baseline = None
+		if args.baseline is not None:
+			with open(args.baseline) as file:
+				baseline = json.load(file)
+		results = benchmarkStartup(args.entry_points, args.runs, baseline = baseline)
+
+	if args.benchmark == "hotpaths":
+		baseline = None
+		if args.baseline is not None:
+			with open(args.baseline) as file:
+				baseline = json.load(file)
+		results = benchmarkHotPaths(args.num_apps, args.dims, args.num_categories, args.detector, args.zipf_exponent,
+									args.redis_url, baseline = baseline, tolerance = args.tolerance)
+
+	if args.output is not None:
+		with open(args.output, "w") as file:
+			json.dump(results, file, indent=4)
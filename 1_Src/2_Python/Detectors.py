@@ -0,0 +1,110 @@
+# Registry of the Anomaly Detection models, selected by name.
+# Every detector is a scikit-learn estimator (or Pipeline) with fit(X) and predict(X) --> +1 / -1,
+# so the saved .joblib files are loaded and used by TestingManager in the same way.
+# An optional reduction stage can be put in front of a detector: the Pipeline (reducer + detector) is saved
+# in the same .joblib file, so the reduction is applied automatically at test time.
+# scikit-learn modules are imported only when a detector is created.
+
+
+# Exact One-Class SVM with RBF kernel (cost between quadratic and cubic in the number of pairs)
+def createOneClassSvm(gamma = 0.001, nu = 0.005, tol = 0.001, cache_size = 500):
+	from sklearn.svm import OneClassSVM
+	return OneClassSVM(kernel='rbf', gamma=gamma, cache_size=cache_size, tol=tol, nu=nu)
+
+# Nystroem approximation of the RBF kernel + linear One-Class SVM trained with SGD (linear in the number of pairs)
+def createNystroemSgd(gamma = 0.001, nu = 0.005, n_components = 1000, random_state = 42):
+	from sklearn.kernel_approximation import Nystroem
+	from sklearn.linear_model         import SGDOneClassSVM
+	from sklearn.pipeline             import Pipeline
+	return Pipeline([
+		("kernel",   Nystroem(kernel='rbf', gamma=gamma, n_components=n_components, random_state=random_state)),
+		("detector", SGDOneClassSVM(nu=nu, random_state=random_state)),
+	])
+
+# Random Fourier features approximation of the RBF kernel + linear One-Class SVM trained with SGD
+def createRffSgd(gamma = 0.001, nu = 0.005, n_components = 1000, random_state = 42):
+	from sklearn.kernel_approximation import RBFSampler
+	from sklearn.linear_model         import SGDOneClassSVM
+	from sklearn.pipeline             import Pipeline
+	return Pipeline([
+		("kernel",   RBFSampler(gamma=gamma, n_components=n_components, random_state=random_state)),
+		("detector", SGDOneClassSVM(nu=nu, random_state=random_state)),
+	])
+
+# Isolation Forest, trees built in parallel
+def createIsolationForest(n_estimators = 200, contamination = 0.005, n_jobs = -1, random_state = 42):
+	from sklearn.ensemble import IsolationForest
+	return IsolationForest(n_estimators=n_estimators, contamination=contamination, n_jobs=n_jobs, random_state=random_state)
+
+
+# Name --> factory
+DETECTORS = {
+	"ocsvm"        : createOneClassSvm,
+	"nystroem-sgd" : createNystroemSgd,
+	"rff-sgd"      : createRffSgd,
+	"iforest"      : createIsolationForest,
+}
+
+# Create a new (unfitted) detector by name, params override the defaults of its factory
+def createDetector(name, **params):
+	if name not in DETECTORS:
+		raise ValueError("--- ⚠️ Error: Unsupported detector '{}'. Please use one of: {}".format(name, ", ".join(DETECTORS)))
+	return DETECTORS[name](**params)
+
+# Fit a model (detector or Pipeline) with a weight per row of X.
+# The weights go to the last step of the (nested) Pipelines; if it does not accept sample_weight they are ignored.
+def fitModel(model, X, sampleWeight = None):
+	if sampleWeight is None:
+		return model.fit(X)
+	import inspect
+	estimator, prefix = model, ""
+	while hasattr(estimator, "steps"):
+		name, estimator = estimator.steps[-1]
+		prefix += name + "__"
+	if "sample_weight" not in inspect.signature(estimator.fit).parameters:
+		print("--- ⚠️ {} does not support sample_weight: weights ignored".format(type(estimator).__name__))
+		return model.fit(X)
+	return model.fit(X, **{prefix + "sample_weight": sampleWeight})
+
+
+### REDUCTION ###
+# PCA to a target dimension (int) or to a fraction of the explained variance (float in (0, 1))
+def createPca(n_components = 0.95, whiten = False, random_state = 42):
+	from sklearn.decomposition import PCA
+	svd_solver = "full" if isinstance(n_components, float) else "randomized"
+	return PCA(n_components=n_components, whiten=whiten, svd_solver=svd_solver, random_state=random_state)
+
+# Truncated SVD computed with the randomized algorithm (no centering)
+def createRandomizedSvd(n_components = 256, n_iter = 5, random_state = 42):
+	from sklearn.decomposition import TruncatedSVD
+	return TruncatedSVD(n_components=n_components, algorithm="randomized", n_iter=n_iter, random_state=random_state)
+
+# Sparse random projection (no fitting cost, distances preserved up to eps)
+def createSparseRandomProjection(n_components = 256, random_state = 42):
+	from sklearn.random_projection import SparseRandomProjection
+	return SparseRandomProjection(n_components=n_components, dense_output=True, random_state=random_state)
+
+
+# Name --> factory
+REDUCERS = {
+	"pca" : createPca,
+	"svd" : createRandomizedSvd,
+	"srp" : createSparseRandomProjection,
+}
+
+# Create a new (unfitted) reducer by name, params override the defaults of its factory
+def createReducer(name, **params):
+	if name not in REDUCERS:
+		raise ValueError("--- ⚠️ Error: Unsupported reducer '{}'. Please use one of: {}".format(name, ", ".join(REDUCERS)))
+	return REDUCERS[name](**params)
+
+# Create the model to train: the detector alone, or a Pipeline with steps "reducer" and "detector"
+def createModel(detector = "ocsvm", detectorParams = None, reducer = None, reducerParams = None):
+	model = createDetector(detector, **(detectorParams or {}))
+	if reducer is None:
+		return model
+	from sklearn.pipeline import Pipeline
+	return Pipeline([
+		("reducer",  createReducer(reducer, **(reducerParams or {}))),
+		("detector", model),
+	])
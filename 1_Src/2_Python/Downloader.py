@@ -0,0 +1,196 @@
+# Imports
+from   requests.adapters import HTTPAdapter
+from   dotenv            import load_dotenv
+import threading
+import requests
+import random
+import queue
+import time
+import os
+
+# AndroZoo download endpoint
+ANDROZOO_URL = "https://androzoo.uni.lu/api/download?apikey={}&sha256={}"
+
+# Shared keep-alive session and AndroZoo API KEY (created once per process)
+session      = None
+androzooKey  = None
+sessionLock  = threading.Lock()
+
+
+# Get the pooled keep-alive session
+def getSession(poolSize = 16):
+	global session
+	with sessionLock:
+		if session is None:
+			session = requests.Session()
+			adapter = HTTPAdapter(pool_connections=poolSize, pool_maxsize=poolSize)
+			session.mount("https://", adapter)
+			session.mount("http://", adapter)
+	return session
+
+# Load the AndroZoo API KEY once
+def getAndrozooKey():
+	global androzooKey
+	if androzooKey is None:
+		load_dotenv()
+		androzooKey = os.getenv("ANDROZOO_API_KEY")
+	return androzooKey
+
+# Exponential backoff with full jitter
+def getBackoff(retries, baseBackoff = 2.0, maxBackoff = 120.0):
+	return random.uniform(0, min(maxBackoff, baseBackoff * (2 ** retries)))
+
+# Path where the APK of a sha256 is stored
+def getApkPath(path, sha256):
+	return path + '{}.apk'.format(sha256)
+
+
+# Download an APK from AndroZoo streaming it to a temporary file, renamed atomically when complete.
+# Returns the APK path, or None if the download failed.
+def downloadApk(sha256, path, maxRetries = 10, chunkSize = 1024 * 1024, timeout = 60):
+	apkPath = getApkPath(path, sha256)
+	tmpPath = apkPath + ".part.{}".format(threading.get_ident())
+	apkUrl  = ANDROZOO_URL.format(getAndrozooKey(), sha256)
+
+	for retries in range(maxRetries):
+		print("--- 🔄 Tentive N: {}".format(retries))
+		try:
+			with getSession().get(apkUrl, allow_redirects=True, stream=True, timeout=timeout) as req:
+				# Check for HTTP errors like 502 or 503
+				if req.status_code in [429, 502, 503, 504]:
+					backoff = getBackoff(retries)
+					print(f"--- ❌ Error: Received status code {req.status_code}. Retrying in {backoff:.1f} seconds...")
+					time.sleep(backoff)
+					continue
+				elif req.status_code != 200:
+					print(f"--- ❌ Error: Received unexpected status code {req.status_code}.")
+					return None
+
+				# Stream the content to the temporary file
+				with open(tmpPath, "wb") as apkFile:
+					for chunk in req.iter_content(chunk_size=chunkSize):
+						apkFile.write(chunk)
+			os.replace(tmpPath, apkPath)
+			return apkPath
+
+		except requests.RequestException as e:
+			backoff = getBackoff(retries)
+			print(f"--- ❌ Error: {e}. Retrying in {backoff:.1f} seconds...")
+			time.sleep(backoff)
+		finally:
+			if os.path.exists(tmpPath):
+				os.remove(tmpPath)
+
+	print(f"--- ❌ Error: Failed to download APK after {maxRetries} attempts.")
+	return None
+
+
+# Background prefetcher: claims the next sha256s of a worker from the pop List and downloads their APKs
+# while the current analysis is running.
+# depth           : max number of downloaded APKs waiting to be analyzed
+# maxDiskBytes    : max disk space of the APKs claimed, from before their download until the worker is done with
+#                   them (release). Space is reserved before each claim with the estimate apkReserveBytes and
+#                   adjusted to the real size after the download: an APK larger than the estimate can exceed the
+#                   budget by the difference.
+# apkReserveBytes : estimated size of an APK reserved before its download
+class ApkPrefetcher:
+
+	redisClient  = None
+	workerID     = None
+	path         = None
+	depth        = None
+	maxDiskBytes = None
+	apkReserveBytes = None
+
+	# Downloaded sha256s waiting to be analyzed, None marks the end of the pop List
+	ready     = None
+	# Disk space reserved or used, and the bytes accounted for each APK not released yet
+	diskBytes = None
+	sizes     = None
+	condition = None
+	stopEvent = None
+	thread    = None
+
+	def __init__(self, redisClient, workerID, path, depth = 2, maxDiskBytes = 4 * 1024 ** 3, apkReserveBytes = 256 * 1024 ** 2):
+		self.redisClient  = redisClient
+		self.workerID     = workerID
+		self.path         = path
+		self.depth        = depth
+		self.maxDiskBytes = maxDiskBytes
+		self.apkReserveBytes = apkReserveBytes
+		self.ready        = queue.Queue(maxsize=depth)
+		self.diskBytes    = 0
+		self.sizes        = {}
+		self.condition    = threading.Condition()
+		self.stopEvent    = threading.Event()
+
+	def start(self):
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+		return self
+
+	# Reserve the space of the next APK once it fits in the disk budget (always when nothing is on disk).
+	# Returns False if stopped while waiting.
+	def reserveDisk(self):
+		with self.condition:
+			while (self.diskBytes > 0 and self.diskBytes + self.apkReserveBytes > self.maxDiskBytes
+				   and not self.stopEvent.is_set()):
+				self.condition.wait(timeout=1)
+			if self.stopEvent.is_set():
+				return False
+			self.diskBytes += self.apkReserveBytes
+			return True
+
+	def run(self):
+		while self.reserveDisk():
+			sha256 = self.redisClient.claimWork(self.workerID)
+			if sha256 is None:
+				self.release(None, self.apkReserveBytes)
+				self.ready.put(None)
+				return
+
+			# Skip the download if already processed, the worker will skip it too
+			size = 0
+			if not self.redisClient.client.hexists(self.redisClient.resultsKey, sha256):
+				apkPath = downloadApk(sha256, self.path)
+				size = os.path.getsize(apkPath) if apkPath is not None else 0
+			# Replace the estimate with the real size
+			with self.condition:
+				self.diskBytes += size - self.apkReserveBytes
+				self.sizes[sha256] = size
+				self.condition.notify_all()
+			self.ready.put(sha256)
+
+	# Next claimed sha256 (its APK is already on disk if the download succeeded), None when the pop List is empty.
+	# Its space stays accounted until release(sha256).
+	def next(self):
+		sha256 = self.ready.get()
+		if sha256 is None:
+			self.ready.put(None)
+		return sha256
+
+	# Give back the space of an APK once it is deleted (size: bytes to give back instead of those of sha256)
+	def release(self, sha256, size = None):
+		with self.condition:
+			self.diskBytes -= self.sizes.pop(sha256, 0) if size is None else size
+			self.condition.notify_all()
+
+	# Stop prefetching and delete the APKs that were not analyzed.
+	# Returns their sha256s (they are still in the processing list of the worker).
+	def stop(self):
+		self.stopEvent.set()
+		with self.condition:
+			self.condition.notify_all()
+		pending = []
+		while self.thread is not None and self.thread.is_alive() or not self.ready.empty():
+			try:
+				item = self.ready.get(timeout=0.1)
+			except queue.Empty:
+				continue
+			if item is None:
+				break
+			pending.append(item)
+			if os.path.exists(getApkPath(self.path, item)):
+				os.remove(getApkPath(self.path, item))
+			self.release(item)
+		return pending
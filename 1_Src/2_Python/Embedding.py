@@ -1,12 +1,21 @@
-from   transformers         import AutoTokenizer, AutoModel
+from   __future__           import annotations
 from   dotenv               import load_dotenv
-from   torch                import Tensor
-import tiktoken
-import openai
-import torch
-import json
+import importlib.util
+import abc
+import hashlib
+import asyncio
+import bisect
+import random
+import time
 import os
 
+# The heavy dependencies of the embedding backends (openai and tiktoken for "gpt", torch and transformers for the
+# local models, onnxruntime for their ONNX backend) are imported only when a backend is first instantiated or used,
+# so the processes importing this module without embedding anything do not pay for them.
+
+# Lifetime of the checkpoint of a set of methods, refreshed by every chunk (seconds)
+CHECKPOINT_TTL = 30 * 24 * 3600
+
 # Class to manage all the Embeddings together
 class EmbeddingsManager:
 
@@ -26,7 +35,9 @@ class EmbeddingsManager:
 
 
 	# Initializer
-	def __init__(self, redisClient, embeddingModel):
+	# managerOptions: options of the model manager, e.g. numThreads, quantize="int8" or backend="onnx" for the local models
+	# manager       : an already created backend to use instead (e.g. StandIns.FakeEmbeddingManager)
+	def __init__(self, redisClient, embeddingModel, manager = None, **managerOptions):
 		self.distinctMethods       = set()
 		self.redisClient           = redisClient
 		self.numApps               = 0
@@ -34,12 +45,10 @@ class EmbeddingsManager:
 
 		# Select the embedding model
 		self.embeddingModel = embeddingModel
-		if embeddingModel == "gpt":
-			self.manager = GptManager()
-		elif embeddingModel == "codebert":
-			self.manager = CodeBertManager()
-		elif embeddingModel == "sfr":
-			self.manager = SfrManager()
+		if manager is not None:
+			self.manager = manager
+		elif embeddingModel in EMBEDDING_MANAGERS:
+			self.manager = createEmbeddingManager(embeddingModel, **managerOptions)
 		else:
 			print("\n--- ⚠️ Error: Unsupported embeddingModel type. Please use 'gpt', 'codebert', or 'sfr'.")
 
@@ -64,43 +73,184 @@ class EmbeddingsManager:
 		self.numApps += 1
 
 
+	# Redis keys of the progress of the generation for a model hash: checkpoint of a set of methods (hash,
+	# keyed by the digest of the methods, so runs over different methods do not overwrite each other's
+	# checkpoint) and failed methods (set)
+	@staticmethod
+	def getCheckpointKey(modelRedisKey, digest):
+		return modelRedisKey + ".checkpoint." + digest[:16]
+
+	@staticmethod
+	def getFailedKey(modelRedisKey):
+		return modelRedisKey + ".failed"
+
+	# Digest of the sorted distinct methods: a checkpoint is only valid for the same set of methods
+	@staticmethod
+	def getMethodsDigest(methods):
+		return hashlib.sha256("\n".join(methods).encode("utf-8")).hexdigest()
+
+	# Checkpoint key of the distinct methods loaded
+	def getMethodsCheckpointKey(self, modelRedisKey):
+		return self.getCheckpointKey(modelRedisKey, self.getMethodsDigest(sorted(self.distinctMethods)))
+
+	# Planning phase: the methods to embed, sorted.
+	# With a valid checkpoint only the methods after the last one checkpointed are checked, plus the failed ones.
+	# The membership in the model hash is checked in bulk (pipelined HEXISTS).
+	def planMethodsEmbeddings(self, redisClient, modelRedisKey, resume = True, batchSize = 10000):
+		methods = sorted(self.distinctMethods)
+		checkpointKey = self.getCheckpointKey(modelRedisKey, self.getMethodsDigest(methods))
+
+		start = 0
+		lastMethod = redisClient.client.hget(checkpointKey, "lastMethod")
+		if resume and lastMethod is not None:
+			start = bisect.bisect_right(methods, lastMethod.decode("utf-8"))
+			print("--- ⏯️ Resume after checkpoint: {} of {} methods already done".format(start, len(methods)))
+		else:
+			redisClient.client.delete(checkpointKey)
+		redisClient.client.hset(checkpointKey, "numMethods", len(methods))
+		redisClient.client.expire(checkpointKey, CHECKPOINT_TTL)
+
+		failed = {method.decode("utf-8") for method in redisClient.client.smembers(self.getFailedKey(modelRedisKey))}
+		candidates = sorted((failed & self.distinctMethods).union(methods[start:]))
+		exists  = redisClient.existsMany(modelRedisKey, candidates, batchSize)
+		toEmbed = [method for method, stored in zip(candidates, exists) if not stored]
+
+		print("--- 🗺️ Plan: {} methods, {} checked ({} failed before), {} to embed".format(
+			len(methods), len(candidates), len(failed), len(toEmbed)), flush=True)
+		return toEmbed
+
+	# Checkpoint a processed chunk (sorted methods): last method done and failed methods, in one pipeline
+	def saveProgress(self, redisClient, modelRedisKey, methods, failed):
+		if len(methods) == 0:
+			return
+		checkpointKey = self.getMethodsCheckpointKey(modelRedisKey)
+		failedKey     = self.getFailedKey(modelRedisKey)
+		lastMethod    = redisClient.client.hget(checkpointKey, "lastMethod")
+		lastMethod    = max(methods[-1], lastMethod.decode("utf-8")) if lastMethod is not None else methods[-1]
+		failedSet     = set(failed)
+		succeeded     = [method for method in methods if method not in failedSet]
+
+		pipe = redisClient.client.pipeline(transaction=False)
+		if len(succeeded) > 0:
+			pipe.srem(failedKey, *succeeded)
+		if len(failed) > 0:
+			pipe.sadd(failedKey, *failed)
+		pipe.hset(checkpointKey, "lastMethod", lastMethod)
+		pipe.expire(checkpointKey, CHECKPOINT_TTL)
+		pipe.execute()
+
+	# Methods that failed in the previous runs (retried by the next run)
+	def getFailedMethods(self, redisClient, embeddingModel = "gpt"):
+		failedKey = self.getFailedKey(redisClient.projectKey + ".{}".format(embeddingModel))
+		return sorted(method.decode("utf-8") for method in redisClient.client.smembers(failedKey))
+
+	# Forget the checkpoint of the methods loaded and the failed methods of a model hash
+	def resetProgress(self, redisClient, embeddingModel = "gpt"):
+		modelRedisKey = redisClient.projectKey + ".{}".format(embeddingModel)
+		redisClient.client.delete(self.getMethodsCheckpointKey(modelRedisKey), self.getFailedKey(modelRedisKey))
+
+
+	# Embeddings of many methods with the batched path of the manager, list aligned with methods.
+	# If the batch fails, the methods are embedded one at a time to isolate the failing ones (None).
+	def embedMethods(self, methods):
+		try:
+			return self.manager.generateEmbeddings(methods)
+		except Exception as e:
+			print("--- ❌ Batch Failed with Exception {} --> Retry one by one".format(e), flush=True)
+		embeddings = []
+		for method in methods:
+			try:
+				embeddings.append(self.manager.generateEmbedding(method))
+			except Exception as e:
+				print("--- ❌ Failed for method {} with Exception {}".format(method, e), flush=True)
+				embeddings.append(None)
+		return embeddings
+
+
 	# Generate Embeddings and store them to REDIS.
-	# Model --> "gpt", "codebert", "sfr" 
-	def generateMethodsEmbeddings(self, redisClient, embeddingModel="gpt"):
+	# The methods to embed are planned first (see planMethodsEmbeddings), then embedded in sorted order in chunks
+	# with the batched path of the manager. Each chunk is written back in one pipeline and checkpointed, so an
+	# interrupted run resumes after the last chunk done. Returns the list of methods that failed in this run.
+	# Model --> "gpt", "codebert", "sfr"
+	def generateMethodsEmbeddings(self, redisClient, embeddingModel="gpt", chunkSize=1000, resume=True):
 
 		modelRedisKey = redisClient.projectKey + ".{}".format(embeddingModel)
 		print("--- 🗝️ REDIS KEY: {}".format(modelRedisKey))
 
-		for method in self.distinctMethods:
+		methods = self.planMethodsEmbeddings(redisClient, modelRedisKey, resume)
+		failed  = []
+		for i in range(0, len(methods), chunkSize):
+			chunk = methods[i:i + chunkSize]
 			print("---"*20+"\n")
-			print("--- 🌊 Method: {}".format(method))
-			# Skip if already processed
-			if redisClient.client.hget(modelRedisKey, method) is not None:
-				print("--- ⏭️ Already Processed --> Skip")
-				continue
-			
-			else:
-				try:
-					print("--- ▶️ Model: {}".format(embeddingModel))
-					emb = self.manager.generateEmbedding(method)
-					self.shape = len(emb)
-						
-					# To string
-					embString = ','.join([str(f) for f in emb])
-
-					# Push to Redis
-					redisClient.client.hset(modelRedisKey, method, embString)
-
-					# Print message SUCCESS
-					print("--- ✅ Success for method: {}".format(method), flush=True)
-					
-				# Print message FAIL    
-				except Exception as e:
-					print("--- ❌ Failed with Exception {}".format(e), flush=True)
+			print("--- 🌊 Methods: {} - {} of {}".format(i, i + len(chunk), len(methods)))
+
+			print("--- ▶️ Model: {}".format(embeddingModel))
+			embeddings = self.embedMethods(chunk)
+
+			# Push to Redis (binary float32 encoding), then checkpoint
+			results = {method: emb for method, emb in zip(chunk, embeddings) if emb is not None}
+			if len(results) > 0:
+				self.shape = len(next(iter(results.values())))
+				redisClient.uploadEmbeddings(modelRedisKey, results)
+			chunkFailed = [method for method in chunk if method not in results]
+			self.saveProgress(redisClient, modelRedisKey, chunk, chunkFailed)
+			failed.extend(chunkFailed)
+
+			# Print message SUCCESS
+			print("--- ✅ Success for {} methods".format(len(results)), flush=True)
 
 		print("---"*20+"\n")
+		print("--- 📊 Embedded: {} --- Failed methods: {} (kept in {})".format(len(methods) - len(failed), len(failed), self.getFailedKey(modelRedisKey)))
+		return failed
 
 
+	# Generate GPT Embeddings with the asyncio engine and store them to REDIS.
+	# Use "await" inside a running event loop (e.g. Jupyter), otherwise it is run with asyncio.run.
+	# The methods are planned as in generateMethodsEmbeddings; the progress is checkpointed when the run ends.
+	# Returns the list of methods that failed.
+	def generateMethodsEmbeddingsAsync(self, redisClient, embeddingModel="gpt", resume=True, **engineOptions):
+		if not isinstance(self.manager, GptManager):
+			raise ValueError("--- ⚠️ The asyncio engine is only available for 'gpt'")
+
+		modelRedisKey = redisClient.projectKey + ".{}".format(embeddingModel)
+		print("--- 🗝️ REDIS KEY: {}".format(modelRedisKey))
+
+		methods = self.planMethodsEmbeddings(redisClient, modelRedisKey, resume)
+		engine  = AsyncGptEngine(self.manager, **engineOptions)
+
+		async def runAndCheckpoint():
+			failed = await engine.run(methods, redisClient, modelRedisKey)
+			self.saveProgress(redisClient, modelRedisKey, methods, sorted(failed))
+			return failed
+
+		coroutine = runAndCheckpoint()
+		try:
+			asyncio.get_running_loop()
+		except RuntimeError:
+			return asyncio.run(coroutine)
+		return coroutine
+
+
+# Group inputs into batches of similar length to keep padding waste low.
+# lengths: number of tokens of each input
+# Returns a list of lists of input indices.
+def lengthBucketedBatches(lengths, maxBatchSize, maxBatchTokens):
+	batches = []
+	current = []
+	currentMaxLength = 0
+	for i in sorted(range(len(lengths)), key=lambda i: lengths[i]):
+		newMaxLength = max(currentMaxLength, lengths[i])
+		# Padded size of the batch if this input is added
+		if current and (len(current) >= maxBatchSize or newMaxLength * (len(current) + 1) > maxBatchTokens):
+			batches.append(current)
+			current = []
+			newMaxLength = lengths[i]
+		current.append(i)
+		currentMaxLength = newMaxLength
+	if current:
+		batches.append(current)
+	return batches
+
 
 class GptManager:
 
@@ -110,8 +260,14 @@ class GptManager:
 	model     = None
 	price     = None
 	tokenizer = None
+	encoding  = None
+
+	# Limits of a single embeddings request
+	maxBatchInputs = None
+	maxBatchTokens = None
 		
-	def __init__(self , model = "text-embedding-3-small", price = 0.02, tokenizer = "cl100k_base"):
+	def __init__(self , model = "text-embedding-3-small", price = 0.02, tokenizer = "cl100k_base", maxBatchInputs = 2048, maxBatchTokens = 300000):
+		import openai
 		# Client Creation
 		load_dotenv()
 		apiKey = os.getenv("OPENAI_API_KEY")
@@ -123,22 +279,56 @@ class GptManager:
 		self.model     = model
 		self.price     = price
 		self.tokenizer = tokenizer
+		self.maxBatchInputs = maxBatchInputs
+		self.maxBatchTokens = maxBatchTokens
 
 	# Generate Embeddings using OpenAi API        
 	def generateEmbedding(self, inputData):
-		# Remove new line chars
-		inputData = inputData.replace("\n", " ")
+		return self.generateEmbeddings([inputData])[0]
 
-		# Return Embedding
-		return self.client.embeddings.create(input = [inputData], model = self.model).data[0].embedding
+	# Generate Embeddings of many inputs, packing as many inputs per request as the limits allow
+	def generateEmbeddings(self, inputs):
+		# Remove new line chars
+		inputs = [inputData.replace("\n", " ") for inputData in inputs]
+
+		embeddings = [None] * len(inputs)
+		for batch in self.packBatches(inputs):
+			response = self.client.embeddings.create(input = [inputs[i] for i in batch], model = self.model)
+			for item in response.data:
+				embeddings[batch[item.index]] = item.embedding
+		return embeddings
+
+	# Split inputs (in order) into batches within the per-request limits of inputs and tokens
+	# Returns a list of (input indices, number of tokens) tuples.
+	def packBatchesWithTokens(self, inputs):
+		batches = []
+		current = []
+		currentTokens = 0
+		for i, inputData in enumerate(inputs):
+			numTokens = self.getNumTokens(inputData)
+			if current and (len(current) >= self.maxBatchInputs or currentTokens + numTokens > self.maxBatchTokens):
+				batches.append((current, currentTokens))
+				current = []
+				currentTokens = 0
+			current.append(i)
+			currentTokens += numTokens
+		if current:
+			batches.append((current, currentTokens))
+		return batches
+
+	# Split inputs (in order) into batches of input indices
+	def packBatches(self, inputs):
+		return [batch for batch, _ in self.packBatchesWithTokens(inputs)]
 	
 	# Count num of Tokens
 	def getNumTokens(self, prompt):
 		# "cl100k_base" --> the tokenizer used by GPT 3.5
-		encoding = tiktoken.get_encoding(self.tokenizer)
+		if self.encoding is None:
+			import tiktoken
+			self.encoding = tiktoken.get_encoding(self.tokenizer)
 		
 		# Get the number of tokens
-		numTokens = len(encoding.encode(prompt))
+		numTokens = len(self.encoding.encode(prompt))
 		return numTokens
 
 	# Computer Cost Estimation
@@ -155,50 +345,333 @@ class GptManager:
 		return totTokens, totCost
 	
 
-class CodeBertManager:
-
+# Token bucket refilled continuously at ratePerMinute, holding at most one minute of budget
+class TokenBucket:
+
+	ratePerSecond = None
+	capacity      = None
+	available     = None
+	lastRefill    = None
+	lock          = None
+
+	def __init__(self, ratePerMinute):
+		self.ratePerSecond = ratePerMinute / 60.0
+		self.capacity      = float(ratePerMinute)
+		self.available     = float(ratePerMinute)
+		self.lastRefill    = time.monotonic()
+		self.lock          = asyncio.Lock()
+
+	def refill(self):
+		now = time.monotonic()
+		self.available  = min(self.capacity, self.available + (now - self.lastRefill) * self.ratePerSecond)
+		self.lastRefill = now
+
+	# Wait until amount units are available and take them
+	async def acquire(self, amount):
+		amount = min(float(amount), self.capacity)
+		async with self.lock:
+			self.refill()
+			while self.available < amount:
+				await asyncio.sleep((amount - self.available) / self.ratePerSecond)
+				self.refill()
+			self.available -= amount
+
+
+# Asyncio engine for OpenAI embeddings.
+# Keeps maxInFlight requests running, respects requests-per-minute and tokens-per-minute budgets,
+# retries rate-limited or failed requests with exponential backoff and writes every finished batch
+# to the Redis embedding hash, which is also the checkpoint: methods already stored are skipped.
+class AsyncGptEngine:
+
+	gptManager  = None
+	client      = None
+
+	# Concurrency and rate limits (buckets are created inside the event loop)
+	maxInFlight       = None
+	requestsPerMinute = None
+	tokensPerMinute   = None
+	requestsBucket    = None
+	tokensBucket      = None
+
+	# Retry policy
+	maxRetries  = None
+	baseBackoff = None
+	maxBackoff  = None
+
+	# Shared pause after a rate-limit response (monotonic time)
+	pauseUntil  = None
+
+	# Statistics
+	numRequests  = None
+	numRateLimited = None
+
+	# baseUrl: alternative endpoint (e.g. a local stand-in server)
+	def __init__(self, gptManager, maxInFlight = 8, requestsPerMinute = 3000, tokensPerMinute = 1000000,
+				 maxRetries = 8, baseBackoff = 1.0, maxBackoff = 60.0, baseUrl = None):
+		import openai
+		self.gptManager  = gptManager
+		self.client      = openai.AsyncOpenAI(api_key = gptManager.client.api_key,
+											  base_url = baseUrl if baseUrl is not None else gptManager.client.base_url,
+											  max_retries = 0)
+		self.maxInFlight       = maxInFlight
+		self.requestsPerMinute = requestsPerMinute
+		self.tokensPerMinute   = tokensPerMinute
+		self.maxRetries  = maxRetries
+		self.baseBackoff = baseBackoff
+		self.maxBackoff  = maxBackoff
+		self.pauseUntil  = 0.0
+		self.numRequests    = 0
+		self.numRateLimited = 0
+
+	# Backoff delay for a given attempt, honoring the Retry-After header when the server sends one
+	def getBackoff(self, attempt, error = None):
+		retryAfter = None
+		response = getattr(error, "response", None)
+		if response is not None:
+			try:
+				retryAfter = float(response.headers.get("retry-after"))
+			except (TypeError, ValueError):
+				retryAfter = None
+		if retryAfter is None:
+			retryAfter = min(self.maxBackoff, self.baseBackoff * (2 ** attempt))
+		return retryAfter * (1 + random.random() * 0.25)
+
+	# Embed one batch with retries. Returns the list of embeddings or None if every attempt failed.
+	# A rejected input (400, e.g. an over-long method, or 413) is isolated by bisecting the batch:
+	# the inputs rejected on their own get None, the others are embedded.
+	# The other errors (401, 403, 404: key, permission or model) concern every request and are raised.
+	async def embedBatch(self, inputs, numTokens):
+		import openai
+		for attempt in range(self.maxRetries + 1):
+			# Wait for a pause caused by a rate limit and for the budgets
+			delay = self.pauseUntil - time.monotonic()
+			if delay > 0:
+				await asyncio.sleep(delay)
+			await self.requestsBucket.acquire(1)
+			await self.tokensBucket.acquire(numTokens)
+
+			try:
+				self.numRequests += 1
+				response = await self.client.embeddings.create(input = inputs, model = self.gptManager.model)
+				embeddings = [None] * len(inputs)
+				for item in response.data:
+					embeddings[item.index] = item.embedding
+				return embeddings
+			except openai.RateLimitError as e:
+				self.numRateLimited += 1
+				backoff = self.getBackoff(attempt, e)
+				self.pauseUntil = max(self.pauseUntil, time.monotonic() + backoff)
+				print("--- ⏸️ Rate Limited --> Retry in {:.1f} s".format(backoff), flush=True)
+			except (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError) as e:
+				backoff = self.getBackoff(attempt)
+				print("--- ⚠️ Request Failed with Exception {} --> Retry in {:.1f} s".format(e, backoff), flush=True)
+				await asyncio.sleep(backoff)
+			except openai.APIStatusError as e:
+				if not isinstance(e, openai.BadRequestError) and e.status_code != 413:
+					raise
+				if len(inputs) == 1:
+					print("--- ❌ Input Rejected with Status {}: {}".format(e.status_code, e.message), flush=True)
+					return [None]
+				# Tokens of each half estimated from the share of inputs (only used for the budget)
+				middle = len(inputs) // 2
+				left   = await self.embedBatch(inputs[:middle], numTokens * middle // len(inputs))
+				right  = await self.embedBatch(inputs[middle:], numTokens - numTokens * middle // len(inputs))
+				return (left or [None] * middle) + (right or [None] * (len(inputs) - middle))
+		return None
+
+	# Embed all methods and store them in redisKey. Returns the list of methods that failed.
+	async def run(self, methods, redisClient, redisKey):
+		loop = asyncio.get_running_loop()
+		self.requestsBucket = TokenBucket(self.requestsPerMinute)
+		self.tokensBucket   = TokenBucket(self.tokensPerMinute)
+
+		# Checkpoint: skip methods already stored
+		methods = list(methods)
+		stored  = await loop.run_in_executor(None, redisClient.existsMany, redisKey, methods)
+		methods = [method for method, exists in zip(methods, stored) if not exists]
+		print("--- ⏭️ Already Processed --> Skip {}".format(len(stored) - len(methods)))
+
+		inputs  = [method.replace("\n", " ") for method in methods]
+		queue   = asyncio.Queue()
+		for batch in self.gptManager.packBatchesWithTokens(inputs):
+			queue.put_nowait(batch)
+		numBatches = queue.qsize()
+		failed  = []
+
+		async def worker():
+			while True:
+				try:
+					batch, numTokens = queue.get_nowait()
+				except asyncio.QueueEmpty:
+					return
+				embeddings = await self.embedBatch([inputs[i] for i in batch], numTokens)
+				if embeddings is None:
+					failed.extend(methods[i] for i in batch)
+					print("--- ❌ Batch of {} methods Failed".format(len(batch)), flush=True)
+					continue
+				failed.extend(methods[i] for i, emb in zip(batch, embeddings) if emb is None)
+				# Checkpoint the batch to Redis
+				results = {methods[i]: emb for i, emb in zip(batch, embeddings) if emb is not None}
+				if len(results) == 0:
+					continue
+				await loop.run_in_executor(None, redisClient.uploadEmbeddings, redisKey, results)
+				print("--- ✅ Success for {} methods ({} batches left)".format(len(results), queue.qsize()), flush=True)
+
+		try:
+			await asyncio.gather(*[worker() for _ in range(min(self.maxInFlight, max(1, numBatches)))])
+		finally:
+			await self.client.close()
+
+		print("--- 📊 Requests: {} (rate limited: {}) --- Failed methods: {}".format(self.numRequests, self.numRateLimited, len(failed)))
+		return failed
+
+
+# Local (CPU) inference of a Hugging Face encoder, shared by CodeBERT and SFR.
+# The model is loaded on first use. Options:
+# - numThreads: intra-op threads of torch / ONNX Runtime (None: library default)
+# - quantize  : "int8" for dynamic int8 quantization of the Linear layers (torch backend)
+# - backend   : "torch", or "onnx" to export the model once to onnxPath and run it with ONNX Runtime
+# - maxLength : max tokens per method, capped at the max length of the model
+# Methods are tokenized once, without padding, and each length-bucketed batch is padded to its longest method.
+class LocalModelManager(abc.ABC):
+
+	modelName = None
 	tokenizer = None
 	model     = None
-
-	# https://huggingface.co/microsoft/codebert-base
-	def __init__(self):
-		self.tokenizer = AutoTokenizer.from_pretrained("microsoft/codebert-base")
-		self.model     = AutoModel.from_pretrained("microsoft/codebert-base")
-
+	session   = None
+
+	# Batching: max inputs and max padded tokens per forward pass
+	batchSize   = None
+	batchTokens = None
+	maxLength   = None
+
+	# Inference options
+	numThreads = None
+	quantize   = None
+	backend    = None
+	onnxPath   = None
+
+	def __init__(self, modelName, batchSize, batchTokens, maxLength, numThreads = None, quantize = None, backend = "torch", onnxPath = None):
+		if backend not in ["torch", "onnx"]:
+			raise ValueError("--- ⚠️ Error: Unsupported backend '{}'. Please use 'torch' or 'onnx'.".format(backend))
+		if quantize not in [None, "int8"]:
+			raise ValueError("--- ⚠️ Error: Unsupported quantization '{}'. Please use 'int8'.".format(quantize))
+		if backend == "onnx" and importlib.util.find_spec("onnxruntime") is None:
+			raise ImportError("--- ⚠️ Error: onnxruntime is required for the 'onnx' backend")
+		self.modelName   = modelName
+		self.batchSize   = batchSize
+		self.batchTokens = batchTokens
+		self.maxLength   = maxLength
+		self.numThreads  = numThreads
+		self.quantize    = quantize
+		self.backend     = backend
+		self.onnxPath    = onnxPath or os.path.join("../../0_Data/ONNX/", modelName.replace("/", "_"))
+
+	def loadModel(self):
+		if self.tokenizer is not None:
+			return
+		import torch
+		from transformers import AutoTokenizer, AutoModel
+		if self.numThreads is not None:
+			torch.set_num_threads(self.numThreads)
+		self.tokenizer = AutoTokenizer.from_pretrained(self.modelName)
+		self.maxLength = min(self.maxLength, self.tokenizer.model_max_length)
+
+		if self.backend == "onnx":
+			self.session = self.loadOnnxSession()
+			return
+		model = AutoModel.from_pretrained(self.modelName).eval()
+		if self.quantize == "int8":
+			model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+		self.model = model
+
+	# ONNX Runtime session of the model, exported to <onnxPath>/model.onnx the first time
+	# (in a temporary folder renamed when complete, large models keep their weights in external data files)
+	def loadOnnxSession(self):
+		import onnxruntime as ort
+		import torch
+		from transformers import AutoModel
+		modelPath = os.path.join(self.onnxPath, "model.onnx")
+		if not os.path.exists(modelPath):
+			tmpPath = self.onnxPath + ".part"
+			os.makedirs(tmpPath, exist_ok=True)
+			model = AutoModel.from_pretrained(self.modelName).eval()
+			dummy = self.tokenizer(["a b"], return_tensors="pt")
+			with torch.no_grad():
+				torch.onnx.export(model, (dummy["input_ids"], dummy["attention_mask"]), os.path.join(tmpPath, "model.onnx"),
+								  input_names=["input_ids", "attention_mask"], output_names=["last_hidden_state"],
+								  dynamic_axes={"input_ids": {0: "batch", 1: "sequence"}, "attention_mask": {0: "batch", 1: "sequence"},
+												"last_hidden_state": {0: "batch", 1: "sequence"}},
+								  opset_version=14)
+			del model
+			os.replace(tmpPath, self.onnxPath)
+			print("--- 💾 ONNX model exported: {}".format(modelPath))
+
+		options = ort.SessionOptions()
+		if self.numThreads is not None:
+			options.intra_op_num_threads = self.numThreads
+		return ort.InferenceSession(modelPath, options, providers=["CPUExecutionProvider"])
+
+	# Last hidden state of a padded batch
+	def forward(self, batchInputs):
+		import torch
+		if self.session is not None:
+			feeds = {name: batchInputs[name].numpy() for name in ["input_ids", "attention_mask"]}
+			return torch.from_numpy(self.session.run(["last_hidden_state"], feeds)[0])
+		return self.model(input_ids=batchInputs["input_ids"], attention_mask=batchInputs["attention_mask"]).last_hidden_state
+
+	# Fixed-length embeddings from the last hidden state (implemented by each model)
+	@abc.abstractmethod
+	def pool(self, lastHiddenState, attentionMask):
+		pass
 
 	# Return a list
 	def generateEmbedding(self, inputData):
-		# Tokenize input code
-		inputs = self.tokenizer(inputData, return_tensors="pt", padding=True, truncation=True, max_length=1024)
+		return self.generateEmbeddings([inputData])[0]
 
-		# Forward pass
-		with torch.no_grad():
-			outputs = self.model(**inputs)
+	# Return a list of lists, running length-bucketed padded batches
+	def generateEmbeddings(self, inputs):
+		import torch
+		self.loadModel()
+		encoded = self.tokenizer(inputs, truncation=True, max_length=self.maxLength)
+		lengths = [len(ids) for ids in encoded["input_ids"]]
 
-		# Get the output embeddings
-		last_hidden_state = outputs.last_hidden_state
+		embeddings = [None] * len(inputs)
+		for batch in lengthBucketedBatches(lengths, self.batchSize, self.batchTokens):
+			batchInputs = self.tokenizer.pad({"input_ids": [encoded["input_ids"][i] for i in batch],
+											  "attention_mask": [encoded["attention_mask"][i] for i in batch]}, return_tensors="pt")
 
-		# Perform pooling to get fixed-length embeddings
-		pooled_embeddings = torch.mean(last_hidden_state, dim=1)
+			# Forward pass, without autograd bookkeeping
+			with torch.inference_mode():
+				pooled = self.pool(self.forward(batchInputs), batchInputs["attention_mask"])
 
-		# Convert embeddings to numpy array
-		embeddingsArray = pooled_embeddings.numpy()
+			# Convert embeddings to numpy array
+			for i, emb in zip(batch, pooled.float().numpy().tolist()):
+				embeddings[i] = emb
 
-		return embeddingsArray.tolist()[0]
+		return embeddings
 
 
-class SfrManager:
+class CodeBertManager(LocalModelManager):
+
+	# https://huggingface.co/microsoft/codebert-base
+	def __init__(self, batchSize = 32, batchTokens = 16384, maxLength = 512, **options):
+		super().__init__("microsoft/codebert-base", batchSize, batchTokens, maxLength, **options)
+
+	# Mean pooling over the real (non padding) tokens
+	def pool(self, lastHiddenState, attentionMask):
+		mask = attentionMask.unsqueeze(-1).to(lastHiddenState.dtype)
+		return (lastHiddenState * mask).sum(dim=1) / mask.sum(dim=1)
 
-	tokenizer = None
-	model     = None
+
+class SfrManager(LocalModelManager):
 
 	# https://huggingface.co/Salesforce/SFR-Embedding-2_R
-	def __init__(self):
-		# Load tokenizer and model
-		self.tokenizer = AutoTokenizer.from_pretrained("Salesforce/SFR-Embedding-2_R")
-		self.model = AutoModel.from_pretrained("Salesforce/SFR-Embedding-2_R")
+	def __init__(self, batchSize = 8, batchTokens = 8192, maxLength = 4096, **options):
+		super().__init__("Salesforce/SFR-Embedding-2_R", batchSize, batchTokens, maxLength, **options)
 
-	def last_token_pool(self, last_hidden_states: Tensor, attention_mask: Tensor) -> Tensor:
+	def last_token_pool(self, last_hidden_states: torch.Tensor, attention_mask: torch.Tensor) -> torch.Tensor:
+		import torch
 		left_padding = (attention_mask[:, -1].sum() == attention_mask.shape[0])
 		if left_padding:
 			return last_hidden_states[:, -1]
@@ -207,18 +680,19 @@ class SfrManager:
 			batch_size = last_hidden_states.shape[0]
 			return last_hidden_states[torch.arange(batch_size, device=last_hidden_states.device), sequence_lengths]
 
-	# Return List
-	def generateEmbedding(self, inputData):
-		# Tokenize the input text
-		batch_dict = self.tokenizer(inputData, max_length=4096, padding=True, truncation=True, return_tensors="pt")
-		
-		# Get the model outputs
-		outputs = self.model(**batch_dict)
-		
-		# Pool the embeddings from the last token
-		embeddings = self.last_token_pool(outputs.last_hidden_state, batch_dict['attention_mask'])
-		
-		# Convert embeddings to numpy array
-		embeddingsArray = embeddings.detach().numpy()
-		
-		return embeddingsArray.tolist()[0]
\ No newline at end of file
+	def pool(self, lastHiddenState, attentionMask):
+		return self.last_token_pool(lastHiddenState, attentionMask)
+
+
+# Registry of the embedding backends, selected by name (the heavy dependencies are imported by the backend itself)
+EMBEDDING_MANAGERS = {
+	"gpt"      : GptManager,
+	"codebert" : CodeBertManager,
+	"sfr"      : SfrManager,
+}
+
+# Create an embedding manager from its name and options
+def createEmbeddingManager(name, **options):
+	if name not in EMBEDDING_MANAGERS:
+		raise ValueError("--- ⚠️ Error: Unsupported embedding model '{}'. Please use one of {}.".format(name, list(EMBEDDING_MANAGERS)))
+	return EMBEDDING_MANAGERS[name](**options)
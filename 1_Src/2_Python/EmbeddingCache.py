@@ -0,0 +1,240 @@
+# Imports
+from   collections import OrderedDict
+import threading
+import sqlite3
+import os
+# Own Imports
+import Utils
+
+# Two-level cache of the method embeddings of an embedding model, in front of the Redis hash <projectKey>.<model>.
+# - L1: in-process LRU bounded by the bytes of the cached vectors.
+# - L2 (optional): persistent SQLite file <diskPath>/<projectKey>.<model>.v<version>.sqlite shared by the processes
+#   of a host (WAL mode), vectors stored in the binary format of Utils.encodeEmbedding. Each version of the embedding
+#   model has its own file, so processes opening different versions do not drop each other's vectors.
+# Only the methods missing from both levels are downloaded, with one HMGET per batch, and then stored in both levels.
+# Attached to a RedisClient (RedisClient.attachEmbeddingCache), it serves every downloadEmbeddingsMany of its hash.
+
+# Methods per SQLite query (below the default limit of host parameters)
+SQLITE_BATCH_SIZE = 500
+
+
+# L2: persistent store of the embeddings of one embedding model.
+# The version is kept in the file: opening it with another version (e.g. a new revision of the embedding
+# model) drops the stored vectors. With maxEntries, the entries stored first are evicted.
+class DiskEmbeddingStore:
+
+	path       = None
+	version    = None
+	maxEntries = None
+
+	connection = None
+	pid        = None
+	lock       = None
+
+	# Statistics
+	numHits      = None
+	numMisses    = None
+	numEvictions = None
+
+	def __init__(self, path, version = "1", maxEntries = None):
+		self.path         = path
+		self.version      = str(version)
+		self.maxEntries   = maxEntries
+		self.lock         = threading.Lock()
+		self.numHits      = 0
+		self.numMisses    = 0
+		self.numEvictions = 0
+		if os.path.dirname(path):
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+		self.connect()
+
+	# Open the file (again after a fork: a SQLite connection cannot be shared between processes)
+	def connect(self):
+		self.connection = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+		self.pid = os.getpid()
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS embeddings (method TEXT PRIMARY KEY, value BLOB)")
+		with self.connection:
+			row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+			if row is None or row[0] != self.version:
+				if row is not None:
+					self.numEvictions += self.connection.execute("DELETE FROM embeddings").rowcount
+					print("--- ♻️ Embedding store {}: version {} --> {}, stored embeddings dropped".format(self.path, row[0], self.version))
+				self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (self.version,))
+
+	def getConnection(self):
+		if self.pid != os.getpid():
+			self.connect()
+		return self.connection
+
+	def __len__(self):
+		with self.lock:
+			return self.getConnection().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+	# Embeddings of many methods, list aligned with methods with None for the methods not stored
+	def getMany(self, methods):
+		methods = list(methods)
+		found = {}
+		with self.lock:
+			connection = self.getConnection()
+			for start in range(0, len(methods), SQLITE_BATCH_SIZE):
+				batch = methods[start:start + SQLITE_BATCH_SIZE]
+				query = "SELECT method, value FROM embeddings WHERE method IN ({})".format(",".join("?" * len(batch)))
+				found.update(connection.execute(query, batch).fetchall())
+			self.numHits   += len(found)
+			self.numMisses += len(methods) - len(found)
+		return [Utils.decodeEmbedding(found.get(method)) for method in methods]
+
+	# Store many embeddings ({method: array})
+	def putMany(self, embeddings):
+		rows = [(method, Utils.encodeEmbedding(embedding)) for method, embedding in embeddings.items()]
+		if len(rows) == 0:
+			return
+		with self.lock:
+			connection = self.getConnection()
+			with connection:
+				connection.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?)", rows)
+				if self.maxEntries is not None:
+					numEntries = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+					if numEntries > self.maxEntries:
+						self.numEvictions += connection.execute(
+							"DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY rowid LIMIT ?)",
+							(numEntries - self.maxEntries,)).rowcount
+
+	def clear(self):
+		with self.lock:
+			connection = self.getConnection()
+			with connection:
+				self.numEvictions += connection.execute("DELETE FROM embeddings").rowcount
+
+	def close(self):
+		with self.lock:
+			if self.connection is not None and self.pid == os.getpid():
+				self.connection.close()
+			self.connection = None
+			self.pid        = None
+
+
+class EmbeddingCache:
+
+	redisClient = None
+	redisKey    = None
+	maxBytes    = None
+
+	# L1: method --> float32 vector, in LRU order
+	entries = None
+	nbytes  = None
+	lock    = None
+
+	# L2 (None: no persistent level)
+	diskStore = None
+
+	# Statistics (numHits: L1 hits, numMisses: methods downloaded from Redis)
+	numHits      = None
+	numMisses    = None
+	numEvictions = None
+
+	# diskPath: folder of the L2 stores (None: L1 only); version: version of the embedding model stored in L2 (file name)
+	def __init__(self, redisClient, embeddingModel, maxBytes = 2 * 1024 ** 3, diskPath = None, version = "1", maxDiskEntries = None):
+		self.redisClient  = redisClient
+		self.redisKey     = redisClient.projectKey + "." + embeddingModel
+		self.maxBytes     = maxBytes
+		self.entries      = OrderedDict()
+		self.nbytes       = 0
+		self.lock         = threading.Lock()
+		self.numHits      = 0
+		self.numMisses    = 0
+		self.numEvictions = 0
+		if diskPath is not None:
+			self.diskStore = DiskEmbeddingStore(os.path.join(diskPath, "{}.v{}.sqlite".format(self.redisKey, version)), version, maxDiskEntries)
+
+	@property
+	def numDiskHits(self):
+		return self.diskStore.numHits if self.diskStore is not None else 0
+
+	@property
+	def hitRate(self):
+		numLookups = self.numHits + self.numDiskHits + self.numMisses
+		return (self.numHits + self.numDiskHits) / numLookups if numLookups else 0.0
+
+	def getStats(self):
+		return {"entries": len(self.entries), "bytes": self.nbytes, "hits": self.numHits, "diskHits": self.numDiskHits,
+				"misses": self.numMisses, "evictions": self.numEvictions,
+				"diskEvictions": self.diskStore.numEvictions if self.diskStore is not None else 0}
+
+	def __str__(self):
+		output = "\n--- ⭐ Embedding Cache ⭐---\n"
+		output += "--- 🔑 Redis Key   : {}\n".format(self.redisKey)
+		output += "--- #️⃣ Entries     : {}\n".format(len(self.entries))
+		output += "--- 💾 Memory      : {:.2f} / {:.2f} MB\n".format(self.nbytes / 1024 ** 2, self.maxBytes / 1024 ** 2)
+		if self.diskStore is not None:
+			output += "--- 📁 Disk Store  : {} (version {})\n".format(self.diskStore.path, self.diskStore.version)
+		output += "--- 📊 Hit rate    : {:.2f}% ({} memory hits, {} disk hits, {} misses)\n".format(
+			self.hitRate * 100, self.numHits, self.numDiskHits, self.numMisses)
+		output += "--- 🗑️ Evictions   : {} memory, {} disk\n".format(
+			self.numEvictions, self.diskStore.numEvictions if self.diskStore is not None else 0)
+		return output
+
+	def remember(self, method, embedding):
+		previous = self.entries.pop(method, None)
+		if previous is not None:
+			self.nbytes -= previous.nbytes
+		self.entries[method] = embedding
+		self.nbytes += embedding.nbytes
+		while self.nbytes > self.maxBytes and len(self.entries) > 1:
+			_, evicted = self.entries.popitem(last=False)
+			self.nbytes -= evicted.nbytes
+			self.numEvictions += 1
+
+	# Embeddings of many methods, list aligned with methods with None for the methods missing on Redis
+	def getMany(self, methods):
+		methods = list(methods)
+		embeddings = [None] * len(methods)
+		missing = []
+		with self.lock:
+			for i, method in enumerate(methods):
+				embedding = self.entries.get(method)
+				if embedding is None:
+					missing.append(i)
+				else:
+					self.entries.move_to_end(method)
+					embeddings[i] = embedding
+			self.numHits += len(methods) - len(missing)
+
+		# L2, then Redis for what is still missing
+		if len(missing) > 0 and self.diskStore is not None:
+			stored = self.diskStore.getMany([methods[i] for i in missing])
+			with self.lock:
+				for i, embedding in zip(missing, stored):
+					if embedding is not None:
+						embeddings[i] = embedding
+						self.remember(methods[i], embedding)
+			missing = [i for i in missing if embeddings[i] is None]
+
+		if len(missing) > 0:
+			downloaded = self.redisClient.fetchEmbeddingsMany(self.redisKey, [methods[i] for i in missing])
+			found = {}
+			with self.lock:
+				self.numMisses += len(missing)
+				for i, embedding in zip(missing, downloaded):
+					if embedding is not None:
+						embeddings[i] = embedding
+						found[methods[i]] = embedding
+						self.remember(methods[i], embedding)
+			if self.diskStore is not None:
+				self.diskStore.putMany(found)
+		return embeddings
+
+	# Store embeddings just uploaded to Redis (write-through, so the cache never serves a replaced vector)
+	def putMany(self, embeddings):
+		with self.lock:
+			for method, embedding in embeddings.items():
+				self.remember(method, Utils.decodeEmbedding(Utils.encodeEmbedding(embedding)))
+		if self.diskStore is not None:
+			self.diskStore.putMany(embeddings)
+
+	def close(self):
+		if self.diskStore is not None:
+			self.diskStore.close()
@@ -0,0 +1,141 @@
+# Imports
+from   collections import OrderedDict
+import threading
+import hashlib
+import joblib
+import os
+
+# Registry of the trained Anomaly Detection models: (category, embedding model, detector, version) --> model.
+# Models are loaded lazily with joblib.load(mmap_mode='r'): the numpy arrays of the model (e.g. the support
+# vectors) are mapped read-only from the .joblib file, so every process that loads the same file shares them
+# through the OS page cache. The loaded models are kept in an LRU within a memory budget, and a model is
+# reloaded when its file changes.
+
+
+# Fingerprint of a model file (hash of its content)
+def getModelFingerprint(modelPath, chunkSize = 1024 * 1024):
+	digest = hashlib.sha256()
+	with open(modelPath, "rb") as file:
+		for chunk in iter(lambda: file.read(chunkSize), b""):
+			digest.update(chunk)
+	return digest.hexdigest()[:16]
+
+# (mtime, size) of a model file, to detect when it changes
+def getModelStat(modelPath):
+	stat = os.stat(modelPath)
+	return (stat.st_mtime_ns, stat.st_size)
+
+
+# A loaded model
+class ModelEntry:
+
+	model       = None
+	modelPath   = None
+	fingerprint = None
+	stat        = None
+	# Size of the model file (memory accounted in the budget)
+	nbytes      = None
+
+	def __init__(self, model, modelPath, fingerprint, stat):
+		self.model       = model
+		self.modelPath   = modelPath
+		self.fingerprint = fingerprint
+		self.stat        = stat
+		self.nbytes      = stat[1]
+
+
+class ModelRegistry:
+
+	# Root folder of the models: <modelsPath>/<category>/<model file>
+	modelsPath   = None
+	# Max total size of the loaded models
+	memoryBudget = None
+	# mmap_mode of joblib.load (None: load the arrays in memory)
+	mmapMode     = None
+
+	# modelPath --> ModelEntry, in LRU order
+	entries = None
+	lock    = None
+
+	# Statistics
+	numHits      = None
+	numLoads     = None
+	numEvictions = None
+
+	def __init__(self, modelsPath, memoryBudget = 8 * 1024 ** 3, mmapMode = "r"):
+		self.modelsPath   = modelsPath
+		self.memoryBudget = memoryBudget
+		self.mmapMode     = mmapMode
+		self.entries      = OrderedDict()
+		self.lock         = threading.RLock()
+		self.numHits      = 0
+		self.numLoads     = 0
+		self.numEvictions = 0
+
+	def __str__(self):
+		output = "\n--- ⭐ Model Registry ⭐---\n"
+		output += "--- 📁 Models Path    : {}\n".format(self.modelsPath)
+		output += "--- #️⃣ Loaded models  : {}\n".format(len(self.entries))
+		output += "--- 💾 Memory         : {:.2f} / {:.2f} MB\n".format(self.nbytes / 1024 ** 2, self.memoryBudget / 1024 ** 2)
+		output += "--- ✅ Hits           : {}\n".format(self.numHits)
+		output += "--- 📥 Loads          : {}\n".format(self.numLoads)
+		output += "--- 🗑️ Evictions      : {}\n".format(self.numEvictions)
+		return output
+
+	@property
+	def nbytes(self):
+		return sum(entry.nbytes for entry in self.entries.values())
+
+	# Path of a model: <category>/<embeddingModel>[.<detector>][.v<version>].joblib
+	# (without detector and version: the path written by TrainingManager, e.g. MODELS/<category>/gpt.joblib)
+	def getModelPath(self, categoryID, embeddingModel, detector = None, version = None):
+		name = embeddingModel
+		if detector is not None:
+			name += "." + detector
+		if version is not None:
+			name += ".v{}".format(version)
+		return os.path.join(self.modelsPath, str(categoryID), name + ".joblib")
+
+	# Loaded model of a model file (loaded now if not in the registry or if its file changed)
+	def load(self, modelPath):
+		modelPath = os.path.abspath(modelPath)
+		with self.lock:
+			entry = self.entries.get(modelPath)
+			if entry is not None and entry.stat == getModelStat(modelPath):
+				self.entries.move_to_end(modelPath)
+				self.numHits += 1
+				return entry
+
+			if not os.path.isfile(modelPath):
+				raise FileNotFoundError("--- ⚠️ Error: Model file does not exist at {}".format(modelPath))
+			stat  = getModelStat(modelPath)
+			entry = ModelEntry(joblib.load(modelPath, mmap_mode=self.mmapMode), modelPath, getModelFingerprint(modelPath), stat)
+			self.entries[modelPath] = entry
+			self.entries.move_to_end(modelPath)
+			self.numLoads += 1
+
+			# Keep the models used most recently within the budget (the one just loaded is always kept)
+			while self.nbytes > self.memoryBudget and len(self.entries) > 1:
+				self.entries.popitem(last=False)
+				self.numEvictions += 1
+			return entry
+
+	# Loaded model of (category, embedding model, detector, version)
+	def get(self, categoryID, embeddingModel, detector = None, version = None):
+		return self.load(self.getModelPath(categoryID, embeddingModel, detector, version))
+
+	def getModel(self, categoryID, embeddingModel, detector = None, version = None):
+		return self.get(categoryID, embeddingModel, detector, version).model
+
+	# Fingerprint of the current model file, for cache invalidation
+	def getFingerprint(self, categoryID, embeddingModel, detector = None, version = None):
+		return self.get(categoryID, embeddingModel, detector, version).fingerprint
+
+	def evict(self, modelPath):
+		with self.lock:
+			if self.entries.pop(os.path.abspath(modelPath), None) is not None:
+				self.numEvictions += 1
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
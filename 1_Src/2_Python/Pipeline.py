@@ -0,0 +1,551 @@
+# Imports
+from   dotenv         import load_dotenv
+import threading
+import abc
+import argparse
+import socket
+import json
+import time
+import os
+# Own Imports
+from   App            import App, DataFlows
+from   Embedding      import EmbeddingsManager
+from   EmbeddingCache import EmbeddingCache
+from   ModelRegistry  import ModelRegistry
+from   RedisClient    import RedisClient
+from   Testing        import TestingManager, PredictionCache
+from   TrainingDriver import TrainingDriver
+from   Workers        import WorkerPool
+
+# Streaming end-to-end pipeline: extraction --> embedding --> scoring, with an optional training step.
+# The stages are connected by Redis lists. Every stage is a reliable work queue with the layout of the extraction
+# (a RedisClient with projectKey <projectKey>.<stage>): <stage>.pop is its input, each element is claimed with
+# RPOPLPUSH into the processing list of a consumer kept alive by a lease, <stage>.result and <stage>.error
+# record the outcome of every app.
+# - extract: the WorkerPool of Workers.py, every sha256 processed is pushed to embed.pop
+# - embed  : reads the Data Flows of a batch of apps, embeds once the methods not yet in <embeddingsKey>.<model>
+#            and pushes the apps to score (the apps to train on stay in embed.result)
+# - train  : (optional) waits until every app to train on is embedded, then trains the models of their
+#            categories with TrainingDriver; scoring starts when the models are ready
+# - score  : scores a batch of apps with the TestingManager of each category, results appended to resultsPath
+# Backpressure: a stage stops claiming apps while the input list of the next (running) stage holds maxQueued apps.
+# The stages run in one process by default, or on different hosts (--stages) sharing the same lists.
+
+STAGES = ["extract", "embed", "score"]
+
+
+# Consumer of the input list of a stage, claiming batches of sha256s
+class StageConsumer(abc.ABC):
+
+	# Identity and Redis (RedisClient of the stage)
+	workerID    = None
+	stageClient = None
+	leaseTTL    = None
+
+	# Max apps claimed at once
+	batchSize = None
+
+	# Backpressure: input list of the next stage, considered only while nextStarted is set
+	nextKey     = None
+	nextStarted = None
+	maxQueued   = None
+
+	# Set when no more apps will be pushed to the input list of the stage
+	upstreamDone = None
+	pollInterval = None
+
+	# Statistics
+	numProcessed = None
+	numErrors    = None
+
+	def __init__(self, workerID, stageClient, upstreamDone, batchSize = 32, nextKey = None, nextStarted = None,
+				 maxQueued = 256, leaseTTL = 60, pollInterval = 0.5):
+		self.workerID     = workerID
+		self.stageClient  = stageClient
+		self.upstreamDone = upstreamDone
+		self.batchSize    = batchSize
+		self.nextKey      = nextKey
+		self.nextStarted  = nextStarted
+		self.maxQueued    = maxQueued
+		self.leaseTTL     = leaseTTL
+		self.pollInterval = pollInterval
+		self.numProcessed = 0
+		self.numErrors    = 0
+
+	# Refresh the lease until stopEvent is set
+	def heartbeatLoop(self, stopEvent):
+		while not stopEvent.wait(self.leaseTTL / 3):
+			try:
+				self.stageClient.heartbeat(self.workerID, self.leaseTTL)
+			except Exception as e:
+				print("--- ⚠️ [{}] Heartbeat failed: {}".format(self.workerID, e), flush=True)
+
+	def isBackpressured(self):
+		if self.nextKey is None or (self.nextStarted is not None and not self.nextStarted.is_set()):
+			return False
+		return self.stageClient.client.llen(self.nextKey) >= self.maxQueued
+
+	# Claim up to batchSize sha256s
+	def claimBatch(self):
+		batch = []
+		while len(batch) < self.batchSize:
+			sha256 = self.stageClient.claimWork(self.workerID)
+			if sha256 is None:
+				break
+			batch.append(sha256)
+		return batch
+
+	def fail(self, sha256, error):
+		self.numErrors += 1
+		pipe = self.stageClient.client.pipeline(transaction=False)
+		pipe.hset(self.stageClient.resultsKey, sha256, json.dumps({"error": error}))
+		pipe.lpush(self.stageClient.errorKey, sha256)
+		pipe.execute()
+
+	# Process the claimed sha256s (implemented by each stage)
+	@abc.abstractmethod
+	def processBatch(self, sha256s):
+		pass
+
+	# Work until the upstream is done and the input list is empty
+	def run(self):
+		self.stageClient.heartbeat(self.workerID, self.leaseTTL)
+		stopEvent = threading.Event()
+		heartbeat = threading.Thread(target=self.heartbeatLoop, args=(stopEvent,), daemon=True)
+		heartbeat.start()
+		try:
+			while True:
+				if self.isBackpressured():
+					time.sleep(self.pollInterval)
+					continue
+				# Read before claiming: an empty list after upstreamDone stays empty
+				upstreamDone = self.upstreamDone.is_set()
+				batch = self.claimBatch()
+				if len(batch) == 0:
+					if upstreamDone:
+						break
+					time.sleep(self.pollInterval)
+					continue
+				try:
+					self.processBatch(batch)
+				except Exception as e:
+					print("\n❌ [{}] Batch Failed with Exception {}".format(self.workerID, e), flush=True)
+					for sha256 in batch:
+						self.fail(sha256, "{}: {}".format(type(e).__name__, e))
+				for sha256 in batch:
+					self.stageClient.completeWork(self.workerID, sha256)
+		finally:
+			self.stageClient.requeueWorker(self.workerID)
+			stopEvent.set()
+			heartbeat.join()
+			self.stageClient.unregisterWorker(self.workerID)
+
+
+# Embeds the methods of the apps not embedded yet, once per batch of apps
+class EmbeddingStage(StageConsumer):
+
+	redisClientExtraction = None
+	redisClientEmbedding  = None
+	embeddingsManager     = None
+	modelRedisKey         = None
+
+	# Hash <projectKey>.apps: sha256 --> {"categoryID", "training"}
+	appsKey = None
+
+	def __init__(self, workerID, stageClient, upstreamDone, redisClientExtraction, redisClientEmbedding, embeddingsManager,
+				 embeddingModel, appsKey, **options):
+		super().__init__(workerID, stageClient, upstreamDone, **options)
+		self.redisClientExtraction = redisClientExtraction
+		self.redisClientEmbedding  = redisClientEmbedding
+		self.embeddingsManager     = embeddingsManager
+		self.modelRedisKey         = redisClientEmbedding.projectKey + "." + embeddingModel
+		self.appsKey               = appsKey
+
+	def processBatch(self, sha256s):
+		appMethods = {}
+		for sha256, result in zip(sha256s, self.redisClientExtraction.downloadBytesMany(self.redisClientExtraction.resultsKey, sha256s)):
+			if result is None:
+				self.fail(sha256, "No Data Flows")
+				continue
+			dataFlows = DataFlows.fromJson(result)
+			appMethods[sha256] = set(dataFlows.sources).union(dataFlows.sinks)
+
+		# Embed the methods of the batch not yet on Redis, each once
+		methods = sorted(set().union(*appMethods.values()))
+		missing = [method for method, exists in zip(methods, self.redisClientEmbedding.existsMany(self.modelRedisKey, methods)) if not exists]
+		failed  = set()
+		if len(missing) > 0:
+			embeddings = self.embeddingsManager.embedMethods(missing)
+			results = {method: emb for method, emb in zip(missing, embeddings) if emb is not None}
+			if len(results) > 0:
+				self.redisClientEmbedding.uploadEmbeddings(self.modelRedisKey, results)
+			failed = set(missing).difference(results)
+			if len(failed) > 0:
+				self.redisClientEmbedding.client.sadd(EmbeddingsManager.getFailedKey(self.modelRedisKey), *failed)
+		print("--- 🧬 [{}] {} apps: {} methods, {} embedded now ({} failed)".format(
+			self.workerID, len(appMethods), len(methods), len(missing) - len(failed), len(failed)), flush=True)
+
+		# Hand over the apps whose methods are all embedded
+		infos = self.redisClientExtraction.downloadJsonDataMany(self.appsKey, list(appMethods))
+		pipe  = self.stageClient.client.pipeline(transaction=False)
+		for (sha256, methods), info in zip(appMethods.items(), infos):
+			numFailed = len(methods.intersection(failed))
+			if numFailed > 0:
+				self.fail(sha256, "{} methods not embedded".format(numFailed))
+				continue
+			pipe.hset(self.stageClient.resultsKey, sha256, json.dumps({"numMethods": len(methods)}))
+			if info is None or not info.get("training", False):
+				pipe.lpush(self.nextKey, sha256)
+			self.numProcessed += 1
+		pipe.execute()
+
+
+# Scores the apps with the model of their category
+class ScoringStage(StageConsumer):
+
+	redisClientExtraction = None
+	redisClientEmbedding  = None
+	embeddingModel        = None
+	appsKey               = None
+
+	# Shared by the consumers of the process
+	modelRegistry = None
+	resultsPath   = None
+	# categoryID --> (TestingManager, lock)
+	managers      = None
+	managersLock  = None
+	resultsLock   = None
+
+	def __init__(self, workerID, stageClient, upstreamDone, redisClientExtraction, redisClientEmbedding, embeddingModel,
+				 appsKey, modelRegistry, resultsPath, managers, managersLock, resultsLock, **options):
+		super().__init__(workerID, stageClient, upstreamDone, **options)
+		self.redisClientExtraction = redisClientExtraction
+		self.redisClientEmbedding  = redisClientEmbedding
+		self.embeddingModel        = embeddingModel
+		self.appsKey               = appsKey
+		self.modelRegistry         = modelRegistry
+		self.resultsPath           = resultsPath
+		self.managers              = managers
+		self.managersLock          = managersLock
+		self.resultsLock           = resultsLock
+
+	# TestingManager of a category (None if its model does not exist)
+	def getTestingManager(self, categoryID):
+		with self.managersLock:
+			if categoryID not in self.managers:
+				modelPath = self.modelRegistry.getModelPath(categoryID, self.embeddingModel)
+				if not os.path.isfile(modelPath):
+					return None
+				# Its ResultsWriter repairs the shared results file: not while another manager appends to it
+				with self.resultsLock:
+					testingManager = TestingManager(modelPath, self.resultsPath, self.embeddingModel, PredictionCache(), self.modelRegistry)
+				self.managers[categoryID] = (testingManager, threading.Lock())
+			return self.managers[categoryID]
+
+	def processBatch(self, sha256s):
+		# Skip if already scored (the apps that failed are scored again, e.g. once the model of their category exists)
+		outcomes = self.stageClient.downloadJsonDataMany(self.stageClient.resultsKey, sha256s)
+		sha256s  = [sha256 for sha256, outcome in zip(sha256s, outcomes) if outcome is None or "error" in outcome]
+		infos   = self.redisClientExtraction.downloadJsonDataMany(self.appsKey, sha256s)
+		results = self.redisClientExtraction.downloadBytesMany(self.redisClientExtraction.resultsKey, sha256s)
+
+		byCategory = {}
+		for sha256, info, result in zip(sha256s, infos, results):
+			if info is None or result is None:
+				self.fail(sha256, "No category" if info is None else "No Data Flows")
+				continue
+			app = App(sha256 = sha256, categoryID = info["categoryID"])
+			app.dataFlows = DataFlows.fromJson(result)
+			byCategory.setdefault(info["categoryID"], []).append(app)
+
+		for categoryID, apps in byCategory.items():
+			entry = self.getTestingManager(categoryID)
+			if entry is None:
+				for app in apps:
+					self.fail(app.sha256, "No model for category {}".format(categoryID))
+				continue
+			testingManager, lock = entry
+			with lock:
+				appsResults = testingManager.testingAnomalyDetectionModelBatch(apps, self.redisClientEmbedding)
+				with self.resultsLock:
+					scored = {}
+					for app, results in zip(apps, appsResults):
+						if results.numDataFlows is None:
+							self.fail(app.sha256, "Not scored")
+							continue
+						testingManager.saveResults(app, results)
+						scored[app.sha256] = json.dumps(
+							{"categoryID": categoryID, "numDataFlows": results.numDataFlows, "numOutliers": results.numOutliers})
+					# The results must be on disk before the apps are marked as scored (a rerun skips them)
+					if testingManager.resultsWriter is not None:
+						testingManager.resultsWriter.flush()
+					if len(scored) > 0:
+						self.stageClient.client.hset(self.stageClient.resultsKey, mapping=scored)
+						self.numProcessed += len(scored)
+
+
+class Pipeline:
+
+	redisClientExtraction = None
+	redisClientEmbedding  = None
+	embeddingModel        = None
+	stages                = None
+
+	# RedisClient of each stage (projectKey <projectKey>.<stage>) and hash of the apps
+	stageClients = None
+	appsKey      = None
+
+	# Paths
+	modelsPath  = None
+	resultsPath = None
+
+	# Concurrency and batching of each stage
+	extractionArgs  = None
+	workerPoolOptions = None
+	embedWorkers    = None
+	embedBatchApps  = None
+	scoreWorkers    = None
+	scoreBatchApps  = None
+	maxQueued       = None
+	leaseTTL        = None
+
+	# Backends
+	embeddingsManager = None
+	modelRegistry     = None
+	trainingOptions   = None
+
+	# Keep consuming when the input lists are empty (the upstream stages run elsewhere)
+	follow = None
+
+	def __init__(self, redisClientExtraction, redisClientEmbedding, embeddingModel, modelsPath, resultsPath,
+				 stages = STAGES, extractionArgs = None, workerPoolOptions = None, embedWorkers = 1, embedBatchApps = 32,
+				 scoreWorkers = 2, scoreBatchApps = 16, maxQueued = 256, leaseTTL = 60, managerOptions = None,
+				 trainingOptions = None, cachePath = None, modelsMemory = 8 * 1024 ** 3, follow = False, cacheVersion = "1"):
+		self.redisClientExtraction = redisClientExtraction
+		self.redisClientEmbedding  = redisClientEmbedding
+		self.embeddingModel        = embeddingModel
+		self.stages                = list(stages)
+		self.modelsPath            = modelsPath
+		self.resultsPath           = resultsPath
+		self.extractionArgs        = extractionArgs
+		self.workerPoolOptions     = workerPoolOptions or {}
+		self.embedWorkers          = embedWorkers
+		self.embedBatchApps        = embedBatchApps
+		self.scoreWorkers          = scoreWorkers
+		self.scoreBatchApps        = scoreBatchApps
+		self.maxQueued             = maxQueued
+		self.leaseTTL              = leaseTTL
+		self.trainingOptions       = trainingOptions
+		self.follow                = follow
+
+		projectKey = redisClientExtraction.projectKey
+		self.appsKey      = projectKey + ".apps"
+		self.stageClients = {stage: RedisClient(None, None, None, None, projectKey + "." + stage, client = redisClientExtraction.client)
+							 for stage in ["embed", "score"]}
+
+		if "extract" in self.stages and extractionArgs is None:
+			raise ValueError("--- ⚠️ Error: the extract stage needs the extraction arguments")
+		if "embed" in self.stages:
+			self.embeddingsManager = EmbeddingsManager(redisClientEmbedding, embeddingModel, **(managerOptions or {}))
+		if "score" in self.stages:
+			self.modelRegistry = ModelRegistry(modelsPath, modelsMemory)
+			if redisClientEmbedding.projectKey + "." + embeddingModel not in redisClientEmbedding.embeddingCaches:
+				embeddingCache = EmbeddingCache(redisClientEmbedding, embeddingModel, diskPath = cachePath, version = cacheVersion)
+				redisClientEmbedding.attachEmbeddingCache(embeddingCache)
+
+	def __str__(self):
+		output = "\n--- ⭐ Pipeline ⭐---\n"
+		output += "--- 🔑 Project Key     : {}\n".format(self.redisClientExtraction.projectKey)
+		output += "--- ⚙️ Embedding Model : {}\n".format(self.embeddingModel)
+		output += "--- 🧩 Stages          : {}\n".format(", ".join(self.stages + (["train"] if self.trainingOptions is not None else [])))
+		output += "--- 🧵 Workers         : embed {} x {} apps, score {} x {} apps\n".format(
+			self.embedWorkers, self.embedBatchApps, self.scoreWorkers, self.scoreBatchApps)
+		output += "--- 🚦 Max queued apps : {}\n".format(self.maxQueued)
+		return output
+
+	# Queue apps (DataFrame with sha256 and classID) for the pipeline. The apps to train on are queued first.
+	def seed(self, appsDF, training = False):
+		infos = {sha256: json.dumps({"categoryID": categoryID, "training": training})
+				 for sha256, categoryID in zip(appsDF["sha256"], appsDF["classID"].tolist())}
+		self.redisClientExtraction.client.hset(self.appsKey, mapping=infos)
+		if "extract" in self.stages:
+			self.redisClientExtraction.pushMany(self.redisClientExtraction.popKey, list(infos))
+		else:
+			self.redisClientExtraction.pushMany(self.stageClients["embed"].popKey, list(infos))
+		print("--- 🌱 Queued {} apps{}".format(len(infos), " to train on" if training else ""), flush=True)
+
+	def printStatus(self):
+		print("\n📐 Pipeline Status")
+		keys = [self.redisClientExtraction.popKey, self.redisClientExtraction.resultsKey, self.redisClientExtraction.errorKey]
+		for stageClient in self.stageClients.values():
+			keys += [stageClient.popKey, stageClient.resultsKey, stageClient.errorKey]
+		for key in keys:
+			print("- {:<60} : {}".format(key, self.redisClientExtraction.getSize(key)))
+
+	# Wait for the apps to train on to be embedded (or failed), then train their categories
+	def train(self, trainingDF, embedDone):
+		sha256s = trainingDF["sha256"].tolist()
+		embedClient = self.stageClients["embed"]
+		while True:
+			# Read before checking: after embedDone no app can arrive
+			done = embedDone.is_set()
+			numArrived = sum(embedClient.existsMany(embedClient.resultsKey, sha256s))
+			if numArrived == len(sha256s) or done:
+				break
+			time.sleep(1)
+
+		infos = embedClient.downloadJsonDataMany(embedClient.resultsKey, sha256s)
+		embedded = trainingDF[[info is not None and "error" not in info for info in infos]]
+		print("\n--- 🏋️ Training on {} of {} apps".format(len(embedded), len(sha256s)), flush=True)
+		TrainingDriver(self.redisClientExtraction, self.redisClientEmbedding, self.embeddingModel, self.modelsPath,
+					   mpContext = "spawn", **self.trainingOptions).run(embedded)
+
+	# Run the stages of this process until their input lists are drained.
+	# trainingDF: apps to train on (already seeded), trained before any app is scored
+	def run(self, trainingDF = None):
+		print(self)
+		hostID = "{}-{}".format(socket.gethostname(), os.getpid())
+		for stageClient in self.stageClients.values():
+			stageClient.requeueDeadWorkers()
+
+		# Stage done events: a stage not run here counts as done (its input list is drained), unless following
+		extractDone  = threading.Event()
+		embedDone    = threading.Event()
+		modelsReady  = threading.Event()
+		for stage, event in [("extract", extractDone), ("embed", embedDone)]:
+			if stage not in self.stages and not self.follow:
+				event.set()
+		if trainingDF is None:
+			modelsReady.set()
+
+		threads = {}
+		def startThreads(stage, targets, doneEvent = None):
+			threads[stage] = [threading.Thread(target=target, name="{}-{}-{}".format(hostID, stage, i)) for i, target in enumerate(targets)]
+			for thread in threads[stage]:
+				thread.start()
+			if doneEvent is not None:
+				def waitAll():
+					for thread in threads[stage]:
+						thread.join()
+					doneEvent.set()
+				threading.Thread(target=waitAll, daemon=True).start()
+
+		startTime = time.time()
+		if "extract" in self.stages:
+			pool = WorkerPool(self.redisClientExtraction, self.extractionArgs, notifyKey = self.stageClients["embed"].popKey,
+							  leaseTTL = self.leaseTTL, **self.workerPoolOptions)
+			startThreads("extract", [pool.run], extractDone)
+
+		embedConsumers = []
+		if "embed" in self.stages:
+			embedConsumers = [EmbeddingStage("{}-embed-{}".format(hostID, i), self.stageClients["embed"], extractDone,
+											 self.redisClientExtraction, self.redisClientEmbedding, self.embeddingsManager,
+											 self.embeddingModel, self.appsKey, batchSize = self.embedBatchApps,
+											 nextKey = self.stageClients["score"].popKey, nextStarted = modelsReady,
+											 maxQueued = self.maxQueued, leaseTTL = self.leaseTTL)
+							  for i in range(self.embedWorkers)]
+			startThreads("embed", [consumer.run for consumer in embedConsumers], embedDone)
+
+		if trainingDF is not None:
+			self.train(trainingDF, embedDone)
+			modelsReady.set()
+
+		scoreConsumers = []
+		if "score" in self.stages:
+			managers = {}
+			managersLock, resultsLock = threading.Lock(), threading.Lock()
+			scoreConsumers = [ScoringStage("{}-score-{}".format(hostID, i), self.stageClients["score"], embedDone,
+										   self.redisClientExtraction, self.redisClientEmbedding, self.embeddingModel,
+										   self.appsKey, self.modelRegistry, self.resultsPath, managers, managersLock, resultsLock,
+										   batchSize = self.scoreBatchApps, leaseTTL = self.leaseTTL)
+							  for i in range(self.scoreWorkers)]
+			startThreads("score", [consumer.run for consumer in scoreConsumers])
+
+		for stageThreads in threads.values():
+			for thread in stageThreads:
+				thread.join()
+		if "score" in self.stages:
+			for testingManager, _ in managers.values():
+				testingManager.close()
+
+		results = {
+			"wallTime"     : time.time() - startTime,
+			"numEmbedded"  : sum(consumer.numProcessed for consumer in embedConsumers),
+			"numEmbedErrors": sum(consumer.numErrors for consumer in embedConsumers),
+			"numScored"    : sum(consumer.numProcessed for consumer in scoreConsumers),
+			"numScoreErrors": sum(consumer.numErrors for consumer in scoreConsumers),
+		}
+		print("\n--- ✅ Embedded: {} --- Scored: {} --- ❌ Errors: embed {}, score {} --- ⏱️ {:.2f} s".format(
+			results["numEmbedded"], results["numScored"], results["numEmbedErrors"], results["numScoreErrors"], results["wallTime"]))
+		self.printStatus()
+		return results
+
+
+# Command line entry point
+# e.g. python Pipeline.py --project-key test.androcatset.backward.nosources --input ../../0_Data/3_AndroCatSet_TestSet.csv
+if __name__ == "__main__":
+	import pandas as pd
+
+	parser = argparse.ArgumentParser(description="DamFlow streaming pipeline: extraction --> embedding --> scoring")
+	parser.add_argument("--project-key", required=True, help="Extraction results, e.g. test.androcatset.backward.nosources")
+	parser.add_argument("--embeddings-key", default="test.embeddings", help="Prefix of the embedding hashes")
+	parser.add_argument("--embedding-model", default="gpt", choices=["gpt", "codebert", "sfr"])
+	parser.add_argument("--input", default=None, help="Apps to score (CSV with sha256 and classID), queued before running")
+	parser.add_argument("--train-input", default=None, help="Apps to train on (CSV with sha256 and classID), trained before scoring")
+	parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="Stages run by this process")
+	parser.add_argument("--follow", action="store_true", help="Keep waiting for apps from the stages running elsewhere")
+	parser.add_argument("--models-path", default="../../0_Data/MODELS/")
+	parser.add_argument("--results-path", default="../../0_Data/RESULTS/pipeline.jsonl")
+	parser.add_argument("--store-path", default="../../0_Data/TMP/STORE/")
+	parser.add_argument("--cache-path", default=None, help="Folder of the on-disk embedding cache")
+	parser.add_argument("--cache-version", default="1", help="Version of the embedding model stored in the cache")
+	parser.add_argument("--max-queued", type=int, default=256, help="Backpressure: max apps waiting for the next stage")
+	parser.add_argument("--lease-ttl", type=int, default=60)
+	# Extraction
+	parser.add_argument("--tmp-path", default="../../0_Data/TMP/")
+	parser.add_argument("--extractor", default="../1_Java/damflow_extractor/target/damflow_extractor-1.0-jar-with-dependencies.jar")
+	parser.add_argument("--direction", default="backward")
+	parser.add_argument("--sources", default="nosources")
+	parser.add_argument("--timeout", type=int, default=7200)
+	parser.add_argument("--extract-workers", type=int, default=None, help="Max number of parallel JVMs")
+	parser.add_argument("--jvm-memory-gb", type=int, default=24)
+	parser.add_argument("--cores-per-worker", type=int, default=2)
+	parser.add_argument("--daemon", action="store_true", help="Reuse a warm JVM per worker")
+	# Embedding and scoring
+	parser.add_argument("--embed-workers", type=int, default=1)
+	parser.add_argument("--embed-batch", type=int, default=32, help="Apps embedded together")
+	parser.add_argument("--score-workers", type=int, default=2)
+	parser.add_argument("--score-batch", type=int, default=16, help="Apps scored together")
+	# Training
+	parser.add_argument("--train-workers", type=int, default=None)
+	parser.add_argument("--detector", default="ocsvm")
+	args = parser.parse_args()
+
+	load_dotenv()
+	def createRedisClient(projectKey):
+		return RedisClient(host=os.getenv("REDIS_SERVER"),
+						   port=os.getenv("REDIS_PORT"),
+						   db=os.getenv("REDIS_DB"),
+						   password=os.getenv("REDIS_PSW"),
+						   projectKey=projectKey)
+
+	extractionArgs = None
+	if "extract" in args.stages:
+		os.makedirs(args.tmp_path, exist_ok=True)
+		extractionArgs = (args.tmp_path, args.extractor, os.getenv("ANDROID_PATH"), args.direction, args.sources, args.timeout)
+	trainingDF = pd.read_csv(args.train_input) if args.train_input is not None else None
+	trainingOptions = {"storePath": args.store_path, "maxWorkers": args.train_workers, "detector": args.detector} if trainingDF is not None else None
+
+	pipeline = Pipeline(createRedisClient(args.project_key), createRedisClient(args.embeddings_key), args.embedding_model,
+						args.models_path, args.results_path, stages = args.stages, extractionArgs = extractionArgs,
+						workerPoolOptions = {"maxWorkers": args.extract_workers, "jvmMemoryGB": args.jvm_memory_gb,
+											 "coresPerWorker": args.cores_per_worker, "useDaemon": args.daemon},
+						embedWorkers = args.embed_workers, embedBatchApps = args.embed_batch, scoreWorkers = args.score_workers,
+						scoreBatchApps = args.score_batch, maxQueued = args.max_queued, leaseTTL = args.lease_ttl,
+						trainingOptions = trainingOptions, cachePath = args.cache_path, follow = args.follow,
+						cacheVersion = args.cache_version)
+	if trainingDF is not None:
+		pipeline.seed(trainingDF, training = True)
+	if args.input is not None:
+		pipeline.seed(pd.read_csv(args.input))
+	pipeline.run(trainingDF)
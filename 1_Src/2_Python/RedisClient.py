@@ -1,6 +1,8 @@
 import datetime
 import redis
 import json
+# Own Imports
+import Utils
 
 class RedisClient:
 
@@ -15,9 +17,16 @@ class RedisClient:
     resultsKey = None
     errorKey   = None
 
-    def __init__(self, host, port, db, password, projectKey):
+    # Number of fields/values sent in a single bulk command
+    batchSize  = None
+
+    # Embedding hash --> EmbeddingCache serving its reads
+    embeddingCaches = None
+
+    # client: an already connected client to use instead of host/port/db/password (e.g. StandIns.InMemoryRedis)
+    def __init__(self, host, port, db, password, projectKey, batchSize = 1000, client = None):
         # Client
-        self.client     = redis.Redis(host=host, port=port, db=db, password=password)
+        self.client     = client if client is not None else redis.Redis(host=host, port=port, db=db, password=password)
         # Main Key
         self.projectKey = projectKey
         # List of elements to be analyzed
@@ -26,6 +35,10 @@ class RedisClient:
         self.resultsKey = projectKey + ".result"
         # List of elements who generated an error
         self.errorKey   = projectKey + ".error"
+        # Bulk operations size
+        self.batchSize  = batchSize
+        # Caches of the embedding hashes
+        self.embeddingCaches = {}
 
     # Function to get the size of a Redis hash or list.
     def getSize(self, redisKey):
@@ -67,42 +80,248 @@ class RedisClient:
 
     # Load Pop List
     def loadPopList(self, values):
-        # Push the values  to the pop List
-        for v in values:
-            self.client.rpush(self.popKey, v)
+        # Push the values to the pop List in batches
+        self.pushMany(self.popKey, values)
         self.printStatus()
 
+    # Push many values to a list, one RPUSH with many values per batch.
+    def pushMany(self, redisKey, values, batchSize = None):
+        batchSize = batchSize or self.batchSize
+        values = list(values)
+        pipe = self.client.pipeline(transaction=False)
+        for i in range(0, len(values), batchSize):
+            pipe.rpush(redisKey, *values[i:i + batchSize])
+        pipe.execute()
+
+    # Iterate over a Redis hash in pages of {field: value} using HSCAN.
+    def scanHash(self, redisKey, batchSize = None):
+        batchSize = batchSize or self.batchSize
+        cursor = 0
+        while True:
+            cursor, page = self.client.hscan(redisKey, cursor, count=batchSize)
+            if page:
+                yield page
+            if cursor == 0:
+                break
+
     # Copy from one Key to another
-    def copyRedisHashSets(self, sourceKey, destinationKey):
-        # Get all fields and values from the source key
-        values = self.client.hgetall(sourceKey)
-        
-        # Copy fields and values to the destination key
-        for field, value in values.items():
-            self.client.hset(destinationKey, field, value)
-        
+    def copyRedisHashSets(self, sourceKey, destinationKey, batchSize = None):
+        batchSize = batchSize or self.batchSize
+
+        # Stream the source hash with HSCAN: each round trip writes the previous page and fetches the next one
+        cursor, page = self.client.hscan(sourceKey, 0, count=batchSize)
+        while True:
+            pipe = self.client.pipeline(transaction=False)
+            if page:
+                pipe.hset(destinationKey, mapping=page)
+            if cursor == 0:
+                pipe.execute()
+                break
+            pipe.hscan(sourceKey, cursor, count=batchSize)
+            cursor, page = pipe.execute()[-1]
+
         # Print the number of elements in the destination key
         numElements = self.client.hlen(destinationKey)
         print(f"Number of elements in {destinationKey}: {numElements}")
 
-    # Method to get data (Json Object) from an HSET in REDIS using a specific KEY and sha256 as key to access
-    def downloadJsonData(self, redisKey, sha256):
+    # Check which fields exist in a Redis hash with pipelined HEXISTS in batches. Returns a list of booleans.
+    def existsMany(self, redisKey, fields, batchSize = None):
+        batchSize = batchSize or self.batchSize
+        fields = list(fields)
+        exists = []
+        for i in range(0, len(fields), batchSize):
+            pipe = self.client.pipeline(transaction=False)
+            for field in fields[i:i + batchSize]:
+                pipe.hexists(redisKey, field)
+            exists.extend(bool(value) for value in pipe.execute())
+        return exists
+
+    # Method to get raw values (bytes or None) of many fields from an HSET in REDIS using HMGET in batches
+    def downloadBytesMany(self, redisKey, fields, batchSize = None):
+        batchSize = batchSize or self.batchSize
+        fields = list(fields)
+        if len(fields) == 0:
+            return []
+        pipe = self.client.pipeline(transaction=False)
+        for i in range(0, len(fields), batchSize):
+            pipe.hmget(redisKey, fields[i:i + batchSize])
+        values = []
+        for chunk in pipe.execute():
+            values.extend(chunk)
+        return values
+
+    # Method to get data (Json Objects) of many fields from an HSET in REDIS.
+    # Returns a list aligned with fields, with None for missing or invalid entries.
+    def downloadJsonDataMany(self, redisKey, fields, batchSize = None):
+        fields = list(fields)
         try:
-            jsonDataString = self.client.hget(redisKey, sha256)
-            if jsonDataString is not None:
-                data = json.loads(jsonDataString)
-                return data
-            else:
-                return None
+            values = self.downloadBytesMany(redisKey, fields, batchSize)
         except Exception as e:
             print("--- ⚠️ An error occurred:", e)
-            return None
-        
+            return [None] * len(fields)
+
+        data = []
+        for value in values:
+            if value is None:
+                data.append(None)
+                continue
+            try:
+                data.append(json.loads(value))
+            except Exception as e:
+                print("--- ⚠️ An error occurred:", e)
+                data.append(None)
+        return data
+
+    # Method to get data (Strings) of many fields from an HSET in REDIS.
+    # Returns a list aligned with fields, with None for missing entries.
+    def downloadStringMany(self, redisKey, fields, batchSize = None):
+        fields = list(fields)
+        try:
+            values = self.downloadBytesMany(redisKey, fields, batchSize)
+            return [value.decode('utf-8') if value is not None else None for value in values]
+        except Exception as e:
+            print("--- ⚠️ An error occurred:", e)
+            return [None] * len(fields)
+
+    # Method to get data (Json Object) from an HSET in REDIS using a specific KEY and sha256 as key to access
+    def downloadJsonData(self, redisKey, sha256):
+        return self.downloadJsonDataMany(redisKey, [sha256])[0]
+
     # Method to get data (String) from an HSET in REDIS using a specific KEY and sha256 as key to access
     def downloadString(self, redisKey, sha256):
+        return self.downloadStringMany(redisKey, [sha256])[0]
+
+    ### RELIABLE WORK QUEUE ###
+    # Processing list of a worker: holds the elements it took from the pop List until they are completed
+    def getProcessingKey(self, workerID):
+        return self.projectKey + ".processing." + workerID
+
+    # Lease of a worker: expires if the worker stops sending heartbeats
+    def getLeaseKey(self, workerID):
+        return self.projectKey + ".lease." + workerID
+
+    # Set of the workers registered on this project
+    def getWorkersKey(self):
+        return self.projectKey + ".workers"
+
+    # Register a worker and refresh its lease
+    def heartbeat(self, workerID, leaseTTL):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.sadd(self.getWorkersKey(), workerID)
+        pipe.set(self.getLeaseKey(workerID), 1, ex=int(leaseTTL))
+        pipe.execute()
+
+    # Atomically move one element from the pop List to the processing list of a worker
+    def claimWork(self, workerID):
+        value = self.client.rpoplpush(self.popKey, self.getProcessingKey(workerID))
+        return value.decode('utf-8') if value is not None else None
+
+    # Remove a completed element from the processing list of a worker
+    def completeWork(self, workerID, value):
+        self.client.lrem(self.getProcessingKey(workerID), 1, value)
+
+    # Unregister a worker (its processing list must be empty)
+    def unregisterWorker(self, workerID):
+        pipe = self.client.pipeline(transaction=False)
+        pipe.srem(self.getWorkersKey(), workerID)
+        pipe.delete(self.getLeaseKey(workerID))
+        pipe.execute()
+
+    # Move back to the pop List the elements held by workers whose lease has expired.
+    # Returns the number of requeued elements.
+    def requeueDeadWorkers(self):
+        numRequeued = 0
+        for workerID in self.client.smembers(self.getWorkersKey()):
+            workerID = workerID.decode('utf-8')
+            if self.client.exists(self.getLeaseKey(workerID)):
+                continue
+            numRequeued += self.requeueWorker(workerID)
+            self.client.srem(self.getWorkersKey(), workerID)
+            print("--- ♻️ Dead worker {} --> Requeued its work".format(workerID), flush=True)
+        return numRequeued
+
+    # Move back to the pop List every element of the processing list of a worker
+    def requeueWorker(self, workerID):
+        numRequeued = 0
+        while self.client.rpoplpush(self.getProcessingKey(workerID), self.popKey) is not None:
+            numRequeued += 1
+        return numRequeued
+
+    ### EMBEDDINGS ###
+    # Store many embeddings ({method: list or array of floats}) in the binary format, pipelined in batches.
+    def uploadEmbeddings(self, redisKey, embeddings, batchSize = None):
+        batchSize = batchSize or self.batchSize
+        items = list(embeddings.items())
+        pipe = self.client.pipeline(transaction=False)
+        for i in range(0, len(items), batchSize):
+            pipe.hset(redisKey, mapping={method: Utils.encodeEmbedding(emb) for method, emb in items[i:i + batchSize]})
+        pipe.execute()
+        if redisKey in self.embeddingCaches:
+            self.embeddingCaches[redisKey].putMany(embeddings)
+
+    # Serve the reads of an embedding hash (cache.redisKey) through an EmbeddingCache
+    def attachEmbeddingCache(self, cache):
+        self.embeddingCaches[cache.redisKey] = cache
+
+    # Method to get the embeddings (float32 arrays) of many methods, through the cache of the hash when attached.
+    # Both the binary and the legacy text format are accepted. Returns a list aligned with methods, with None for missing entries.
+    def downloadEmbeddingsMany(self, redisKey, methods, batchSize = None):
+        cache = self.embeddingCaches.get(redisKey)
+        if cache is not None:
+            return cache.getMany(methods)
+        return self.fetchEmbeddingsMany(redisKey, methods, batchSize)
+
+    # Method to get the embeddings of many methods from the Redis Server (no cache)
+    def fetchEmbeddingsMany(self, redisKey, methods, batchSize = None):
+        methods = list(methods)
         try:
-            dataString = self.client.hget(redisKey, sha256).decode('utf-8')
-            return dataString  
+            values = self.downloadBytesMany(redisKey, methods, batchSize)
         except Exception as e:
             print("--- ⚠️ An error occurred:", e)
-            return None
\ No newline at end of file
+            return [None] * len(methods)
+        return [Utils.decodeEmbedding(value) for value in values]
+
+    # Method to get the embedding (float32 array) of a single method
+    def downloadEmbedding(self, redisKey, method):
+        return self.downloadEmbeddingsMany(redisKey, [method])[0]
+
+    # Rewrite in place every legacy text embedding of a hash (e.g. <prefix>.embeddings.<model>) in the binary format.
+    def migrateEmbeddings(self, redisKey, batchSize = None):
+        numMigrated = 0
+        numSkipped  = 0
+        for page in self.scanHash(redisKey, batchSize):
+            converted = {}
+            for method, value in page.items():
+                if Utils.isBinaryEmbedding(value):
+                    numSkipped += 1
+                else:
+                    converted[method] = Utils.encodeEmbedding(Utils.decodeEmbedding(value))
+            if converted:
+                self.client.hset(redisKey, mapping=converted)
+                numMigrated += len(converted)
+        print("--- ✅ Embeddings migrated in {}: {} (already binary: {})".format(redisKey, numMigrated, numSkipped))
+        return numMigrated
+
+
+# Command line entry point for maintenance tasks.
+# Usage: python RedisClient.py migrate-embeddings <redisKey> [<redisKey> ...]
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    import argparse
+    import os
+
+    parser = argparse.ArgumentParser(description="DamFlow Redis maintenance")
+    parser.add_argument("command", choices=["migrate-embeddings"])
+    parser.add_argument("keys", nargs="+", help="Embedding hashes to migrate, e.g. test.embeddings.gpt")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    load_dotenv()
+    for key in args.keys:
+        redisClient = RedisClient(host=os.getenv("REDIS_SERVER"),
+                                  port=os.getenv("REDIS_PORT"),
+                                  db=os.getenv("REDIS_DB"),
+                                  password=os.getenv("REDIS_PSW"),
+                                  projectKey=key.rsplit(".", 1)[0],
+                                  batchSize=args.batch_size)
+        redisClient.migrateEmbeddings(key)
@@ -0,0 +1,221 @@
+# Imports
+import argparse
+import glob
+import json
+import time
+import os
+
+# Append-only storage of the Testing results, one record (dict) per app.
+# - JSON Lines (default, path *.jsonl): records are appended to the current file, each flush ends with an fsync.
+#   When the file reaches rotateBytes it is renamed atomically to <name>.<n>.jsonl and a new file is started.
+#   A crash can only truncate the last line of the current file, which the reader skips; a writer opening
+#   the file again cuts that partial line first, so the next record does not get glued onto it.
+# - Parquet (path *.parquet, needs pyarrow): path is a folder; every flush writes a new part file
+#   to a temporary name, renamed atomically when complete.
+# Fields holding nested values (e.g. "dataFlows") are stored as JSON strings in Parquet.
+# pyarrow (Parquet) and pandas (readResults) are imported only when used.
+
+NESTED_FIELDS = ["dataFlows"]
+
+# JSON encoding of the numpy scalars (e.g. categoryID read from a DataFrame)
+def toJsonValue(value):
+	return value.item() if hasattr(value, "item") else str(value)
+
+
+# Optional: Parquet backend
+def importPyarrow():
+	try:
+		import pyarrow         as pa
+		import pyarrow.parquet as pq
+	except ImportError:
+		raise ImportError("--- ⚠️ Error: pyarrow is required for the Parquet results backend")
+	return pa, pq
+
+# Backend of a results path, from its extension
+def getFormat(path):
+	if path.endswith(".parquet"):
+		return "parquet"
+	if path.endswith(".jsonl"):
+		return "jsonl"
+	raise ValueError("--- ⚠️ Error: Unsupported results format '{}'. Please use '.jsonl' or '.parquet'.".format(path))
+
+# JSON Lines files already rotated, in writing order
+def getRotatedFiles(path):
+	return sorted(glob.glob(glob.escape(path[:-len(".jsonl")]) + ".[0-9]*.jsonl"))
+
+# Files holding the results of a path, in writing order
+def getResultsFiles(path):
+	if getFormat(path) == "parquet":
+		return sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+	return getRotatedFiles(path) + ([path] if os.path.exists(path) else [])
+
+# Cut a partial last line (left by a crash) from a JSON Lines file, back to its last newline
+def repairJsonLines(path, chunkSize = 64 * 1024):
+	if not os.path.exists(path):
+		return
+	with open(path, "r+b") as file:
+		size = file.seek(0, os.SEEK_END)
+		if size == 0:
+			return
+		file.seek(size - 1)
+		if file.read(1) == b"\n":
+			return
+		# Search the last newline backwards
+		end = size
+		while end > 0:
+			start = max(0, end - chunkSize)
+			file.seek(start)
+			position = file.read(end - start).rfind(b"\n")
+			if position >= 0:
+				end = start + position + 1
+				break
+			end = start
+		file.truncate(end)
+		file.flush()
+		os.fsync(file.fileno())
+	print("--- ⚠️ Removed incomplete record at the end of {} ({} bytes)".format(path, size - end))
+
+# Delete all the files of a results path
+def deleteResults(path):
+	for filePath in getResultsFiles(path):
+		os.remove(filePath)
+
+
+class ResultsWriter:
+
+	path   = None
+	format = None
+
+	# Flush when flushEvery records are buffered or flushInterval seconds passed since the last flush
+	flushEvery    = None
+	flushInterval = None
+	# JSON Lines: size of the current file that triggers a rotation (None: no rotation)
+	rotateBytes   = None
+
+	buffer     = None
+	lastFlush  = None
+	numWritten = None
+
+	def __init__(self, path, flushEvery = 100, flushInterval = 30, rotateBytes = 1024 ** 3):
+		self.path          = path
+		self.format        = getFormat(path)
+		self.flushEvery    = flushEvery
+		self.flushInterval = flushInterval
+		self.rotateBytes   = rotateBytes
+		self.buffer        = []
+		self.lastFlush     = time.monotonic()
+		self.numWritten    = 0
+
+		if self.format == "parquet":
+			importPyarrow()
+			os.makedirs(path, exist_ok=True)
+		else:
+			if os.path.dirname(path):
+				os.makedirs(os.path.dirname(path), exist_ok=True)
+			repairJsonLines(path)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def write(self, record):
+		self.buffer.append(record)
+		if len(self.buffer) >= self.flushEvery or time.monotonic() - self.lastFlush >= self.flushInterval:
+			self.flush()
+
+	def flush(self):
+		if len(self.buffer) > 0:
+			if self.format == "parquet":
+				self.flushParquet()
+			else:
+				self.flushJsonLines()
+			self.numWritten += len(self.buffer)
+			self.buffer = []
+		self.lastFlush = time.monotonic()
+
+	def flushJsonLines(self):
+		with open(self.path, "a", encoding="utf-8") as file:
+			file.write("".join(json.dumps(record, default=toJsonValue) + "\n" for record in self.buffer))
+			file.flush()
+			os.fsync(file.fileno())
+			size = file.tell()
+		if self.rotateBytes is not None and size >= self.rotateBytes:
+			self.rotate()
+
+	# Move the current JSON Lines file to the next <name>.<n>.jsonl
+	def rotate(self):
+		stem = self.path[:-len(".jsonl")]
+		os.replace(self.path, "{}.{:05d}.jsonl".format(stem, len(getRotatedFiles(self.path))))
+
+	def flushParquet(self):
+		pa, pq = importPyarrow()
+		records = [{key: json.dumps(value, default=toJsonValue) if key in NESTED_FIELDS else
+					(toJsonValue(value) if hasattr(value, "item") else value) for key, value in record.items()}
+				   for record in self.buffer]
+		partPath = os.path.join(self.path, "part-{}-{}.parquet".format(time.time_ns(), os.getpid()))
+		tmpPath  = partPath + ".part"
+		pq.write_table(pa.Table.from_pylist(records), tmpPath)
+		with open(tmpPath, "rb") as file:
+			os.fsync(file.fileno())
+		os.replace(tmpPath, partPath)
+
+	def close(self):
+		self.flush()
+
+
+# Records of a JSON Lines file (a truncated last line is skipped)
+def readJsonLines(filePath):
+	records = []
+	with open(filePath, "r", encoding="utf-8") as file:
+		for line in file:
+			try:
+				records.append(json.loads(line))
+			except json.JSONDecodeError:
+				print("--- ⚠️ Skipped incomplete record in {}".format(filePath))
+	return records
+
+# Records of a Parquet part file, nested fields decoded
+def readParquet(filePath):
+	_, pq = importPyarrow()
+	records = pq.read_table(filePath).to_pylist()
+	for record in records:
+		for field in NESTED_FIELDS:
+			if record.get(field) is not None:
+				record[field] = json.loads(record[field])
+	return records
+
+# Records of a results path (JSON Lines or Parquet), in writing order
+def readRecords(path):
+	readFile = readParquet if getFormat(path) == "parquet" else readJsonLines
+	return [record for filePath in getResultsFiles(path) for record in readFile(filePath)]
+
+# Load the results of a path (JSON Lines or Parquet) into a DataFrame
+def readResults(path):
+	import pandas as pd
+	return pd.DataFrame(readRecords(path))
+
+# Write the results of a path in the legacy layout: a single JSON list of records, indent=4
+def toLegacyJson(path, outputPath):
+	records = readRecords(path)
+	tmpPath = outputPath + ".part"
+	with open(tmpPath, "w") as file:
+		json.dump(records, file, indent=4)
+		file.flush()
+		os.fsync(file.fileno())
+	os.replace(tmpPath, outputPath)
+	print("--- 💾 Legacy results saved: {} ({} apps)".format(outputPath, len(records)))
+
+
+# Command line entry point
+# Usage: python Results.py to-legacy <results.jsonl | results.parquet> <output.json>
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="DamFlow Testing results")
+	parser.add_argument("command", choices=["to-legacy"])
+	parser.add_argument("path", help="Results path (.jsonl or .parquet)")
+	parser.add_argument("output", help="Legacy single JSON file")
+	args = parser.parse_args()
+
+	if args.command == "to-legacy":
+		toLegacyJson(args.path, args.output)
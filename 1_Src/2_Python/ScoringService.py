@@ -0,0 +1,309 @@
+# Imports
+from   http.server    import BaseHTTPRequestHandler, ThreadingHTTPServer
+from   dotenv         import load_dotenv
+import numpy          as np
+import threading
+import argparse
+import queue
+import json
+import time
+import os
+# Own Imports
+from   App            import DataFlows, gatherPairsEmbeddings
+from   EmbeddingCache import EmbeddingCache
+from   ModelRegistry  import ModelRegistry
+from   RedisClient    import RedisClient
+import Testing
+
+# Long-running local scoring service.
+# POST /score  {"categoryID": ..., "sha256": ...}                 --> Data Flows taken from the extraction results on Redis
+#              {"categoryID": ..., "dataFlows": {sources, sinks, pairs}}
+#              optional "detector" and "version" select the model (see ModelRegistry.getModelPath)
+#   <-- {"sha256", "categoryID", "numDataFlows", "numOutliers", "percentageOutliers", "outlierLabel", "outliers": [{source, sink, score}]}
+#   Same convention as the Testing results: the "outliers" are the pairs whose predicted label is Testing.OUTLIER_LABEL
+#   (outlierLabel, 1: decision_function >= 0). "score" is the decision_function of the pair: the outliers have
+#   score >= 0, and the higher the score, the more clearly the pair gets that label.
+# GET  /stats  --> counters of the caches and of the batcher
+# GET  /health
+# Models (ModelRegistry) and method embeddings (EmbeddingCache) stay warm in memory. The pair matrices of
+# concurrent requests for the same model are scored together by the MicroBatcher.
+
+
+# Pair matrix of a request waiting to be scored
+class ScoringRequest:
+
+	__slots__ = ('modelPath', 'X', 'scores', 'error', 'done')
+
+	def __init__(self, modelPath, X):
+		self.modelPath = modelPath
+		self.X         = X
+		self.scores    = None
+		self.error     = None
+		self.done      = threading.Event()
+
+
+# Gathers the requests arriving within maxWait seconds (up to maxBatchRows pairs) and scores the requests
+# of each model with a single decision_function call.
+class MicroBatcher:
+
+	modelRegistry = None
+	maxBatchRows  = None
+	maxWait       = None
+
+	requests  = None
+	stopEvent = None
+	thread    = None
+
+	# Statistics
+	numBatches  = None
+	numRequests = None
+	numRows     = None
+
+	def __init__(self, modelRegistry, maxBatchRows = 8192, maxWait = 0.005):
+		self.modelRegistry = modelRegistry
+		self.maxBatchRows  = maxBatchRows
+		self.maxWait       = maxWait
+		self.requests      = queue.Queue()
+		self.stopEvent     = threading.Event()
+		self.numBatches    = 0
+		self.numRequests   = 0
+		self.numRows       = 0
+
+	def start(self):
+		self.thread = threading.Thread(target=self.run, daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.stopEvent.set()
+		if self.thread is not None:
+			self.thread.join()
+
+	# Score the pair matrix X with a model (blocks until its batch is scored)
+	def score(self, modelPath, X):
+		request = ScoringRequest(modelPath, X)
+		self.requests.put(request)
+		request.done.wait()
+		if request.error is not None:
+			raise request.error
+		return request.scores
+
+	# Next batch of requests: the first one waiting, then the ones arriving within maxWait
+	def nextBatch(self):
+		try:
+			batch = [self.requests.get(timeout=0.1)]
+		except queue.Empty:
+			return []
+		numRows  = len(batch[0].X)
+		deadline = time.monotonic() + self.maxWait
+		while numRows < self.maxBatchRows:
+			try:
+				request = self.requests.get(timeout=max(0, deadline - time.monotonic()))
+			except queue.Empty:
+				break
+			batch.append(request)
+			numRows += len(request.X)
+		return batch
+
+	def run(self):
+		while not self.stopEvent.is_set():
+			batch = self.nextBatch()
+			if len(batch) == 0:
+				continue
+
+			# One decision_function per model
+			byModel = {}
+			for request in batch:
+				byModel.setdefault(request.modelPath, []).append(request)
+			for modelPath, requests in byModel.items():
+				try:
+					model  = self.modelRegistry.load(modelPath).model
+					scores = model.decision_function(np.concatenate([request.X for request in requests]))
+					offset = 0
+					for request in requests:
+						request.scores = scores[offset:offset + len(request.X)]
+						offset += len(request.X)
+				except Exception as e:
+					for request in requests:
+						request.error = e
+				for request in requests:
+					request.done.set()
+
+			self.numBatches  += 1
+			self.numRequests += len(batch)
+			self.numRows     += sum(len(request.X) for request in batch)
+
+
+class ScoringService:
+
+	redisClientExtraction = None
+	embeddingModel        = None
+
+	# Warm state
+	embeddingCache = None
+	modelRegistry  = None
+	batcher        = None
+
+	server = None
+	thread = None
+
+	def __init__(self, redisClientExtraction, redisClientEmbedding, modelsPath, embeddingModel, host = "127.0.0.1", port = 8080,
+				 maxBatchRows = 8192, maxWait = 0.005, cacheBytes = 2 * 1024 ** 3, modelsMemory = 8 * 1024 ** 3, cachePath = None,
+				 cacheVersion = "1"):
+		self.redisClientExtraction = redisClientExtraction
+		self.embeddingModel        = embeddingModel
+		self.embeddingCache        = EmbeddingCache(redisClientEmbedding, embeddingModel, cacheBytes, cachePath, cacheVersion)
+		self.modelRegistry         = ModelRegistry(modelsPath, modelsMemory)
+		self.batcher               = MicroBatcher(self.modelRegistry, maxBatchRows, maxWait)
+
+		service = self
+
+		class Handler(BaseHTTPRequestHandler):
+
+			# Keep-alive connections, responses sent without waiting for the ACK of the previous segment
+			protocol_version = "HTTP/1.1"
+			disable_nagle_algorithm = True
+
+			def log_message(self, format, *args):
+				pass
+
+			def sendJson(self, status, body):
+				payload = json.dumps(body).encode("utf-8")
+				self.send_response(status)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(payload)))
+				self.end_headers()
+				self.wfile.write(payload)
+
+			def do_GET(self):
+				if self.path == "/health":
+					self.sendJson(200, {"status": "ok"})
+				elif self.path == "/stats":
+					self.sendJson(200, service.getStats())
+				else:
+					self.sendJson(404, {"error": "Not found"})
+
+			def do_POST(self):
+				body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+				if self.path != "/score":
+					self.sendJson(404, {"error": "Not found"})
+					return
+				try:
+					self.sendJson(200, service.score(json.loads(body or b"{}")))
+				except (ValueError, KeyError) as e:
+					self.sendJson(400, {"error": str(e)})
+				except LookupError as e:
+					self.sendJson(404, {"error": str(e)})
+				except Exception as e:
+					self.sendJson(500, {"error": "{}: {}".format(type(e).__name__, e)})
+
+		self.server = ThreadingHTTPServer((host, port), Handler)
+		self.server.daemon_threads = True
+
+	@property
+	def baseUrl(self):
+		return "http://{}:{}".format(*self.server.server_address[:2])
+
+	def getStats(self):
+		return {
+			"embeddingCache": self.embeddingCache.getStats(),
+			"models"        : {"loaded": len(self.modelRegistry.entries), "hits": self.modelRegistry.numHits,
+							   "loads": self.modelRegistry.numLoads, "evictions": self.modelRegistry.numEvictions},
+			"batcher"       : {"batches": self.batcher.numBatches, "requests": self.batcher.numRequests, "pairs": self.batcher.numRows},
+		}
+
+	# Data Flows of a request
+	def getDataFlows(self, request):
+		if "dataFlows" in request:
+			dataFlows = request["dataFlows"]
+			return DataFlows(dataFlows.get("sources", []), dataFlows.get("sinks", []), dataFlows.get("pairs", []))
+		if "sha256" in request:
+			result = self.redisClientExtraction.downloadBytesMany(self.redisClientExtraction.resultsKey, [request["sha256"]])[0]
+			if result is None:
+				raise LookupError("Data Flows of {} not available on Redis".format(request["sha256"]))
+			return DataFlows.fromJson(result)
+		raise ValueError("The request needs 'sha256' or 'dataFlows'")
+
+	# Outliers of the Data Flows of a request (pairs labelled Testing.OUTLIER_LABEL), with the decision_function
+	# score of each of them (see the convention at the top of the module)
+	def score(self, request):
+		categoryID = request["categoryID"]
+		modelPath  = self.modelRegistry.getModelPath(categoryID, self.embeddingModel, request.get("detector"), request.get("version"))
+		if not os.path.isfile(modelPath):
+			raise LookupError("No model for category {}".format(categoryID))
+
+		dataFlows = self.getDataFlows(request)
+		methods, sourceIdx, sinkIdx = dataFlows.getPairsIndex()
+		response = {"sha256": request.get("sha256"), "categoryID": categoryID, "numDataFlows": len(sourceIdx),
+					"numOutliers": 0, "percentageOutliers": 0, "outlierLabel": Testing.OUTLIER_LABEL, "outliers": []}
+		if len(sourceIdx) == 0:
+			return response
+
+		methodEmbeddings = self.embeddingCache.getMany(methods)
+		numMissing = sum(1 for embedding in methodEmbeddings if embedding is None)
+		if numMissing > 0:
+			raise LookupError("Embeddings not present on Redis Server: {} of {} methods".format(numMissing, len(methods)))
+
+		scores = self.batcher.score(modelPath, gatherPairsEmbeddings(methodEmbeddings, sourceIdx, sinkIdx))
+
+		# Label of each pair from its score, as predict() does
+		labels = np.where(scores < 0, -1, 1)
+		rows   = np.flatnonzero(labels == Testing.OUTLIER_LABEL)
+		response["numOutliers"]        = len(rows)
+		response["percentageOutliers"] = round(len(rows) / len(sourceIdx) * 100, 2)
+		response["outliers"] = [{"source": methods[sourceIdx[row]], "sink": methods[sinkIdx[row]], "score": float(scores[row])}
+								for row in rows.tolist()]
+		return response
+
+	def start(self):
+		self.batcher.start()
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+		self.batcher.stop()
+		self.embeddingCache.close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *args):
+		self.stop()
+
+
+# Command line entry point
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="DamFlow local scoring service")
+	parser.add_argument("--project-key", required=True, help="Extraction results, e.g. test.androcatset.backward.nosources")
+	parser.add_argument("--embeddings-key", default="test.embeddings", help="Prefix of the embedding hashes")
+	parser.add_argument("--embedding-model", default="gpt", choices=["gpt", "codebert", "sfr"])
+	parser.add_argument("--models-path", default="../../0_Data/MODELS/")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("--port", type=int, default=8080)
+	parser.add_argument("--max-batch-rows", type=int, default=8192)
+	parser.add_argument("--max-wait-ms", type=float, default=5)
+	parser.add_argument("--cache-gb", type=float, default=2)
+	parser.add_argument("--models-gb", type=float, default=8)
+	parser.add_argument("--cache-path", default=None, help="Folder of the on-disk embedding cache shared by the processes of the host")
+	parser.add_argument("--cache-version", default="1", help="Version of the embedding model stored in the cache")
+	args = parser.parse_args()
+
+	load_dotenv()
+	def createRedisClient(projectKey):
+		return RedisClient(host=os.getenv("REDIS_SERVER"),
+						   port=os.getenv("REDIS_PORT"),
+						   db=os.getenv("REDIS_DB"),
+						   password=os.getenv("REDIS_PSW"),
+						   projectKey=projectKey)
+
+	service = ScoringService(createRedisClient(args.project_key), createRedisClient(args.embeddings_key), args.models_path,
+							 args.embedding_model, args.host, args.port, args.max_batch_rows, args.max_wait_ms / 1000,
+							 int(args.cache_gb * 1024 ** 3), int(args.models_gb * 1024 ** 3), args.cache_path, args.cache_version).start()
+	print("--- 🚀 Scoring service listening on {}".format(service.baseUrl), flush=True)
+	try:
+		service.thread.join()
+	except KeyboardInterrupt:
+		service.stop()
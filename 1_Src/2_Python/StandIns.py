@@ -0,0 +1,400 @@
+from   http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy     as np
+import threading
+import hashlib
+import json
+import time
+
+# Local stand-ins for the external services used by the pipeline,
+# to run the code and measure it without OpenAI, AndroZoo or a real Redis.
+
+# Deterministic pseudo-embedding of a text: same text --> same unit vector
+def fakeEmbedding(text, dim):
+	seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+	vector = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+	return vector / np.linalg.norm(vector)
+
+
+# Local HTTP server mimicking the OpenAI embeddings endpoint (POST /v1/embeddings).
+# requestsPerMinute: sliding-window limit, requests above it get a 429 with a Retry-After header.
+# rateLimitFirst   : number of initial requests answered with a 429 regardless of the limit.
+# maxInputChars    : requests holding a longer input get a 400, as the API does for inputs over the context length.
+class FakeEmbeddingsServer:
+
+	dim               = None
+	requestsPerMinute = None
+	rateLimitFirst    = None
+	retryAfter        = None
+	latency           = None
+	maxInputChars     = None
+
+	# Statistics
+	numRequests    = None
+	numRateLimited = None
+	numRejected    = None
+	numInputs      = None
+
+	server = None
+	thread = None
+	lock   = None
+	recent = None
+
+	def __init__(self, dim = 1536, requestsPerMinute = None, rateLimitFirst = 0, retryAfter = 0.05, latency = 0.0, port = 0,
+				 maxInputChars = None):
+		self.dim               = dim
+		self.requestsPerMinute = requestsPerMinute
+		self.rateLimitFirst    = rateLimitFirst
+		self.retryAfter        = retryAfter
+		self.latency           = latency
+		self.maxInputChars     = maxInputChars
+		self.numRequests       = 0
+		self.numRateLimited    = 0
+		self.numRejected       = 0
+		self.numInputs         = 0
+		self.lock              = threading.Lock()
+		self.recent            = []
+
+		standIn = self
+
+		class Handler(BaseHTTPRequestHandler):
+
+			def log_message(self, format, *args):
+				pass
+
+			def sendJson(self, status, body, headers = None):
+				payload = json.dumps(body).encode("utf-8")
+				self.send_response(status)
+				self.send_header("Content-Type", "application/json")
+				self.send_header("Content-Length", str(len(payload)))
+				for key, value in (headers or {}).items():
+					self.send_header(key, value)
+				self.end_headers()
+				self.wfile.write(payload)
+
+			def do_POST(self):
+				body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+				if not self.path.rstrip("/").endswith("/embeddings"):
+					self.sendJson(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+					return
+
+				if standIn.isRateLimited():
+					self.sendJson(429, {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+								  {"Retry-After": str(standIn.retryAfter)})
+					return
+
+				if standIn.latency > 0:
+					time.sleep(standIn.latency)
+
+				inputs = body.get("input", [])
+				if isinstance(inputs, str):
+					inputs = [inputs]
+				if standIn.maxInputChars is not None and any(len(text) > standIn.maxInputChars for text in inputs):
+					with standIn.lock:
+						standIn.numRejected += 1
+					self.sendJson(400, {"error": {"message": "Input exceeds the maximum context length", "type": "invalid_request_error",
+												  "param": "input", "code": None}})
+					return
+				with standIn.lock:
+					standIn.numInputs += len(inputs)
+				data = [{"object": "embedding", "index": i, "embedding": fakeEmbedding(text, standIn.dim).tolist()}
+						for i, text in enumerate(inputs)]
+				numTokens = sum(len(text.split()) for text in inputs)
+				self.sendJson(200, {"object": "list", "data": data, "model": body.get("model"),
+									"usage": {"prompt_tokens": numTokens, "total_tokens": numTokens}})
+
+		self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+		self.server.daemon_threads = True
+
+	# Base URL to give to the OpenAI client
+	@property
+	def baseUrl(self):
+		return "http://127.0.0.1:{}/v1".format(self.server.server_address[1])
+
+	# Count the request and decide if it must be rejected
+	def isRateLimited(self):
+		with self.lock:
+			self.numRequests += 1
+			now = time.monotonic()
+			self.recent = [t for t in self.recent if now - t < 60]
+			limited = (self.numRequests <= self.rateLimitFirst or
+					   (self.requestsPerMinute is not None and len(self.recent) >= self.requestsPerMinute))
+			if limited:
+				self.numRateLimited += 1
+			else:
+				self.recent.append(now)
+			return limited
+
+	def start(self):
+		self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+		self.thread.start()
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def __enter__(self):
+		return self.start()
+
+	def __exit__(self, *args):
+		self.stop()
+
+
+# Synthetic method signatures (Soot format), the first numLibraryMethods in library packages
+def fakeMethods(numMethods, numLibraryMethods = 0):
+	return ["<com.{}{}.Class{}: void method{}()>".format("lib" if i < numLibraryMethods else "app", i % 50, i % 7, i)
+			for i in range(numMethods)]
+
+# Synthetic extraction results stored in redisClient.resultsKey: numApps apps spread over numCategories categories.
+# The pairs are drawn from numMethods methods. The first numLibraryMethods are library methods shared by
+# most apps, and a fraction libraryRatio of the pairs use them (as SDKs do in real apps).
+# zipfExponent: library methods drawn with a Zipf-like popularity (weight 1 / rank^zipfExponent, a few methods
+# in most apps and a long tail), None: uniformly.
+# Returns the list of (sha256, categoryID) of the apps and the list of the methods.
+def fakeDataset(redisClient, numApps = 200, numCategories = 4, numMethods = 5000, numLibraryMethods = 200,
+				minPairs = 5, maxPairs = 200, libraryRatio = 0.5, zipfExponent = None, seed = 42):
+	rng = np.random.default_rng(seed)
+	methods = fakeMethods(numMethods, numLibraryMethods)
+	libraryWeights = None
+	if zipfExponent is not None:
+		libraryWeights = 1.0 / np.arange(1, numLibraryMethods + 1) ** zipfExponent
+		libraryWeights /= libraryWeights.sum()
+
+	apps    = []
+	results = {}
+	for i in range(numApps):
+		sha256 = hashlib.sha256("fake-app-{}-{}".format(seed, i).encode("utf-8")).hexdigest().upper()
+		numPairs  = int(rng.integers(minPairs, maxPairs + 1))
+		isLibrary = rng.random((numPairs, 1)) < libraryRatio
+		if libraryWeights is None:
+			libraryIdx = rng.integers(0, numLibraryMethods, (numPairs, 2))
+		else:
+			libraryIdx = rng.choice(numLibraryMethods, (numPairs, 2), p=libraryWeights)
+		pairsIdx  = np.where(isLibrary, libraryIdx, rng.integers(numLibraryMethods, numMethods, (numPairs, 2)))
+		pairs = [{"source": methods[source], "sink": methods[sink]} for source, sink in pairsIdx.tolist()]
+		results[sha256] = json.dumps({"sources": sorted({pair["source"] for pair in pairs}),
+									  "sinks"  : sorted({pair["sink"] for pair in pairs}),
+									  "pairs"  : pairs})
+		apps.append((sha256, i % numCategories))
+
+	redisClient.client.hset(redisClient.resultsKey, mapping=results)
+	return apps, methods
+
+# Store the pseudo-embeddings of methods in the hash <projectKey>.<embeddingModel>
+def fakeEmbeddings(redisClient, embeddingModel, methods, dim = 1536):
+	redisClient.uploadEmbeddings(redisClient.projectKey + "." + embeddingModel, {method: fakeEmbedding(method, dim) for method in methods})
+
+
+# Deterministic embedding backend with the interface of the managers of Embedding.py (pseudo-embeddings of fakeEmbedding)
+# Usage: EmbeddingsManager(redisClient, "gpt", manager = FakeEmbeddingManager(dim))
+class FakeEmbeddingManager:
+
+	dim = None
+
+	def __init__(self, dim = 1536):
+		self.dim = dim
+
+	def generateEmbedding(self, inputData):
+		return fakeEmbedding(inputData, self.dim)
+
+	def generateEmbeddings(self, inputs):
+		return [fakeEmbedding(inputData, self.dim) for inputData in inputs]
+
+
+# In-memory stand-in of a Redis server, with the subset of the redis-py API used by RedisClient
+# (hashes, lists, sets, strings, key expiry and non-transactional pipelines). Values are returned as bytes.
+# Usage: RedisClient(None, None, None, None, projectKey, client = InMemoryRedis())
+class InMemoryRedis:
+
+	data    = None
+	expires = None
+	lock    = None
+
+	def __init__(self):
+		self.data    = {}
+		self.expires = {}
+		self.lock    = threading.RLock()
+
+	@staticmethod
+	def encode(value):
+		if isinstance(value, bytes):
+			return value
+		if isinstance(value, str):
+			return value.encode("utf-8")
+		return str(value).encode("utf-8")
+
+	# Value of a key (None if missing or expired), created with factory if create is set
+	def lookup(self, key, factory = None):
+		key = self.encode(key)
+		if key in self.expires and self.expires[key] <= time.monotonic():
+			self.data.pop(key, None)
+			self.expires.pop(key, None)
+		if key not in self.data and factory is not None:
+			self.data[key] = factory()
+		return self.data.get(key)
+
+	def pipeline(self, transaction = False):
+		return InMemoryPipeline(self)
+
+	def close(self):
+		pass
+
+	# Keys
+	def type(self, key):
+		with self.lock:
+			value = self.lookup(key)
+			return {dict: b"hash", list: b"list", set: b"set", bytes: b"string"}.get(type(value), b"none")
+
+	def exists(self, *keys):
+		with self.lock:
+			return sum(1 for key in keys if self.lookup(key) is not None)
+
+	def delete(self, *keys):
+		with self.lock:
+			numDeleted = self.exists(*keys)
+			for key in keys:
+				self.data.pop(self.encode(key), None)
+				self.expires.pop(self.encode(key), None)
+			return numDeleted
+
+	def expire(self, key, seconds):
+		with self.lock:
+			if self.lookup(key) is None:
+				return False
+			self.expires[self.encode(key)] = time.monotonic() + seconds
+			return True
+
+	# Strings
+	def set(self, key, value, ex = None):
+		with self.lock:
+			self.data[self.encode(key)] = self.encode(value)
+			self.expires.pop(self.encode(key), None)
+			if ex is not None:
+				self.expires[self.encode(key)] = time.monotonic() + ex
+			return True
+
+	def get(self, key):
+		with self.lock:
+			return self.lookup(key)
+
+	# Hashes
+	def hset(self, key, field = None, value = None, mapping = None):
+		with self.lock:
+			items = dict(mapping or {})
+			if field is not None:
+				items[field] = value
+			hashValue = self.lookup(key, dict)
+			numAdded = sum(1 for field in items if self.encode(field) not in hashValue)
+			hashValue.update({self.encode(field): self.encode(value) for field, value in items.items()})
+			return numAdded
+
+	def hget(self, key, field):
+		with self.lock:
+			return (self.lookup(key) or {}).get(self.encode(field))
+
+	def hmget(self, key, fields, *args):
+		with self.lock:
+			hashValue = self.lookup(key) or {}
+			fields = list(fields) if isinstance(fields, (list, tuple)) else [fields]
+			return [hashValue.get(self.encode(field)) for field in fields + list(args)]
+
+	def hexists(self, key, field):
+		with self.lock:
+			return self.encode(field) in (self.lookup(key) or {})
+
+	def hlen(self, key):
+		with self.lock:
+			return len(self.lookup(key) or {})
+
+	def hdel(self, key, *fields):
+		with self.lock:
+			hashValue = self.lookup(key) or {}
+			return sum(1 for field in fields if hashValue.pop(self.encode(field), None) is not None)
+
+	# The cursor is the position in the sorted fields
+	def hscan(self, key, cursor = 0, count = 10):
+		with self.lock:
+			hashValue = self.lookup(key) or {}
+			fields = sorted(hashValue)[cursor:cursor + count]
+			nextCursor = cursor + count if cursor + count < len(hashValue) else 0
+			return nextCursor, {field: hashValue[field] for field in fields}
+
+	# Lists
+	def lpush(self, key, *values):
+		with self.lock:
+			listValue = self.lookup(key, list)
+			for value in values:
+				listValue.insert(0, self.encode(value))
+			return len(listValue)
+
+	def rpush(self, key, *values):
+		with self.lock:
+			listValue = self.lookup(key, list)
+			listValue.extend(self.encode(value) for value in values)
+			return len(listValue)
+
+	def llen(self, key):
+		with self.lock:
+			return len(self.lookup(key) or [])
+
+	def rpoplpush(self, source, destination):
+		with self.lock:
+			listValue = self.lookup(source)
+			if not listValue:
+				return None
+			value = listValue.pop()
+			self.lookup(destination, list).insert(0, value)
+			return value
+
+	def lrem(self, key, count, value):
+		with self.lock:
+			listValue = self.lookup(key) or []
+			value = self.encode(value)
+			numRemoved = 0
+			while value in listValue and (count == 0 or numRemoved < abs(count)):
+				listValue.remove(value)
+				numRemoved += 1
+			return numRemoved
+
+	# Sets
+	def sadd(self, key, *values):
+		with self.lock:
+			setValue = self.lookup(key, set)
+			numAdded = sum(1 for value in values if self.encode(value) not in setValue)
+			setValue.update(self.encode(value) for value in values)
+			return numAdded
+
+	def srem(self, key, *values):
+		with self.lock:
+			setValue = self.lookup(key) or set()
+			numRemoved = sum(1 for value in values if self.encode(value) in setValue)
+			setValue.difference_update(self.encode(value) for value in values)
+			return numRemoved
+
+	def smembers(self, key):
+		with self.lock:
+			return set(self.lookup(key) or set())
+
+
+# Pipeline of InMemoryRedis: commands are queued and run in order by execute()
+class InMemoryPipeline:
+
+	redis    = None
+	commands = None
+
+	def __init__(self, redis):
+		self.redis    = redis
+		self.commands = []
+
+	def __getattr__(self, name):
+		command = getattr(self.redis, name)
+		def queue(*args, **kwargs):
+			self.commands.append((command, args, kwargs))
+			return self
+		return queue
+
+	def execute(self):
+		with self.redis.lock:
+			results = [command(*args, **kwargs) for command, args, kwargs in self.commands]
+		self.commands = []
+		return results
@@ -1,8 +1,119 @@
-from App   import DataFlows
+from   collections import OrderedDict
+from   App   import gatherPairsEmbeddings
+from   ModelRegistry import getModelFingerprint, getModelStat
+import Results
+import numpy as np
 import joblib
 import json
 import os
 
+# Label of the pairs reported as outliers in the results
+OUTLIER_LABEL = 1
+
+
+# Memoization of the label of a (source, sink) pair predicted by a model.
+# Entries are keyed on (model fingerprint, source, sink): a new or retrained model never reads old labels.
+# Level 1: in-process LRU of maxSize entries.
+# Level 2 (optional): Redis hash <redisKey>.<fingerprint> shared by all processes, field "source\tsink".
+# Each hash expires ttl seconds after its last write, and the hash of a model is deleted when a TestingManager
+# sees the model file replaced (forget).
+class PredictionCache:
+
+	maxSize     = None
+	entries     = None
+
+	# Shared level (optional)
+	redisClient = None
+	redisKey    = None
+	ttl         = None
+
+	# Statistics
+	numHits      = None
+	numRedisHits = None
+	numMisses    = None
+
+	def __init__(self, maxSize = 1000000, redisClient = None, redisKey = None, ttl = 7 * 24 * 3600):
+		self.maxSize      = maxSize
+		self.entries      = OrderedDict()
+		self.redisClient  = redisClient
+		self.redisKey     = redisKey if redisKey is not None or redisClient is None else redisClient.projectKey + ".predictions"
+		self.ttl          = ttl
+		self.numHits      = 0
+		self.numRedisHits = 0
+		self.numMisses    = 0
+
+	@property
+	def hitRate(self):
+		numLookups = self.numHits + self.numRedisHits + self.numMisses
+		return (self.numHits + self.numRedisHits) / numLookups if numLookups else 0.0
+
+	def __str__(self):
+		output = "\n--- ⭐ Prediction Cache ⭐---\n"
+		output += "--- #️⃣ Entries        : {} / {}\n".format(len(self.entries), self.maxSize)
+		output += "--- ✅ Hits (memory)  : {}\n".format(self.numHits)
+		output += "--- ✅ Hits (Redis)   : {}\n".format(self.numRedisHits)
+		output += "--- ❌ Misses         : {}\n".format(self.numMisses)
+		output += "--- 📊 Hit rate       : {:.2f}%\n".format(self.hitRate * 100)
+		return output
+
+	def getRedisKey(self, fingerprint):
+		return "{}.{}".format(self.redisKey, fingerprint)
+
+	def remember(self, key, label):
+		self.entries[key] = label
+		self.entries.move_to_end(key)
+		if len(self.entries) > self.maxSize:
+			self.entries.popitem(last=False)
+
+	# Labels of the (source, sink) pairs for a model, None for the pairs not cached
+	def getMany(self, fingerprint, pairKeys):
+		labels = [None] * len(pairKeys)
+		missing = []
+		for i, (source, sink) in enumerate(pairKeys):
+			label = self.entries.get((fingerprint, source, sink))
+			if label is None:
+				missing.append(i)
+			else:
+				self.entries.move_to_end((fingerprint, source, sink))
+				labels[i] = label
+		self.numHits += len(pairKeys) - len(missing)
+
+		if self.redisClient is not None and len(missing) > 0:
+			fields = [pairKeys[i][0] + "\t" + pairKeys[i][1] for i in missing]
+			values = self.redisClient.downloadBytesMany(self.getRedisKey(fingerprint), fields)
+			stillMissing = []
+			for i, value in zip(missing, values):
+				if value is None:
+					stillMissing.append(i)
+				else:
+					labels[i] = int(value)
+					self.remember((fingerprint,) + tuple(pairKeys[i]), labels[i])
+			self.numRedisHits += len(missing) - len(stillMissing)
+			missing = stillMissing
+
+		self.numMisses += len(missing)
+		return labels
+
+	# Store the labels of (source, sink) pairs predicted by a model
+	def putMany(self, fingerprint, pairKeys, labels):
+		labels = [int(label) for label in labels]
+		for (source, sink), label in zip(pairKeys, labels):
+			self.remember((fingerprint, source, sink), label)
+		if self.redisClient is not None and len(labels) > 0:
+			pipe = self.redisClient.client.pipeline(transaction=False)
+			pipe.hset(self.getRedisKey(fingerprint), mapping={source + "\t" + sink: label for (source, sink), label in zip(pairKeys, labels)})
+			if self.ttl is not None:
+				pipe.expire(self.getRedisKey(fingerprint), self.ttl)
+			pipe.execute()
+
+	# Drop the labels of a model that was replaced
+	def forget(self, fingerprint):
+		for key in [key for key in self.entries if key[0] == fingerprint]:
+			del self.entries[key]
+		if self.redisClient is not None:
+			self.redisClient.client.delete(self.getRedisKey(fingerprint))
+
+
 # Class to manage the Testing Phase
 class TestingManager:
 
@@ -15,12 +126,25 @@ class TestingManager:
 
 	# To store the pre-trained model
 	model = None
+	# Fingerprint and (mtime, size) of the model file, to reload it when it changes
+	modelFingerprint = None
+	modelStat        = None
+
+	# Optional memoization of the labels of the pairs (PredictionCache)
+	predictionCache = None
+
+	# Optional ModelRegistry the model is taken from (shared, memory-mapped models)
+	modelRegistry = None
 
 	# To store the results
 	results = None
+	# Append-only writer of the results (None for the legacy single JSON file)
+	resultsWriter = None
 
 	# Initializer
-	def __init__(self, modelPath, resultsPath, embeddingModel):
+	# predictionCache: optional PredictionCache (it can be shared by the managers of all the categories)
+	# modelRegistry  : optional ModelRegistry (it can be shared by the managers of all the categories)
+	def __init__(self, modelPath, resultsPath, embeddingModel, predictionCache = None, modelRegistry = None):
 
 		# Check if the Embedding Model is one of the supported types
 		if embeddingModel not in ["gpt", "codebert", "sfr"]:
@@ -29,6 +153,8 @@ class TestingManager:
 		self.modelPath 	     = modelPath
 		self.resultsPath     = resultsPath
 		self.embeddingModel  = embeddingModel
+		self.predictionCache = predictionCache
+		self.modelRegistry   = modelRegistry
 
 		# Empty Result
 		self.results         = AnomalyDetectionResults(None, None)
@@ -39,6 +165,10 @@ class TestingManager:
 			os.makedirs(resultsDir)
 			print(f"\n--- 📁 Created directory for resultsPath: {resultsDir}")
 
+		# *.jsonl / *.parquet: append-only writer, *.json: legacy file rewritten for every app
+		if not self.resultsPath.endswith(".json"):
+			self.resultsWriter = Results.ResultsWriter(self.resultsPath)
+
 		# Load the model
 		self.loadModel()
 
@@ -55,54 +185,181 @@ class TestingManager:
 		print("--- ⚙️ Loading Model\n--- ⚙️ Rel: {}\n--- ⚙️ Abs: {}".format(self.modelPath, absolutModelPath))
 		
 		if self.modelPath.endswith('.joblib'):
-			if os.path.isfile(absolutModelPath):
+			if os.path.isfile(absolutModelPath) and self.modelRegistry is not None:
+				entry = self.modelRegistry.load(absolutModelPath)
+				self.model            = entry.model
+				self.modelStat        = entry.stat
+				self.modelFingerprint = entry.fingerprint
+				print("--- ✅ Model taken from the registry.")
+			elif os.path.isfile(absolutModelPath):
 				self.model = joblib.load(absolutModelPath)
+				self.modelStat        = getModelStat(absolutModelPath)
+				self.modelFingerprint = getModelFingerprint(absolutModelPath)
 				print("--- ✅ Model loaded successfully.")
 			else:
 				print(f"--- ⚠️ Error: Model file does not exist at {absolutModelPath}")
 				raise Exception("Missing Model")
+			# The reduction stage (if any) is the first step of the Pipeline and is applied by predict()
+			if "reducer" in getattr(self.model, "named_steps", {}):
+				print("--- 📉 Reduction stage: {}".format(self.model.named_steps["reducer"]))
 		else:
 			print("--- ⚠️ Error: No Model")
 			raise Exception("Missing Model")
 
+	# Reload the model if its file changed (e.g. retrained)
+	def reloadModelIfChanged(self):
+		if os.path.isfile(self.modelPath) and getModelStat(self.modelPath) != self.modelStat:
+			print("--- 🔄 Model file changed: reloading")
+			oldFingerprint = self.modelFingerprint
+			self.loadModel()
+			if self.predictionCache is not None and oldFingerprint is not None and oldFingerprint != self.modelFingerprint:
+				self.predictionCache.forget(oldFingerprint)
+
+	# Labels of the pairs of an app found in the prediction cache, and the embeddings of the pairs still to predict.
+	# Those embeddings are taken from app.embeddings if already downloaded. Otherwise only the methods of those
+	# pairs are downloaded with redisClient.
+	# Returns (pairKeys, labels, missing, X): labels has None for the pairs to predict, missing maps each (source, sink)
+	# to predict to its first row, X is their (len(missing), dim) matrix (None if not available).
+	def prepareWithCache(self, app, redisClient = None):
+		pairKeys = app.dataFlows.getPairsKeys()
+		labels   = self.predictionCache.getMany(self.modelFingerprint, pairKeys)
+
+		# First occurrence of each pair not cached
+		missing = {}
+		for i, label in enumerate(labels):
+			if label is None:
+				missing.setdefault(pairKeys[i], i)
+		rows = list(missing.values())
+		if len(rows) == 0:
+			return pairKeys, labels, missing, None
+
+		X = app.embeddings[self.embeddingModel]
+		if X is not None and len(X) == len(pairKeys):
+			X = X[rows]
+		elif redisClient is not None:
+			methods, sourceIdx, sinkIdx = app.dataFlows.getPairsIndex(np.asarray(rows))
+			methodEmbeddings = redisClient.downloadEmbeddingsMany(redisClient.projectKey + "." + self.embeddingModel, methods)
+			if any(embedding is None for embedding in methodEmbeddings):
+				print("--- ⚠️ Error: Embeddings not present on Redis Server.")
+				return pairKeys, labels, missing, None
+			X = gatherPairsEmbeddings(methodEmbeddings, sourceIdx, sinkIdx)
+		else:
+			print("--- ⚠️ Error: No Embeddings.")
+			return pairKeys, labels, missing, None
+
+		print("--- 🧪 Embedding Shape : {} (cached pairs: {})".format(X.shape, sum(1 for label in labels if label is not None)))
+		return pairKeys, labels, missing, X
+
+	# Store the labels predicted for the missing pairs of an app and return all its labels
+	# (the rows of the same pair share the label predicted for its first row)
+	def completeWithCache(self, pairKeys, labels, missing, predicted):
+		if len(missing) > 0:
+			self.predictionCache.putMany(self.modelFingerprint, list(missing), predicted)
+			predicted = dict(zip(missing, np.asarray(predicted).tolist()))
+			labels = [predicted[pairKeys[i]] if label is None else label for i, label in enumerate(labels)]
+		return np.asarray(labels, dtype=np.int64)
+
+	# Labels of the pairs of an app through the prediction cache (None on error)
+	def predictWithCache(self, app, redisClient = None):
+		pairKeys, labels, missing, X = self.prepareWithCache(app, redisClient)
+		if len(missing) > 0 and X is None:
+			return None
+		return self.completeWithCache(pairKeys, labels, missing, self.model.predict(X) if len(missing) > 0 else [])
+
+	# Predict the labels of X, in chunks of chunkSize rows predicted by nJobs threads
+	def predict(self, X, nJobs = 1, chunkSize = 4096):
+		if nJobs == 1 or len(X) <= chunkSize:
+			return self.model.predict(X)
+		chunks = joblib.Parallel(n_jobs=nJobs, prefer="threads")(
+			joblib.delayed(self.model.predict)(X[start:start + chunkSize]) for start in range(0, len(X), chunkSize))
+		return np.concatenate(chunks)
+
+	# Results of an app from the labels of its pairs
+	def buildResults(self, app, Y):
+		# Get Outliers (but Add full Paths)
+		rows = np.flatnonzero(np.asarray(Y) == OUTLIER_LABEL)
+		return AnomalyDetectionResults(len(Y), app.dataFlows.subset(rows))
+
 	# Get the results of one app.
-	def testingAnomalyDetectionModel(self, app):
+	# redisClient: embeddings client, used with the prediction cache to download only the embeddings of the pairs not cached
+	def testingAnomalyDetectionModel(self, app, redisClient = None):
 		
 		print("--- 🧪 Testing")
+		self.reloadModelIfChanged()
 
-		# Get Feature Vectors
-		X = app.embeddings[self.embeddingModel]
+		if self.predictionCache is not None and app.dataFlows is not None:
+			try:
+				Y = self.predictWithCache(app, redisClient)
+			except Exception as e:
+				print("--- ⚠️ Error: Failed to predict labels:", e)
+				return
+			if Y is None:
+				return
+		else:
+			# Get Feature Vectors
+			X = app.embeddings[self.embeddingModel]
 
-		if X is None or (len(X) == 0):
-			print("--- ⚠️ Error: No Embeddings.")
-			return
+			if X is None or (len(X) == 0):
+				print("--- ⚠️ Error: No Embeddings.")
+				return
 
-		print("--- 🧪 Embedding Shape : {}".format(X.shape))
+			print("--- 🧪 Embedding Shape : {}".format(X.shape))
 
-		# Predict using the loaded model
-		try:
-			Y = self.model.predict(X)
-		except Exception as e:
-			print("--- ⚠️ Error: Failed to predict labels:", e)
-			return
-		
-		# Get Outliers (but Add full Paths)
-		outliersSources = []
-		outliersSinks = []
-		outliersPairs = []
-
-		for i, value in enumerate(Y):
-			if value == 1:
-				currentPair = app.dataFlows.pairs[i]
-				outliersSources.append(currentPair["source"])
-				outliersSinks.append(currentPair["sink"])
-				outliersPairs.append(currentPair)
+			# Predict using the loaded model
+			try:
+				Y = self.model.predict(X)
+			except Exception as e:
+				print("--- ⚠️ Error: Failed to predict labels:", e)
+				return
 		
 		# Store results in the App Object
-		self.results = AnomalyDetectionResults(len(X), DataFlows(outliersSources, outliersSinks, outliersPairs))   
+		self.results = self.buildResults(app, Y)
+
+	# Get the results of many apps of the category with a single (chunked) predict on all their pairs.
+	# Returns a list of AnomalyDetectionResults aligned with apps (empty results for the apps that cannot be tested).
+	# nJobs, chunkSize: see predict()
+	def testingAnomalyDetectionModelBatch(self, apps, redisClient = None, nJobs = 1, chunkSize = 4096):
+
+		print("--- 🧪 Testing {} apps".format(len(apps)))
+		self.reloadModelIfChanged()
+
+		# Rows to predict of each app: (app position, (pairKeys, labels, missing) of the cache, number of rows)
+		pending  = []
+		matrices = []
+		for i, app in enumerate(apps):
+			if app.dataFlows is None:
+				continue
+			if self.predictionCache is not None:
+				pairKeys, labels, missing, X = self.prepareWithCache(app, redisClient)
+				if len(missing) > 0 and X is None:
+					continue
+				cached = (pairKeys, labels, missing)
+			else:
+				cached, X = None, app.embeddings[self.embeddingModel]
+				if X is None or len(X) == 0:
+					print("--- ⚠️ Error: No Embeddings for APK: {}".format(app.sha256))
+					continue
+			pending.append((i, cached, 0 if X is None else len(X)))
+			if X is not None:
+				matrices.append(X)
+
+		# One predict on the pairs of all the apps
+		offsets = np.cumsum([0] + [numRows for _, _, numRows in pending])
+		Y = self.predict(np.concatenate(matrices), nJobs, chunkSize) if offsets[-1] > 0 else np.array([], dtype=np.int64)
+		print("--- 🧪 Predicted {} pairs of {} apps".format(offsets[-1], len(pending)))
+
+		# Scatter the labels back to the apps
+		results = [AnomalyDetectionResults(None, None) for _ in apps]
+		for (i, cached, numRows), start in zip(pending, offsets[:-1]):
+			appY = Y[start:start + numRows]
+			if cached is not None:
+				appY = self.completeWithCache(*cached, appY)
+			results[i] = self.buildResults(apps[i], appY)
+		return results
 
 	
-	def saveResults(self, app):
+	# results: results of the app (default: the last results of testingAnomalyDetectionModel)
+	def saveResults(self, app, results = None):
 
 		# Data to be saved
 		resultsDict = {
@@ -112,7 +369,11 @@ class TestingManager:
 		}
 
 		# Attach Anomaly Results
-		resultsDict.update(self.results.toDict())
+		resultsDict.update((self.results if results is None else results).toDict())
+
+		if self.resultsWriter is not None:
+			self.resultsWriter.write(resultsDict)
+			return
 		
 		# Read existing file contents if it exists
 		if os.path.exists(self.resultsPath):
@@ -131,6 +392,11 @@ class TestingManager:
 		with open(self.resultsPath, 'w') as file:
 			json.dump(existingData, file, indent=4)
 
+	# Write the buffered results
+	def close(self):
+		if self.resultsWriter is not None:
+			self.resultsWriter.close()
+
 # Class to manage the results of the Anomaly Detection Phase
 class AnomalyDetectionResults:
 
@@ -1,13 +1,73 @@
-from   sklearn.model_selection import train_test_split
-from   sklearn.svm             import OneClassSVM
-from   sklearn.preprocessing   import StandardScaler
-from   sklearn.ensemble 	   import IsolationForest
 import numpy                as np
 import joblib
-import torch # type: ignore
-import random 
 import time
 import os
+# Own Imports
+import Detectors
+
+# Growable 2D buffer of embeddings with amortized O(1) appends.
+# Rows live in a preallocated array (or a disk-backed np.memmap when memmapPath is set) whose
+# capacity doubles when full; the loaded rows are always exposed as one contiguous array.
+class EmbeddingBuffer:
+
+	dtype       = None
+	memmapPath  = None
+	initialRows = None
+
+	# Storage and number of rows in use
+	data    = None
+	numRows = None
+
+	def __init__(self, dtype = np.float32, memmapPath = None, initialRows = 1024):
+		self.dtype       = np.dtype(dtype)
+		self.memmapPath  = memmapPath
+		self.initialRows = initialRows
+		self.data        = None
+		self.numRows     = 0
+
+	@property
+	def dim(self):
+		return None if self.data is None else self.data.shape[1]
+
+	@property
+	def shape(self):
+		return (self.numRows, self.dim) if self.data is not None else (0,)
+
+	# Allocate storage for capacity rows, keeping the rows already loaded
+	def allocate(self, capacity, dim):
+		if self.memmapPath is None:
+			data = np.empty((capacity, dim), dtype=self.dtype)
+			if self.data is not None:
+				data[:self.numRows] = self.data[:self.numRows]
+			self.data = data
+		else:
+			# Rows are stored row-major from the start of the file: growing the file keeps them in place
+			if self.data is not None:
+				self.data.flush()
+				self.data = None
+			mode = 'r+' if self.numRows > 0 else 'w+'
+			if mode == 'r+':
+				os.truncate(self.memmapPath, capacity * dim * self.dtype.itemsize)
+			self.data = np.memmap(self.memmapPath, dtype=self.dtype, mode=mode, shape=(capacity, dim))
+
+	# Append the rows of a (n, dim) matrix
+	def append(self, rows):
+		rows = np.asarray(rows)
+		if self.data is None:
+			self.allocate(max(self.initialRows, rows.shape[0]), rows.shape[1])
+		needed = self.numRows + rows.shape[0]
+		if needed > self.data.shape[0]:
+			self.allocate(max(needed, 2 * self.data.shape[0]), self.dim)
+		self.data[self.numRows:needed] = rows
+		self.numRows = needed
+
+	# The loaded rows as one contiguous (numRows, dim) array (a view, no copy)
+	@property
+	def array(self):
+		if self.data is None:
+			return np.array([], dtype=self.dtype)
+		return self.data[:self.numRows]
+
 
 # Class to manage the training phase
 class TrainingManager:
@@ -18,14 +78,23 @@ class TrainingManager:
 	# Keep track of the number of apps loaded
 	numApps = None
 
-	# Numerical Embeddings to train the model.
-	embeddings = None
+	# Buffer of the Numerical Embeddings to train the model.
+	buffer = None
+
+	# Deduplication: one row per (source, sink) signature, counted in weights
+	deduplicate = None
+	pairsIndex  = None
+	weights     = None
+	numPairs    = None
 
 	# To store the results of the training.
 	trainingResults = None
 
 	# Initializer
-	def __init__(self, embeddingModel):
+	# dtype      : dtype of the training matrix
+	# memmapPath : file backing the training matrix, for categories that do not fit in RAM
+	# deduplicate: keep one row per (source, sink) pair and train with its number of copies as sample_weight
+	def __init__(self, embeddingModel, dtype = np.float32, memmapPath = None, deduplicate = False):
 
 		# Check if the Embedding Model is one of the supported types
 		if embeddingModel not in ["gpt", "codebert", "sfr"]:
@@ -33,9 +102,23 @@ class TrainingManager:
 			return
 		self.embeddingModel  = embeddingModel
 		self.numApps = 0
-		self.embeddings      = np.array([])
+		self.buffer          = EmbeddingBuffer(dtype, memmapPath)
+		self.deduplicate     = deduplicate
+		self.pairsIndex      = {}
+		self.weights         = []
+		self.numPairs        = 0
 		self.trainingResults = None
 
+	# Numerical Embeddings to train the model.
+	@property
+	def embeddings(self):
+		return self.buffer.array
+
+	# Number of pairs loaded per row of the training matrix
+	@property
+	def dedupRatio(self):
+		return self.numPairs / self.buffer.numRows if self.buffer.numRows else 1.0
+
 	# Info about the Training
 	def __str__(self):
 		result = (
@@ -45,28 +128,53 @@ class TrainingManager:
 			"--- 📐 Feature Vectors Shape [Num Data Flow Pairs, Length of Feature Vectors]\n"
 			"--- 📐 Shape : {}\n".format(self.embeddings.shape)
 		)
+		if self.deduplicate:
+			result += "--- ♻️ Pairs loaded : {} --> Unique: {} (ratio {:.2f}x)\n".format(self.numPairs, self.buffer.numRows, self.dedupRatio)
 		return result
 
-	def loadEmbeddingsFromApp(self, appEmbeddings):
+	# pairKeys: (source, sink) signature of each row (e.g. DataFlows.getPairsKeys()), used to deduplicate
+	def loadEmbeddingsFromApp(self, appEmbeddings, pairKeys = None):
 		if appEmbeddings is None:
 			print("--- ❌ Error: appEmbeddings is None. Cannot load embeddings ")
 			return  
 
-		if self.numApps == 0:
-			self.embeddings = appEmbeddings
-		else:
-			if appEmbeddings.shape[1] != self.embeddings.shape[1]:
+		if appEmbeddings.ndim == 2 and appEmbeddings.shape[0] > 0:
+			if self.buffer.dim is not None and appEmbeddings.shape[1] != self.buffer.dim:
 				print("--- ❌ Dimensions mismatch: Cannot stack embeddings. Check failed.")
 				return  
-			self.embeddings = np.vstack((self.embeddings, appEmbeddings))
+			self.numPairs += appEmbeddings.shape[0]
+
+			if self.deduplicate and pairKeys is not None:
+				# Keep the first copy of each pair, count the others
+				newRows = []
+				for i, key in enumerate(pairKeys):
+					row = self.pairsIndex.get(key)
+					if row is None:
+						self.pairsIndex[key] = len(self.weights)
+						self.weights.append(1)
+						newRows.append(i)
+					else:
+						self.weights[row] += 1
+				if len(newRows) > 0:
+					self.buffer.append(appEmbeddings[newRows])
+			else:
+				self.weights.extend([1] * appEmbeddings.shape[0])
+				self.buffer.append(appEmbeddings)
 
 		self.numApps += 1
 
 		print("--- ✅ Training Data Loaded", flush=True)
 
 	# Train a new Anomaly Detection Model
-	def trainAnomalyDetectionModel(self, modelPath):
+	# detector       : name of the detector in Detectors.DETECTORS
+	# detectorParams : parameters overriding the defaults of the detector
+	# reducer        : name of the reduction stage in Detectors.REDUCERS (None: no reduction)
+	# reducerParams  : parameters overriding the defaults of the reducer, e.g. {"n_components": 256}
+	def trainAnomalyDetectionModel(self, modelPath, detector = "ocsvm", detectorParams = None, reducer = None, reducerParams = None):
 		print("--- 🦾 TRAINING 🦾 ---")
+		print("--- 📦 Detector    :", detector)
+		if reducer is not None:
+			print("--- 📉 Reducer     :", reducer)
 
 	 	# Select the correct Feature Vectors
 		X = self.embeddings
@@ -80,13 +188,13 @@ class TrainingManager:
 		startTime = time.time()
 		print("--- ⏳ Start at    :", time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(startTime)))
 
-		# Create the One-Class SVM model with mid-way parameters
-		model = OneClassSVM(kernel='rbf',
-									gamma=0.001,
-									cache_size=500,
-									tol=0.001,          
-									nu=0.005,
-									).fit(X)
+		# Create the detector (default: One-Class SVM with mid-way parameters), with the optional reduction stage
+		model = Detectors.createModel(detector, detectorParams, reducer, reducerParams)
+		if self.deduplicate:
+			print("--- ♻️ Deduplication: {} pairs --> {} rows (ratio {:.2f}x)".format(self.numPairs, len(X), self.dedupRatio))
+			Detectors.fitModel(model, X, np.asarray(self.weights, dtype=np.float64))
+		else:
+			model.fit(X)
 
 
 		# Count Outliers
@@ -0,0 +1,353 @@
+# Imports
+from   concurrent.futures import ProcessPoolExecutor, as_completed
+from   dotenv      import load_dotenv
+import numpy       as np
+import multiprocessing
+import argparse
+import json
+import time
+import os
+# Optional: per-process memory limits (POSIX only)
+try:
+	import resource
+except ImportError:
+	resource = None
+# Own Imports
+from   App         import DataFlows, gatherPairsEmbeddings
+from   EmbeddingCache import EmbeddingCache
+from   RedisClient import RedisClient
+from   Training    import TrainingManager
+
+# Parallel per-category training.
+# The parent plans once. It reads the Data Flows of every app and interns the methods of all categories
+# into one table. Then it downloads each method embedding once into a read-only store on disk.
+# Categories are trained in a process pool, largest first. Every worker memory-maps the store, so its pages
+# are shared through the OS page cache, and gathers the pairs of its category from it without using Redis.
+
+
+# Read-only matrix of the embeddings of the methods of a training plan, one row per method.
+# Stored as .npy files in path:
+#   <model>.embeddings.npy : (numMethods, dim) float32
+#   <model>.present.npy    : (numMethods,) bool, False when the embedding is missing on Redis
+#   <model>.methods.json   : method of each row
+class EmbeddingStore:
+
+	path           = None
+	embeddingModel = None
+
+	# Memory-mapped arrays
+	matrix  = None
+	present = None
+
+	def __init__(self, path, embeddingModel):
+		self.path           = path
+		self.embeddingModel = embeddingModel
+		self.matrix  = np.load(self.getPath(path, embeddingModel, "embeddings.npy"), mmap_mode="r")
+		self.present = np.load(self.getPath(path, embeddingModel, "present.npy"), mmap_mode="r")
+
+	@staticmethod
+	def getPath(path, embeddingModel, name):
+		return os.path.join(path, "{}.{}".format(embeddingModel, name))
+
+	@property
+	def nbytes(self):
+		return self.matrix.nbytes + self.present.nbytes
+
+	# Download the embeddings of methods (each once) from the hash <projectKey>.<model> into a new store
+	@classmethod
+	def build(cls, path, redisClient, embeddingModel, methods, batchSize = 1000):
+		os.makedirs(path, exist_ok=True)
+		redisKey    = redisClient.projectKey + "." + embeddingModel
+		matrixPath  = cls.getPath(path, embeddingModel, "embeddings.npy")
+		tmpPath     = matrixPath + ".part"
+		matrix      = None
+		present     = np.zeros(len(methods), dtype=bool)
+
+		for start in range(0, len(methods), batchSize):
+			embeddings = redisClient.downloadEmbeddingsMany(redisKey, methods[start:start + batchSize], batchSize)
+			for i, embedding in enumerate(embeddings):
+				if embedding is None:
+					continue
+				# The dimension is known with the first embedding
+				if matrix is None:
+					matrix = np.lib.format.open_memmap(tmpPath, mode="w+", dtype=np.float32, shape=(len(methods), len(embedding)))
+				matrix[start + i] = embedding
+				present[start + i] = True
+
+		if matrix is None:
+			with open(tmpPath, "wb") as file:
+				np.save(file, np.zeros((len(methods), 0), dtype=np.float32))
+		else:
+			matrix.flush()
+			del matrix
+		os.replace(tmpPath, matrixPath)
+		np.save(cls.getPath(path, embeddingModel, "present.npy"), present)
+		with open(cls.getPath(path, embeddingModel, "methods.json"), "w") as file:
+			json.dump(methods, file)
+
+		print("--- ✅ Embedding Store: {} methods ({} missing on Redis)".format(len(methods), len(methods) - int(np.count_nonzero(present))))
+		return cls(path, embeddingModel)
+
+
+# Path of the pairs of a category in the store folder
+def getCategoryPairsPath(storePath, categoryID):
+	return os.path.join(storePath, "{}.pairs.npz".format(categoryID))
+
+# Limit the private memory of the current process (the read-only memory-mapped store is not counted)
+def limitMemory(maxBytes):
+	if resource is None or maxBytes is None:
+		return
+	resource.setrlimit(resource.RLIMIT_DATA, (maxBytes, maxBytes))
+
+
+# Train the model of one category in a worker process. Returns its summary.
+# The apps with a missing method embedding are skipped, as in App.downloadPairsEmbeddingsFromRedis.
+# With deduplicate, the pairs are keyed by the rows of their source and sink in the store.
+def trainCategory(storePath, embeddingModel, categoryID, modelPath, detector = "ocsvm", detectorParams = None,
+				  reducer = None, reducerParams = None, deduplicate = True):
+	summary = {"categoryID": categoryID, "modelPath": modelPath, "pid": os.getpid(), "error": None}
+	startTime = time.time()
+	try:
+		store = EmbeddingStore(storePath, embeddingModel)
+		with np.load(getCategoryPairsPath(storePath, categoryID)) as pairs:
+			sourceIdx, sinkIdx, appOffsets = pairs["sourceIdx"], pairs["sinkIdx"], pairs["appOffsets"]
+
+		# (source, sink) key of each pair
+		pairKeys = (sourceIdx.astype(np.int64) << 32) | sinkIdx.astype(np.int64)
+
+		trainingManager = TrainingManager(embeddingModel, deduplicate = deduplicate)
+		if len(sourceIdx) > 0:
+			numRows = len(np.unique(pairKeys)) if deduplicate else len(sourceIdx)
+			trainingManager.buffer.allocate(numRows, 2 * store.matrix.shape[1])
+
+		numSkipped = 0
+		for start, end in zip(appOffsets[:-1], appOffsets[1:]):
+			appSourceIdx, appSinkIdx = sourceIdx[start:end], sinkIdx[start:end]
+			if not (store.present[appSourceIdx].all() and store.present[appSinkIdx].all()):
+				numSkipped += 1
+				continue
+			trainingManager.loadEmbeddingsFromApp(gatherPairsEmbeddings(store.matrix, appSourceIdx, appSinkIdx), pairKeys[start:end].tolist())
+
+		summary["numApps"]        = trainingManager.numApps
+		summary["numAppsSkipped"] = numSkipped
+		summary["numPairs"]       = trainingManager.numPairs
+		summary["numRows"]        = len(trainingManager.embeddings)
+		summary["dedupRatio"]     = trainingManager.dedupRatio
+		summary["loadTime"]       = time.time() - startTime
+
+		fitStart = time.time()
+		trainingManager.trainAnomalyDetectionModel(modelPath, detector, detectorParams, reducer, reducerParams)
+		summary["fitTime"]     = time.time() - fitStart
+		summary["numOutliers"] = int(trainingManager.trainingResults.numOutliers)
+	except Exception as e:
+		summary["error"] = "{}: {}".format(type(e).__name__, e)
+
+	summary["totalTime"] = time.time() - startTime
+	return summary
+
+
+# Driver of the training of all the categories of a dataset.
+class TrainingDriver:
+
+	redisClientExtraction = None
+	redisClientEmbedding  = None
+	embeddingModel        = None
+
+	# Outputs: MODELS/<category>/<model>.joblib and MODELS/<model>.summary.json
+	modelsPath = None
+	# Folder of the embedding store and of the pairs of each category
+	storePath  = None
+
+	# Pool
+	maxWorkers = None
+	memoryGB   = None
+
+	# Detector (see Detectors.DETECTORS)
+	detector       = None
+	detectorParams = None
+
+	# Optional reduction stage (see Detectors.REDUCERS)
+	reducer       = None
+	reducerParams = None
+
+	# One row per (source, sink) pair of a category, weighted by its number of copies
+	deduplicate = None
+
+	# Start method of the pool processes (None: platform default, "spawn" when the caller runs other threads)
+	mpContext = None
+
+	# {categoryID: number of pairs}, filled by plan()
+	categories = None
+
+	def __init__(self, redisClientExtraction, redisClientEmbedding, embeddingModel, modelsPath, storePath,
+				 maxWorkers = None, memoryGB = None, detector = "ocsvm", detectorParams = None,
+				 reducer = None, reducerParams = None, deduplicate = True, mpContext = None):
+		self.redisClientExtraction = redisClientExtraction
+		self.redisClientEmbedding  = redisClientEmbedding
+		self.embeddingModel        = embeddingModel
+		self.modelsPath            = modelsPath
+		self.storePath             = storePath
+		self.maxWorkers            = maxWorkers or os.cpu_count() or 1
+		self.memoryGB              = memoryGB
+		self.detector              = detector
+		self.detectorParams        = detectorParams
+		self.reducer               = reducer
+		self.reducerParams         = reducerParams
+		self.deduplicate           = deduplicate
+		self.mpContext             = mpContext
+		self.categories            = {}
+
+	def __str__(self):
+		output = "\n--- ⭐ Training Driver ⭐---\n"
+		output += "--- ⚙️ Embedding Model  : {}\n".format(self.embeddingModel)
+		output += "--- 📦 Detector         : {}\n".format(self.detector)
+		output += "--- 📉 Reducer          : {}\n".format(self.reducer)
+		output += "--- ♻️ Deduplication    : {}\n".format(self.deduplicate)
+		output += "--- #️⃣ Workers          : {}\n".format(self.maxWorkers)
+		output += "--- 💾 Memory per worker: {}\n".format("{} GB".format(self.memoryGB) if self.memoryGB else "unlimited")
+		return output
+
+	def getModelPath(self, categoryID):
+		return os.path.join(self.modelsPath, "{}/{}.joblib".format(categoryID, self.embeddingModel))
+
+	# Read the Data Flows of every app, intern all methods in one table and save the pairs of each category.
+	# Returns the methods table.
+	def plan(self, appsDF, batchSize = 100):
+		os.makedirs(self.storePath, exist_ok=True)
+		methodsIndex = {}
+		methods      = []
+
+		def intern(method):
+			index = methodsIndex.get(method)
+			if index is None:
+				index = methodsIndex[method] = len(methods)
+				methods.append(method)
+			return index
+
+		for categoryID, categoryDF in appsDF.groupby("classID"):
+			sha256s    = categoryDF["sha256"].tolist()
+			sourceIdx  = []
+			sinkIdx    = []
+			appOffsets = [0]
+			for start in range(0, len(sha256s), batchSize):
+				results = self.redisClientExtraction.downloadBytesMany(self.redisClientExtraction.resultsKey, sha256s[start:start + batchSize])
+				for result in results:
+					if result is None:
+						continue
+					appMethods, appSourceIdx, appSinkIdx = DataFlows.fromJson(result).getPairsIndex()
+					globalIdx = np.fromiter((intern(method) for method in appMethods), dtype=np.int32, count=len(appMethods))
+					sourceIdx.append(globalIdx[appSourceIdx])
+					sinkIdx.append(globalIdx[appSinkIdx])
+					appOffsets.append(appOffsets[-1] + len(appSourceIdx))
+
+			np.savez(getCategoryPairsPath(self.storePath, categoryID),
+					 sourceIdx  = np.concatenate(sourceIdx) if sourceIdx else np.array([], dtype=np.int32),
+					 sinkIdx    = np.concatenate(sinkIdx) if sinkIdx else np.array([], dtype=np.int32),
+					 appOffsets = np.array(appOffsets, dtype=np.int64))
+			self.categories[categoryID] = appOffsets[-1]
+			print("--- 🏷️ Category {}: {} apps, {} pairs".format(categoryID, len(appOffsets) - 1, appOffsets[-1]), flush=True)
+
+		print("--- ✅ Planned {} categories, {} distinct methods".format(len(self.categories), len(methods)), flush=True)
+		return methods
+
+	# Plan, build the store and train every category in the pool, largest first.
+	# Returns the summary, also saved in MODELS/<model>.summary.json
+	def run(self, appsDF):
+		print(self)
+		startTime = time.time()
+
+		methods = self.plan(appsDF)
+		planTime = time.time() - startTime
+
+		store = EmbeddingStore.build(self.storePath, self.redisClientEmbedding, self.embeddingModel, methods)
+		storeTime = time.time() - startTime - planTime
+
+		# Private memory cap of each worker
+		maxBytes = int(self.memoryGB * 1024 ** 3) if self.memoryGB else None
+
+		ordered = sorted(self.categories, key=lambda categoryID: self.categories[categoryID], reverse=True)
+		summaries = []
+		mpContext = multiprocessing.get_context(self.mpContext) if self.mpContext is not None else None
+		with ProcessPoolExecutor(max_workers=self.maxWorkers, mp_context=mpContext, initializer=limitMemory, initargs=(maxBytes,)) as executor:
+			futures = [executor.submit(trainCategory, self.storePath, self.embeddingModel, categoryID,
+									   self.getModelPath(categoryID), self.detector, self.detectorParams,
+									   self.reducer, self.reducerParams, self.deduplicate)
+					   for categoryID in ordered]
+			for future in as_completed(futures):
+				summary = future.result()
+				summaries.append(summary)
+				if summary["error"] is None:
+					print("--- ✅ Category {}: {} pairs ({} rows, dedup {:.2f}x) in {:.2f} s (fit {:.2f} s)".format(
+						summary["categoryID"], summary["numPairs"], summary["numRows"], summary["dedupRatio"],
+						summary["totalTime"], summary["fitTime"]), flush=True)
+				else:
+					print("--- ❌ Category {}: {}".format(summary["categoryID"], summary["error"]), flush=True)
+
+		summaries.sort(key=lambda summary: ordered.index(summary["categoryID"]))
+		results = {
+			"embeddingModel"  : self.embeddingModel,
+			"detector"        : self.detector,
+			"reducer"         : self.reducer,
+			"deduplicate"     : self.deduplicate,
+			"workers"         : self.maxWorkers,
+			"memoryGB"        : self.memoryGB,
+			"numMethods"      : len(methods),
+			"storeBytes"      : store.nbytes,
+			"planTime"        : planTime,
+			"storeTime"       : storeTime,
+			"wallTime"        : time.time() - startTime,
+			"sumCategoryTime" : sum(summary["totalTime"] for summary in summaries),
+			"categories"      : summaries,
+		}
+
+		os.makedirs(self.modelsPath, exist_ok=True)
+		summaryPath = os.path.join(self.modelsPath, "{}.summary.json".format(self.embeddingModel))
+		with open(summaryPath, "w") as file:
+			json.dump(results, file, indent=4, default=str)
+
+		print("\n--- ⏱️ Wall time        : {:.2f} s".format(results["wallTime"]))
+		print("--- ⏱️ Sum of categories: {:.2f} s".format(results["sumCategoryTime"]))
+		print("--- 💾 Summary saved    :", summaryPath)
+		return results
+
+
+# Command line entry point
+if __name__ == "__main__":
+	import pandas as pd
+
+	parser = argparse.ArgumentParser(description="DamFlow parallel per-category training")
+	parser.add_argument("--input", default="../../0_Data/2_AndroCatSet_TrainingSet.csv")
+	parser.add_argument("--project-key", required=True, help="Extraction results, e.g. test.androcatset.backward.nosources")
+	parser.add_argument("--embeddings-key", default="test.embeddings", help="Prefix of the embedding hashes")
+	parser.add_argument("--embedding-model", default="gpt", choices=["gpt", "codebert", "sfr"])
+	parser.add_argument("--models-path", default="../../0_Data/MODELS/")
+	parser.add_argument("--store-path", default="../../0_Data/TMP/STORE/")
+	parser.add_argument("--workers", type=int, default=None)
+	parser.add_argument("--memory-gb", type=float, default=None, help="Max private memory of each worker")
+	parser.add_argument("--detector", default="ocsvm")
+	parser.add_argument("--detector-params", type=json.loads, default=None, help="JSON, e.g. '{\"nu\": 0.01}'")
+	parser.add_argument("--reducer", default=None, help="Optional reduction stage: pca, svd or srp")
+	parser.add_argument("--no-dedup", action="store_true", help="Train on every copy of the pairs")
+	parser.add_argument("--reducer-params", type=json.loads, default=None, help="JSON, e.g. '{\"n_components\": 256}'")
+	parser.add_argument("--cache-path", default=None, help="Folder of the on-disk embedding cache shared by the runs on the host")
+	parser.add_argument("--cache-version", default="1", help="Version of the embedding model stored in the cache")
+	args = parser.parse_args()
+
+	load_dotenv()
+	def createRedisClient(projectKey):
+		return RedisClient(host=os.getenv("REDIS_SERVER"),
+						   port=os.getenv("REDIS_PORT"),
+						   db=os.getenv("REDIS_DB"),
+						   password=os.getenv("REDIS_PSW"),
+						   projectKey=projectKey)
+
+	redisClientEmbedding = createRedisClient(args.embeddings_key)
+	# The store is built with one read per method: only the on-disk level of the cache is useful here
+	if args.cache_path is not None:
+		redisClientEmbedding.attachEmbeddingCache(EmbeddingCache(redisClientEmbedding, args.embedding_model, 0,
+																 args.cache_path, args.cache_version))
+
+	TrainingDriver(createRedisClient(args.project_key), redisClientEmbedding, args.embedding_model,
+				   args.models_path, args.store_path, maxWorkers = args.workers, memoryGB = args.memory_gb,
+				   detector = args.detector, detectorParams = args.detector_params,
+				   reducer = args.reducer, reducerParams = args.reducer_params, deduplicate = not args.no_dedup).run(pd.read_csv(args.input))
@@ -1,3 +1,5 @@
+import numpy as np
+import struct
 import shutil
 import os
 
@@ -10,4 +12,34 @@ def deleteFolder(folderPath):
     try:
         shutil.rmtree(folderPath)
     except Exception as e:
-        print("--- ⚠️ Error deleting folder '{}': {}".format(folderPath, e))
\ No newline at end of file
+        print("--- ⚠️ Error deleting folder '{}': {}".format(folderPath, e))
+
+### EMBEDDING ENCODING ###
+# Binary layout: magic (3 bytes) + version (1 byte) + dimension (uint32 LE) + raw float32 LE values.
+EMBEDDING_MAGIC   = b'DFE'
+EMBEDDING_VERSION = 1
+EMBEDDING_HEADER  = struct.Struct('<3sBI')
+
+# Encode an embedding (list or array of floats) into the binary format
+def encodeEmbedding(embedding):
+    values = np.asarray(embedding, dtype='<f4').ravel()
+    return EMBEDDING_HEADER.pack(EMBEDDING_MAGIC, EMBEDDING_VERSION, values.shape[0]) + values.tobytes()
+
+# Check if a raw Redis value uses the binary format
+def isBinaryEmbedding(value):
+    return value is not None and value[:len(EMBEDDING_MAGIC)] == EMBEDDING_MAGIC
+
+# Decode a raw Redis value (binary or legacy comma-separated text) into a float32 array.
+# Binary values are decoded without copying, so the returned array is read-only.
+def decodeEmbedding(value):
+    if value is None:
+        return None
+    if isBinaryEmbedding(value):
+        _, version, dim = EMBEDDING_HEADER.unpack_from(value)
+        if version != EMBEDDING_VERSION:
+            raise ValueError("Unsupported embedding encoding version: {}".format(version))
+        return np.frombuffer(value, dtype='<f4', count=dim, offset=EMBEDDING_HEADER.size)
+    # Legacy format: comma-joined decimal string
+    if isinstance(value, str):
+        value = value.encode('utf-8')
+    return np.array(value.split(b','), dtype=np.float32)
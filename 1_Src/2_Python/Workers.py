@@ -0,0 +1,301 @@
+# Imports
+from   dotenv      import load_dotenv
+import threading
+import argparse
+import socket
+import time
+import psutil
+import os
+# Own Imports
+from   Downloader  import ApkPrefetcher
+from   RedisClient import RedisClient
+from   App         import App, ExtractorDaemon
+
+# Parallel Data Flow extraction.
+# Every worker takes sha256s from the pop List with an atomic move to its own processing list and keeps
+# a lease alive with heartbeats. When a worker dies, its lease expires and any pool (on any host) moves
+# its processing list back to the pop List, so no sha256 is lost.
+
+
+# One extraction worker: a loop that claims, extracts and completes sha256s.
+class ExtractionWorker:
+
+	# Identity and Redis
+	workerID    = None
+	redisClient = None
+
+	# Extraction parameters (see App.extractDataFlows)
+	extractionArgs = None
+	maxHeap        = None
+
+	# Lease
+	leaseTTL = None
+
+	# Pool to ask for admission before launching a JVM (optional)
+	pool = None
+
+	# Number of APKs downloaded ahead while analyzing (0 disables the prefetcher) and their disk budget
+	prefetchDepth    = None
+	maxPrefetchBytes = None
+
+	# Warm JVM reused across APKs (None: a fresh JVM per APK)
+	extractorDaemon = None
+
+	# List where the sha256 of every processed app is pushed (e.g. the embedding stage of Pipeline), None: no list
+	notifyKey = None
+
+	# Statistics
+	numProcessed = None
+	numErrors    = None
+
+	def __init__(self, workerID, redisClient, extractionArgs, maxHeap = "24g", leaseTTL = 60, pool = None,
+				 prefetchDepth = 0, maxPrefetchBytes = 4 * 1024 ** 3, useDaemon = False, notifyKey = None):
+		self.workerID       = workerID
+		self.redisClient    = redisClient
+		self.extractionArgs = extractionArgs
+		self.maxHeap        = maxHeap
+		self.leaseTTL       = leaseTTL
+		self.pool           = pool
+		self.prefetchDepth    = prefetchDepth
+		self.maxPrefetchBytes = maxPrefetchBytes
+		self.extractorDaemon  = ExtractorDaemon(extractionArgs[1], maxHeap) if useDaemon else None
+		self.notifyKey      = notifyKey
+		self.numProcessed   = 0
+		self.numErrors      = 0
+
+	# Refresh the lease until stopEvent is set
+	def heartbeatLoop(self, stopEvent):
+		while not stopEvent.wait(self.leaseTTL / 3):
+			try:
+				self.redisClient.heartbeat(self.workerID, self.leaseTTL)
+			except Exception as e:
+				print("--- ⚠️ [{}] Heartbeat failed: {}".format(self.workerID, e), flush=True)
+
+	# Extract one sha256 and store the result (or the error) on Redis
+	def process(self, sha256):
+		print("=="*40+"\n")
+		print("🔑 [{}] Analyzing APK: {}".format(self.workerID, sha256), flush=True)
+
+		# Skip if already processed
+		if self.redisClient.client.hexists(self.redisClient.resultsKey, sha256):
+			print("\n⏭️  Already Processed --> Skip")
+			return
+
+		try:
+			app = App(sha256 = sha256)
+			app.extractDataFlows(*self.extractionArgs, maxHeap = self.maxHeap, extractorDaemon = self.extractorDaemon)
+			self.redisClient.client.hset(self.redisClient.resultsKey, sha256, app.dataFlows.toJsonString())
+			self.numProcessed += 1
+			print("\n✅ [{}] Success for APK: {}".format(self.workerID, sha256), flush=True)
+		except Exception as e:
+			self.numErrors += 1
+			print("\n❌ [{}] Failed with Exception {}".format(self.workerID, e), flush=True)
+			self.redisClient.client.lpush(self.redisClient.errorKey, sha256)
+
+	# Work until the pop List is empty
+	def run(self):
+		self.redisClient.heartbeat(self.workerID, self.leaseTTL)
+		stopEvent = threading.Event()
+		heartbeat = threading.Thread(target=self.heartbeatLoop, args=(stopEvent,), daemon=True)
+		heartbeat.start()
+
+		# Next sha256 to analyze: claimed directly or through the prefetcher
+		prefetcher = None
+		if self.prefetchDepth > 0:
+			prefetcher = ApkPrefetcher(self.redisClient, self.workerID, self.extractionArgs[0],
+									   depth = self.prefetchDepth, maxDiskBytes = self.maxPrefetchBytes).start()
+			nextWork = prefetcher.next
+		else:
+			nextWork = lambda: self.redisClient.claimWork(self.workerID)
+
+		try:
+			while True:
+				ticket = self.pool.acquire() if self.pool is not None else None
+				try:
+					sha256 = nextWork()
+					if sha256 is None:
+						break
+					try:
+						self.process(sha256)
+					finally:
+						# The APK is deleted after its analysis
+						if prefetcher is not None:
+							prefetcher.release(sha256)
+					# Hand over to the next stage (successes, skips and errors alike) before completing
+					if self.notifyKey is not None:
+						self.redisClient.client.lpush(self.notifyKey, sha256)
+					self.redisClient.completeWork(self.workerID, sha256)
+				finally:
+					if self.pool is not None:
+						self.pool.release(ticket)
+		finally:
+			# Give back what was claimed but not analyzed
+			if prefetcher is not None:
+				prefetcher.stop()
+			self.redisClient.requeueWorker(self.workerID)
+			if self.extractorDaemon is not None:
+				self.extractorDaemon.stop()
+			stopEvent.set()
+			heartbeat.join()
+			self.redisClient.unregisterWorker(self.workerID)
+
+
+# Pool of extraction workers on one host.
+# A worker may launch a JVM only when admitted: at most one JVM per coresPerWorker cores,
+# and only if the free RAM can hold another -Xmx heap.
+class WorkerPool:
+
+	redisClient    = None
+	extractionArgs = None
+
+	# Admission
+	maxWorkers     = None
+	jvmMemoryGB    = None
+	coresPerWorker = None
+	condition      = None
+	numRunning     = None
+	# Admission time of the running JVMs (ticket --> monotonic time) and seconds a JVM may take to commit its heap
+	admissions     = None
+	commitGrace    = None
+	numAdmitted    = None
+
+	# Lease and reaper
+	leaseTTL       = None
+	reaperInterval = None
+
+	# APK prefetching of each worker
+	prefetchDepth    = None
+	maxPrefetchBytes = None
+
+	# Warm JVM per worker
+	useDaemon = None
+
+	# List notified by the workers (see ExtractionWorker)
+	notifyKey = None
+
+	def __init__(self, redisClient, extractionArgs, maxWorkers = None, jvmMemoryGB = 24, coresPerWorker = 2,
+				 leaseTTL = 60, reaperInterval = 30, prefetchDepth = 0, maxPrefetchBytes = 4 * 1024 ** 3, useDaemon = False, notifyKey = None,
+				 commitGrace = 120):
+		self.redisClient    = redisClient
+		self.extractionArgs = extractionArgs
+		self.jvmMemoryGB    = jvmMemoryGB
+		self.coresPerWorker = coresPerWorker
+		self.leaseTTL       = leaseTTL
+		self.reaperInterval = reaperInterval
+		self.prefetchDepth    = prefetchDepth
+		self.maxPrefetchBytes = maxPrefetchBytes
+		self.useDaemon        = useDaemon
+		self.notifyKey        = notifyKey
+		self.condition      = threading.Condition()
+		self.numRunning     = 0
+		self.admissions     = {}
+		self.commitGrace    = commitGrace
+		self.numAdmitted    = 0
+
+		# Upper bound given by the host resources
+		maxByCores  = max(1, (os.cpu_count() or 1) // coresPerWorker)
+		maxByMemory = max(1, int(psutil.virtual_memory().total / 1024 ** 3 // jvmMemoryGB))
+		self.maxWorkers = min(maxByCores, maxByMemory) if maxWorkers is None else min(maxWorkers, maxByCores, maxByMemory)
+
+	def __str__(self):
+		output = "\n--- ⭐ Worker Pool ⭐---\n"
+		output += "--- #️⃣ Max workers      : {}\n".format(self.maxWorkers)
+		output += "--- 💾 JVM heap         : {} GB\n".format(self.jvmMemoryGB)
+		output += "--- 🧮 Cores per worker : {}\n".format(self.coresPerWorker)
+		return output
+
+	# Heap of the JVMs admitted less than commitGrace seconds ago: not yet committed, so not yet missing
+	# from the available memory, but it will be
+	def getReservedGB(self):
+		now = time.monotonic()
+		return self.jvmMemoryGB * sum(1 for admitted in self.admissions.values() if now - admitted < self.commitGrace)
+
+	# Check if the host can start another JVM now
+	def canAdmit(self):
+		freeGB = psutil.virtual_memory().available / 1024 ** 3 - self.getReservedGB()
+		return self.numRunning < self.maxWorkers and (self.numRunning == 0 or freeGB >= self.jvmMemoryGB)
+
+	# Wait for admission. Returns the ticket to give back to release().
+	def acquire(self):
+		with self.condition:
+			while not self.canAdmit():
+				self.condition.wait(timeout=5)
+			self.numRunning  += 1
+			self.numAdmitted += 1
+			ticket = self.numAdmitted
+			self.admissions[ticket] = time.monotonic()
+			return ticket
+
+	def release(self, ticket):
+		with self.condition:
+			self.numRunning -= 1
+			self.admissions.pop(ticket, None)
+			self.condition.notify_all()
+
+	# Periodically requeue the work of dead workers (of any host)
+	def reaperLoop(self, stopEvent):
+		while not stopEvent.wait(self.reaperInterval):
+			try:
+				self.redisClient.requeueDeadWorkers()
+			except Exception as e:
+				print("--- ⚠️ Reaper failed: {}".format(e), flush=True)
+
+	# Run the workers until the pop List is empty
+	def run(self):
+		print(self)
+		self.redisClient.requeueDeadWorkers()
+
+		stopEvent = threading.Event()
+		reaper = threading.Thread(target=self.reaperLoop, args=(stopEvent,), daemon=True)
+		reaper.start()
+
+		hostID  = "{}-{}".format(socket.gethostname(), os.getpid())
+		workers = [ExtractionWorker("{}-{}".format(hostID, i), self.redisClient, self.extractionArgs,
+									maxHeap = "{}g".format(self.jvmMemoryGB), leaseTTL = self.leaseTTL, pool = self,
+									prefetchDepth = self.prefetchDepth, maxPrefetchBytes = self.maxPrefetchBytes,
+									useDaemon = self.useDaemon, notifyKey = self.notifyKey)
+				   for i in range(self.maxWorkers)]
+		threads = [threading.Thread(target=worker.run, name=worker.workerID) for worker in workers]
+		for thread in threads:
+			thread.start()
+		for thread in threads:
+			thread.join()
+
+		stopEvent.set()
+		reaper.join()
+
+		print("\n--- ✅ Processed: {} --- ❌ Errors: {}".format(sum(w.numProcessed for w in workers), sum(w.numErrors for w in workers)))
+		self.redisClient.printStatus()
+
+
+# Command line entry point: run a pool on this host. Start it on several hosts to share the same pop List.
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="DamFlow parallel Data Flow extraction")
+	parser.add_argument("--project-key", required=True, help="e.g. test.androcatset.backward.nosources")
+	parser.add_argument("--tmp-path", default="../../0_Data/TMP/")
+	parser.add_argument("--extractor", default="../1_Java/damflow_extractor/target/damflow_extractor-1.0-jar-with-dependencies.jar")
+	parser.add_argument("--direction", default="backward")
+	parser.add_argument("--sources", default="nosources")
+	parser.add_argument("--timeout", type=int, default=7200)
+	parser.add_argument("--workers", type=int, default=None, help="Max number of parallel JVMs on this host")
+	parser.add_argument("--jvm-memory-gb", type=int, default=24)
+	parser.add_argument("--cores-per-worker", type=int, default=2)
+	parser.add_argument("--lease-ttl", type=int, default=60)
+	parser.add_argument("--prefetch", type=int, default=0, help="APKs downloaded ahead by each worker")
+	parser.add_argument("--prefetch-disk-gb", type=float, default=4)
+	parser.add_argument("--daemon", action="store_true", help="Reuse a warm JVM per worker")
+	args = parser.parse_args()
+
+	load_dotenv()
+	os.makedirs(args.tmp_path, exist_ok=True)
+	redisClient = RedisClient(host=os.getenv("REDIS_SERVER"),
+							  port=os.getenv("REDIS_PORT"),
+							  db=os.getenv("REDIS_DB"),
+							  password=os.getenv("REDIS_PSW"),
+							  projectKey=args.project_key)
+
+	extractionArgs = (args.tmp_path, args.extractor, os.getenv("ANDROID_PATH"), args.direction, args.sources, args.timeout)
+	WorkerPool(redisClient, extractionArgs, maxWorkers = args.workers, jvmMemoryGB = args.jvm_memory_gb,
+			   coresPerWorker = args.cores_per_worker, leaseTTL = args.lease_ttl,
+			   prefetchDepth = args.prefetch, maxPrefetchBytes = int(args.prefetch_disk_gb * 1024 ** 3),
+			   useDaemon = args.daemon).run()